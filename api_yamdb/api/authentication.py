@@ -0,0 +1,106 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from reviews.models import User
+
+USER_CACHE_TIMEOUT = 60
+# Отдельный кеш (settings.CACHES): отметки об изменении пользователя
+# не должны вытесняться ответами API, иначе claims отозванного токена
+# снова станут приниматься.
+AUTH_CACHE_ALIAS = 'auth'
+# Поля пользователя, которые переносятся в токен и нужны проверкам прав.
+CLAIM_FIELDS = ('username', 'role', 'is_superuser')
+
+
+def get_auth_cache():
+    return caches[AUTH_CACHE_ALIAS]
+
+
+def get_user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_user_changed_key(user_id):
+    return f'auth:user-changed:{user_id}'
+
+
+def get_access_token(user):
+    '''Access-токен с ролью пользователя в подписанных claims.'''
+    token = AccessToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    return token
+
+
+def invalidate_user(user_id, revoke_claims=True):
+    '''
+    Сбрасываем пользователя из кеша. С revoke_claims запоминаем время
+    изменения: claims токенов, выданных раньше, больше не принимаются.
+    '''
+    cache = get_auth_cache()
+    cache.delete(get_user_cache_key(user_id))
+    if revoke_claims:
+        cache.set(
+            get_user_changed_key(user_id),
+            time.time(),
+            api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+        )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWT-аутентификация без запроса к БД на каждый запрос.
+    Пользователь берётся из кеша на AUTH_USER_CACHE_TIMEOUT секунд;
+    при JWT_TRUST_ROLE_CLAIM = True — прямо из claims токена.
+    '''
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        if getattr(settings, 'JWT_TRUST_ROLE_CLAIM', False):
+            user = self.get_user_from_claims(user_id, validated_token)
+            if user is not None:
+                return user
+
+        cache = get_auth_cache()
+        key = get_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, getattr(
+                settings, 'AUTH_USER_CACHE_TIMEOUT', USER_CACHE_TIMEOUT
+            ))
+        return user
+
+    def get_user_from_claims(self, user_id, validated_token):
+        '''
+        Пользователь из claims токена: загружены только id и поля из
+        CLAIM_FIELDS, остальные подгрузятся из БД при обращении.
+        Возвращает None, если claims нет или пользователь менялся после
+        выдачи токена.
+        '''
+        issued_at = validated_token.get('iat')
+        if issued_at is None or any(
+            field not in validated_token for field in CLAIM_FIELDS
+        ):
+            return None
+        changed_at = get_auth_cache().get(get_user_changed_key(user_id))
+        if changed_at is not None and issued_at <= changed_at:
+            return None
+        values = {'id': user_id, 'is_active': True}
+        values.update(
+            (field, validated_token[field]) for field in CLAIM_FIELDS
+        )
+        fields = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in values
+        ]
+        return User.from_db(
+            'default', fields, [values[field] for field in fields]
+        )
@@ -0,0 +1,346 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+from calendar import timegm
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+from reviews.versions import get_versions
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+# Сколько секунд после истечения или смены версии ответ ещё хранится:
+# его отдают, пока один запрос пересчитывает ключ
+# (stale-while-revalidate).
+STALE_TIMEOUT = 60
+# Сколько секунд живёт блокировка пересчёта ключа и сколько её ждёт
+# запрос, которому нечего отдать, прежде чем считать самому.
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2
+WAIT_INTERVAL = 0.05
+# Досрочное обновление XFetch: чем больше, тем раньше до истечения.
+XFETCH_BETA = 1.0
+SCOPES = ('titles-list', 'titles-retrieve', 'reviews-list')
+# hit — свежий ответ из кеша, miss — пересчёт, early — досрочный
+# пересчёт (XFetch), stale — устаревший ответ на время чужого
+# пересчёта, coalesced — ответ, дождавшийся чужого пересчёта.
+RESULTS = ('hit', 'miss', 'early', 'stale', 'coalesced')
+
+
+def get_params(request):
+    '''Параметры запроса в строке, не зависящей от их порядка.'''
+    return urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+
+
+def get_stats_key(scope, result):
+    return f'responses:stats:{scope}:{result}'
+
+
+def record(scope, result):
+    key = get_stats_key(scope, result)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_stats():
+    '''{scope: {результат: счётчик}} с момента последнего сброса.'''
+    counters = cache.get_many([
+        get_stats_key(scope, result) for scope in SCOPES for result in RESULTS
+    ])
+    return {
+        scope: {
+            result: counters.get(get_stats_key(scope, result), 0)
+            for result in RESULTS
+        }
+        for scope in SCOPES
+    }
+
+
+def reset_stats():
+    cache.delete_many([
+        get_stats_key(scope, result) for scope in SCOPES for result in RESULTS
+    ])
+
+
+def is_fresh(entry, versions, now):
+    '''
+    Свежесть записи по XFetch: запись истекает досрочно с вероятностью,
+    которая растёт к концу срока и со временем пересчёта delta. Горячий
+    ключ заранее обновляет один запрос, а не все сразу после истечения.
+    '''
+    early = -entry['delta'] * XFETCH_BETA * math.log(1 - random.random())
+    return entry['versions'] == versions and now + early < entry['expires']
+
+
+def acquire_lock(key):
+    '''Блокировка пересчёта ключа: токен владельца или None.'''
+    token = uuid.uuid4().hex
+    if cache.add(f'{key}:lock', token, LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    if token is not None and cache.get(f'{key}:lock') == token:
+        cache.delete(f'{key}:lock')
+
+
+def wait_for_entry(key, versions):
+    '''
+    Ждёт ответ, который пересчитывает другой запрос. None, если
+    блокировку сняли без ответа или ожидание вышло.
+    '''
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['versions'] == versions:
+            return entry
+        if cache.get(f'{key}:lock') is None:
+            return None
+    return None
+
+
+def get_entry_response(request, entry, status):
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type']
+    )
+    response['X-Cache'] = status
+    validators = entry['validators']
+    for header, value in validators.items():
+        response[header] = value
+    # Валидаторы сохранены вместе с ответом: условный запрос
+    # проверяется без обращения к БД.
+    return get_conditional_response(
+        request,
+        etag=validators.get('ETag'),
+        last_modified=parse_http_date_safe(validators.get('Last-Modified')),
+        response=response,
+    )
+
+
+class CachedResponseMixin:
+    '''
+    Read-through кеш отрисованных ответов для анонимных GET-запросов
+    в JSON с защитой горячих ключей от лавины пересчётов.
+
+    Ключ — путь и отсортированные параметры запроса. Вместе с ответом
+    хранятся версии данных (reviews.versions) из get_version_keys:
+    сигналы моделей меняют версии, и ответ с чужими версиями считается
+    устаревшим. Устаревший или истекающий ответ пересчитывает один
+    запрос под блокировкой (single-flight), остальные тем временем
+    получают прежний ответ, а если его нет — ждут пересчитанный.
+    Истечение размазано досрочным обновлением XFetch. Исходы запросов
+    считаются в кеше (команда response_cache_stats).
+    '''
+    response_cache_scope = None
+    response_cache_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args,
+                                        **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args,
+                                        **kwargs)
+
+    def get_version_keys(self):
+        '''Ключи версий, от которых зависит ответ; None — не кешировать.'''
+        raise NotImplementedError
+
+    def get_response_cache_key(self, request):
+        '''(ключ, версии) или None, если ответ не кешируется.'''
+        if (
+            request.method != 'GET'
+            or self.action not in self.response_cache_actions
+            or not request.user.is_anonymous
+            or request.accepted_renderer.format != 'json'
+        ):
+            return None
+        keys = self.get_version_keys()
+        if keys is None:
+            return None
+        raw = f'{request.get_host()}{request.path}?{get_params(request)}'
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        key = f'responses:{self.response_cache_scope}-{self.action}:{digest}'
+        return key, get_versions(keys)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache_key = self.get_response_cache_key(request)
+        if cache_key is None:
+            return handler(request, *args, **kwargs)
+        key, versions = cache_key
+        scope = f'{self.response_cache_scope}-{self.action}'
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None and is_fresh(entry, versions, now):
+            record(scope, 'hit')
+            return get_entry_response(request, entry, 'HIT')
+        lock = acquire_lock(key)
+        if lock is None:
+            if entry is not None:
+                record(scope, 'stale')
+                return get_entry_response(request, entry, 'STALE')
+            entry = wait_for_entry(key, versions)
+            if entry is not None:
+                record(scope, 'coalesced')
+                return get_entry_response(request, entry, 'HIT')
+        early = (
+            entry is not None and entry['versions'] == versions
+            and now < entry['expires']
+        )
+        record(scope, 'early' if early else 'miss')
+        return self.refresh_entry(key, versions, lock, handler, request,
+                                  *args, **kwargs)
+
+    def refresh_entry(self, key, versions, lock, handler, request, *args,
+                      **kwargs):
+        '''Пересчитывает ответ и сохраняет его после отрисовки.'''
+        started = time.monotonic()
+        try:
+            response = handler(request, *args, **kwargs)
+        except Exception:
+            release_lock(key, lock)
+            raise
+        if response.status_code != 200:
+            release_lock(key, lock)
+            return response
+        response['X-Cache'] = 'MISS'
+        timeout = getattr(
+            settings, 'RESPONSE_CACHE_TIMEOUT', RESPONSE_CACHE_TIMEOUT
+        )
+
+        def store(rendered):
+            cache.set(key, {
+                'versions': versions,
+                'content': rendered.rendered_content,
+                'content_type': rendered['Content-Type'],
+                'validators': {
+                    header: rendered[header]
+                    for header in ('ETag', 'Last-Modified')
+                    if rendered.has_header(header)
+                },
+                'expires': time.time() + timeout,
+                'delta': time.monotonic() - started,
+            }, timeout + STALE_TIMEOUT)
+            release_lock(key, lock)
+
+        response.add_post_render_callback(store)
+        return response
+
+
+class ConditionalGetMixin:
+    '''
+    Валидаторы ETag и Last-Modified по полю updated_at: If-None-Match
+    и If-Modified-Since получают 304 до сериализации ответа.
+    '''
+
+    def get_conditional(self, request, handler, parts, last_modified,
+                        *args, **kwargs):
+        '''
+        ETag — хеш пути, параметров, формата ответа и parts;
+        Last-Modified — last_modified (None — без заголовка).
+        '''
+        raw = ':'.join(map(str, (
+            request.path, get_params(request),
+            request.accepted_renderer.format, *parts, last_modified,
+        )))
+        # Слабый ETag: совпадает представление, а не байты ответа.
+        etag = f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+        timestamp = (
+            timegm(last_modified.utctimetuple())
+            if last_modified is not None else None
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    '''
+    Список по номеру страницы: число строк и последнее изменение одним
+    агрегатом по отфильтрованному queryset до выборки страницы.
+    Удаление строки меняет число строк, добавление и изменение — время;
+    число строк переиспользует пагинация вместо своего COUNT(*).
+    Страница по курсору: id и время изменения её строк и наличие
+    соседних страниц — агрегат по всей таблице отменил бы выигрыш
+    курсорной пагинации.
+
+    У списков только ETag: удаление строки не двигает время последнего
+    изменения, и If-Modified-Since получил бы 304 на устаревший список.
+    '''
+
+    def list(self, request, *args, **kwargs):
+        # Отфильтрованный queryset строится один раз: фильтры вроде
+        # ?fuzzy= выполняют запросы уже при построении.
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None and self.paginator.is_keyset(request):
+            return self.get_keyset_conditional(request, queryset)
+        state = queryset.aggregate(
+            count=Count('pk'), last_modified=Max('updated_at')
+        )
+        self.row_count = state['count']
+        return self.get_conditional(
+            request, lambda request: self.get_list_response(queryset),
+            [state['count'], state['last_modified']], None,
+        )
+
+    def get_list_response(self, queryset):
+        '''Как ListModelMixin.list, но по готовому queryset.'''
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            )
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def get_keyset_conditional(self, request, queryset):
+        page = self.paginate_queryset(queryset)
+        keyset = self.paginator.keyset
+        parts = [
+            keyset.has_next, keyset.has_previous,
+            *((obj.pk, obj.updated_at) for obj in page),
+        ]
+        return self.get_conditional(
+            request,
+            lambda request: self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ),
+            parts, None,
+        )
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    '''Объект: его id и время изменения.'''
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.get_conditional(
+            request,
+            lambda *args, **kwargs: Response(
+                self.get_serializer(instance).data
+            ),
+            [instance.pk], instance.updated_at, *args, **kwargs
+        )
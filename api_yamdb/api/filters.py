@@ -1,16 +1,207 @@
+import math
+
+from django.db.models import Count, F
 from django_filters import rest_framework as filters
-from reviews.models import Title
+from django_filters.constants import EMPTY_VALUES
+from reviews.facets import ALL, ANY
+from reviews.models import Comment, Review, Title
+from reviews.search import (COMMENT_INDEX, REVIEW_INDEX, TITLE_INDEX,
+                            TITLE_TRIGRAM_INDEX)
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    """Список значений через запятую."""
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """
+    Сортировка с добавочным ключом id в направлении последнего поля:
+    при равных значениях страницы не перемешиваются. Пустые значения
+    полей из nulls_last (рейтинг без отзывов) идут в конце.
+
+    tiebreakers дополняет поле следующими столбцами его индекса в том же
+    направлении: порядок совпадает с индексом целиком, и СУБД читает
+    строки по индексу без сортировки.
+    """
+
+    def __init__(self, *args, nulls_last=(), tiebreakers=None, **kwargs):
+        self.nulls_last = set(nulls_last)
+        self.tiebreakers = tiebreakers or {}
+        super().__init__(*args, **kwargs)
+
+    def get_order_by(self, name, descending):
+        if name in self.nulls_last:
+            return (
+                F(name).desc(nulls_last=True) if descending
+                else F(name).asc(nulls_last=True)
+            )
+        return f"-{name}" if descending else name
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = []
+        names = set()
+        descending = False
+        for param in value:
+            field = self.get_ordering_value(param)
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            for column in (name, *self.tiebreakers.get(name, ())):
+                if column not in names:
+                    names.add(column)
+                    ordering.append(self.get_order_by(column, descending))
+        if "id" not in names:
+            ordering.append("-id" if descending else "id")
+        return qs.order_by(*ordering)
 
 
 class TitleFilter(filters.FilterSet):
-    """Фильтры для произведений."""
-    category = filters.CharFilter(
+    """
+    Фильтры для произведений. Жанры и категории принимают несколько
+    slug через запятую, как и /titles/facets/.
+    """
+    category = CharInFilter(
         field_name="category__slug",
+        lookup_expr="in",
+    )
+    genre = CharInFilter(
+        method="filter_genre",
+    )
+    genre__any = CharInFilter(
+        method="filter_genre_any",
     )
-    genre = filters.CharFilter(
-        field_name="genre__slug",
+    genre__all = CharInFilter(
+        method="filter_genre_all",
+    )
+    genre_mode = filters.ChoiceFilter(
+        choices=((ANY, ANY), (ALL, ALL)),
+        method="filter_genre_mode",
+    )
+    year_min = filters.NumberFilter(
+        field_name="year",
+        lookup_expr="gte",
+    )
+    year_max = filters.NumberFilter(
+        field_name="year",
+        lookup_expr="lte",
+    )
+    rating_min = filters.NumberFilter(
+        method="filter_rating_min",
+    )
+    rating_max = filters.NumberFilter(
+        method="filter_rating_max",
+    )
+    search = filters.CharFilter(
+        method="filter_search",
+    )
+    fuzzy = filters.CharFilter(
+        method="filter_fuzzy",
+    )
+    # Объявлена последней: явная сортировка заменяет порядок
+    # релевантности из search и fuzzy.
+    ordering = StableOrderingFilter(
+        fields=(
+            ("rating", "rating"),
+            ("rating_count", "review_count"),
+            ("year", "year"),
+            ("name", "name"),
+            ("id", "id"),
+        ),
+        nulls_last=("rating",),
+        # Индексы title_rating_idx и title_year_name_idx (+ id).
+        tiebreakers={"rating": ("rating_count",), "year": ("name",)},
     )
 
     class Meta:
         model = Title
         fields = ["category", "genre", "name", "year"]
+
+    @staticmethod
+    def titles_in_genres(slugs, match_all=False):
+        """
+        Подзапрос id произведений хотя бы одного или всех жанров.
+        IN по индексу (genre_id, title_id) вместо JOIN не размножает
+        строки и не требует DISTINCT; для всех жанров связи
+        группируются по произведению и считаются.
+        """
+        slugs = set(slugs)
+        links = Title.genre.through.objects.filter(genre__slug__in=slugs)
+        if match_all:
+            links = links.values("title_id").annotate(
+                genres=Count("genre_id")
+            ).filter(genres=len(slugs))
+        return links.values("title_id")
+
+    def filter_genre(self, queryset, name, value):
+        """Жанры из ?genre= по правилу ?genre_mode=any|all."""
+        return queryset.filter(pk__in=self.titles_in_genres(
+            value, self.form.cleaned_data.get("genre_mode") == ALL
+        ))
+
+    def filter_genre_any(self, queryset, name, value):
+        return queryset.filter(pk__in=self.titles_in_genres(value))
+
+    def filter_genre_all(self, queryset, name, value):
+        return queryset.filter(pk__in=self.titles_in_genres(value, True))
+
+    def filter_genre_mode(self, queryset, name, value):
+        """Учитывается в filter_genre."""
+        return queryset
+
+    @staticmethod
+    def filter_rating_min(queryset, name, value):
+        """
+        Границы сравниваются с выводимым рейтингом — целой частью
+        средней оценки, которая хранится в rating точно.
+        """
+        return queryset.filter(rating__gte=math.ceil(value))
+
+    @staticmethod
+    def filter_rating_max(queryset, name, value):
+        return queryset.filter(rating__lt=math.floor(value) + 1)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию."""
+        return TITLE_INDEX.search(queryset, value)
+
+    def filter_fuzzy(self, queryset, name, value):
+        """Поиск по названию с опечатками, ближайшие первыми."""
+        return TITLE_TRIGRAM_INDEX.search(queryset, value)
+
+
+class ReviewSearchFilter(filters.FilterSet):
+    """Полнотекстовый поиск отзывов с фильтрами для модераторов."""
+    index = REVIEW_INDEX
+    search = filters.CharFilter(
+        method="filter_search",
+    )
+    title = filters.NumberFilter(
+        field_name="title_id",
+    )
+    author = filters.CharFilter(
+        field_name="author__username",
+    )
+    pub_date = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Review
+        fields = ["search", "title", "author", "pub_date"]
+
+    def filter_search(self, queryset, name, value):
+        return self.index.search(queryset, value)
+
+
+class CommentSearchFilter(ReviewSearchFilter):
+    """Полнотекстовый поиск комментариев с фильтрами для модераторов."""
+    index = COMMENT_INDEX
+    title = filters.NumberFilter(
+        field_name="review__title_id",
+    )
+    review = filters.NumberFilter(
+        field_name="review_id",
+    )
+
+    class Meta:
+        model = Comment
+        fields = ["search", "title", "review", "author", "pub_date"]
@@ -0,0 +1,243 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Постраничный вывод по ключу сортировки (keyset).
+    Вместо COUNT(*) и OFFSET следующая страница выбирается условием
+    "ключ больше последнего показанного", поэтому глубокие страницы
+    стоят столько же, сколько первая. Курсор непрозрачен для клиента.
+    '''
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, ordering=('id',), page_size=None):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size or api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        cursor = self.decode_cursor(request)
+        reverse = False
+        ordering = self.ordering
+        if cursor is not None:
+            reverse, values = cursor
+            if reverse:
+                ordering = tuple(
+                    self._reverse_field(field) for field in self.ordering
+                )
+            queryset = queryset.filter(self.get_keyset_filter(
+                ordering, values
+            ))
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    @staticmethod
+    def _reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        '''
+        Условие "кортеж полей строго после values" для заданной сортировки:
+        (a > x) OR (a = x AND b > y) OR ..., и к нему избыточная граница
+        a >= x. По одной дизъюнкции SQLite и PostgreSQL не ограничивают
+        диапазон индекса и читают все строки до курсора; граница по первому
+        полю даёт поиск по индексу с позиции курсора.
+        '''
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return condition & Q(**{f'{first.lstrip("-")}__{bound}': values[0]})
+
+    def encode_cursor(self, reverse, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            values.append(value)
+        payload = json.dumps([int(reverse), values], separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_field(self, name):
+        '''Поле модели или аннотации queryset (например, search_rank).'''
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(encoded.encode()).decode()
+            reverse, values = json.loads(payload)
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), values
+
+
+class CountedPaginator(Paginator):
+    '''Paginator, которому число строк уже известно: без COUNT(*).'''
+
+    def __init__(self, *args, count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class PageSizePagination(PageNumberPagination):
+    '''
+    Пагинация по номеру страницы с размером страницы из ?page_size=.
+    Число строк берётся из view.row_count, если его уже посчитали
+    (api.cache.ConditionalListMixin).
+    '''
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def is_keyset(self, request):
+        return False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CountedPaginator, count=getattr(view, 'row_count', None)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class OptionalKeysetPagination(PageSizePagination):
+    '''
+    Постраничный вывод по номеру страницы (по умолчанию, как раньше)
+    или по курсору, если клиент передал ?pagination=cursor или cursor=.
+    Курсор идёт по keyset_ordering, поэтому параметры keyset_conflicts,
+    задающие свой порядок строк, с ним не сочетаются: ответ 400.
+    '''
+    mode_query_param = 'pagination'
+    keyset_mode = 'cursor'
+    keyset_ordering = ('id',)
+    keyset_conflicts = ()
+
+    def is_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param)
+            == self.keyset_mode
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.is_keyset(request):
+            self.check_keyset_conflicts(request)
+            self.keyset = KeysetPagination(
+                ordering=self.keyset_ordering,
+                page_size=self.get_page_size(request),
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def check_keyset_conflicts(self, request):
+        conflicts = [
+            param for param in self.keyset_conflicts
+            if request.query_params.get(param)
+        ]
+        if conflicts:
+            ordering = ', '.join(self.keyset_ordering)
+            raise ValidationError({
+                param: 'Не сочетается с pagination=cursor: курсор идёт '
+                       f'по {ordering}.'
+                for param in conflicts
+            })
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class TitlePagination(OptionalKeysetPagination):
+    '''
+    Пагинация произведений: курсор по id. Сортировка ?ordering= и порядок
+    релевантности ?search= и ?fuzzy= доступны постранично по номеру.
+    '''
+    keyset_ordering = ('id',)
+    keyset_conflicts = ('ordering', 'search', 'fuzzy')
+
+
+class PubDatePagination(OptionalKeysetPagination):
+    '''Пагинация отзывов и комментариев: курсор по (pub_date, id).'''
+    keyset_ordering = ('pub_date', 'id')
+
+
+class SearchPagination(OptionalKeysetPagination):
+    '''
+    Пагинация поиска отзывов и комментариев: всегда по курсору, без
+    COUNT(*) по всем совпадениям. С ?search= курсор идёт по
+    релевантности (search_rank, id), без него — по (pub_date, id).
+    '''
+    keyset_ordering = ('pub_date', 'id')
+    rank_ordering = ('-search_rank', 'id')
+
+    def is_keyset(self, request):
+        return True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'search_rank' in queryset.query.annotations:
+            self.keyset_ordering = self.rank_ordering
+        return super().paginate_queryset(queryset, request, view)
@@ -22,6 +22,15 @@ class IsAdmin(permissions.BasePermission):
         )
 
 
+class IsModerator(permissions.BasePermission):
+    '''Разрешено модератору и админу.'''
+    def has_permission(self, request, view):
+        return (
+            request.user.is_authenticated
+            and (request.user.is_moderator or request.user.is_admin)
+        )
+
+
 class PermissionsForReviewsAndComments(permissions.BasePermission):
     '''
     Допустимые действия с отзывами / комментариями
@@ -1,8 +1,11 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.content import TITLE_CONTENT
+from reviews.facets import ALL, ANY
+from reviews.models import (SCORES, Category, Comment, Genre, Review, Title,
+                            User)
 from reviews.validators import username_validator, validate_year
 
 
@@ -62,14 +65,14 @@ class CategorySerializer(serializers.ModelSerializer):
     """Обработка данных для категорий."""
     class Meta:
         model = Category
-        exclude = ('id',)
+        exclude = ('id', 'updated_at')
 
 
 class GenreSerializer(serializers.ModelSerializer):
     """Обработка данных для жанров."""
     class Meta:
         model = Genre
-        exclude = ('id',)
+        exclude = ('id', 'updated_at')
 
 
 class TitleReadSerializer(serializers.ModelSerializer):
@@ -79,7 +82,9 @@ class TitleReadSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True,
     )
+    # В БД хранится средняя оценка, выводится её целая часть.
     rating = serializers.IntegerField(read_only=True)
+    histogram = serializers.SerializerMethodField()
 
     class Meta:
         model = Title
@@ -87,8 +92,21 @@ class TitleReadSerializer(serializers.ModelSerializer):
             'id', 'name', 'year',
             'rating', 'description',
             'genre', 'category',
+            'histogram',
         )
 
+    def get_fields(self):
+        """Гистограмма оценок выводится только с ?include=histogram."""
+        fields = super().get_fields()
+        request = self.context.get('request')
+        include = request.query_params.get('include', '') if request else ''
+        if 'histogram' not in include.split(','):
+            del fields['histogram']
+        return fields
+
+    def get_histogram(self, title):
+        return dict(zip(map(str, SCORES), title.histogram))
+
 
 class TitlePostSerializer(serializers.ModelSerializer):
     """Обработка данных для добавления произведений."""
@@ -111,6 +129,39 @@ class TitlePostSerializer(serializers.ModelSerializer):
             'genre', 'category',
         )
 
+    def create(self, validated_data):
+        """
+        Новое произведение сразу попадает в индекс похожих
+        по содержанию: жанры и категория уже загружены валидацией.
+        """
+        genres = [genre.slug for genre in validated_data.get('genre', ())]
+        title = super().create(validated_data)
+        category = title.category.slug if title.category else None
+        transaction.on_commit(
+            lambda: TITLE_CONTENT.add(title, genres, category)
+        )
+        return title
+
+
+class SlugListField(serializers.CharField):
+    """Список slug через запятую: "drama,comedy"."""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        return [slug for slug in value.split(',') if slug]
+
+
+class TitleFacetsQuerySerializer(serializers.Serializer):
+    """Параметры запроса фасетов произведений."""
+    genre = SlugListField(required=False)
+    genre_mode = serializers.ChoiceField(
+        choices=(ANY, ALL),
+        default=ANY,
+    )
+    category = SlugListField(required=False)
+    year_min = serializers.IntegerField(required=False)
+    year_max = serializers.IntegerField(required=False)
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     '''Обработка данных для отзывов.'''
@@ -132,13 +183,10 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     def validate(self, value):
         request = self.context['request']
-        get_object_or_404(
-            Title,
-            id=self.context['view'].kwargs['title_id'],
-        )
+        title = self.context['view'].get_title()
         if (
             request.method == 'POST'
-            and request.user.reviews.all().exists()
+            and request.user.reviews.filter(title=title).exists()
         ):
             raise serializers.ValidationError('Вы уже оставляли отзыв здесь.')
         return value
@@ -155,3 +203,22 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('id', 'text', 'author', 'pub_date')
+
+
+class ReviewSearchSerializer(ReviewSerializer):
+    '''Отзыв в результатах поиска: с id произведения.'''
+    title = serializers.IntegerField(source='title_id', read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ('id', 'title', 'text', 'author', 'score', 'pub_date')
+
+
+class CommentSearchSerializer(CommentSerializer):
+    '''Комментарий в результатах поиска: с id отзыва и произведения.'''
+    title = serializers.IntegerField(
+        source='review.title_id', read_only=True
+    )
+    review = serializers.IntegerField(source='review_id', read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = ('id', 'title', 'review', 'text', 'author', 'pub_date')
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.authentication import invalidate_user
+from reviews.models import User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    '''Изменённый пользователь не должен браться из кеша.'''
+    # У нового пользователя ещё нет токенов, которые нужно отзывать.
+    invalidate_user(instance.pk, revoke_claims=not created)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
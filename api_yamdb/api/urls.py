@@ -1,9 +1,10 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework import routers
 
-from api.views import (CategoryViewSet, CommentViewset, GenerateTokenView,
-                       GenreViewSet, ReviewViewset, SignUpView, TitleViewSet,
-                       UserViewSet)
+from api.views import (CategoryViewSet, CommentSearchViewSet,
+                       CommentViewset, ExportView, GenerateTokenView,
+                       GenreViewSet, LeaderboardView, ReviewSearchViewSet,
+                       ReviewViewset, SignUpView, TitleViewSet, UserViewSet)
 
 router_v1 = routers.DefaultRouter()
 
@@ -42,10 +43,41 @@ router_v1.register(
     CommentViewset,
     basename='comments',
 )
+router_v1.register(
+    'search/reviews',
+    ReviewSearchViewSet,
+    basename='search-reviews',
+)
+router_v1.register(
+    'search/comments',
+    CommentSearchViewSet,
+    basename='search-comments',
+)
 
 
 urlpatterns = [
     path('v1/auth/signup/', SignUpView.as_view(), name='signup'),
     path('v1/auth/token/', GenerateTokenView.as_view()),
+    re_path(
+        r'^v1/export/(?P<name>\w+)\.(?P<export_format>csv|ndjson)'
+        r'(?P<compressed>\.gz)?$',
+        ExportView.as_view(),
+        name='export',
+    ),
+    path(
+        'v1/leaderboards/',
+        LeaderboardView.as_view(),
+        name='leaderboard',
+    ),
+    re_path(
+        r'^v1/leaderboards/(?P<board>genre|category)/(?P<key>[-\w]+)/$',
+        LeaderboardView.as_view(),
+        name='leaderboard',
+    ),
+    re_path(
+        r'^v1/leaderboards/(?P<board>year)/(?P<key>\d+)/$',
+        LeaderboardView.as_view(),
+        name='leaderboard',
+    ),
     path('v1/', include(router_v1.urls))
 ]
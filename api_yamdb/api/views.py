@@ -1,8 +1,7 @@
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.db import IntegrityError
-from django.db.models import Avg
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, status, viewsets
@@ -11,22 +10,54 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import AccessToken
 
-from api.filters import TitleFilter
-from api.permissions import (IsAdmin, IsAdminOrReadOnly,
+from api.authentication import get_access_token
+from api.cache import (CachedResponseMixin, ConditionalListMixin,
+                       ConditionalRetrieveMixin)
+from api.filters import (CommentSearchFilter, ReviewSearchFilter,
+                         TitleFilter)
+from api.pagination import (PubDatePagination, SearchPagination,
+                            TitlePagination)
+from api.permissions import (IsAdmin, IsAdminOrReadOnly, IsModerator,
                              PermissionsForReviewsAndComments)
-from api.serializers import (CategorySerializer, CommentSerializer,
-                             GenerateTokenSerializer, GenreSerializer,
+from api.serializers import (CategorySerializer, CommentSearchSerializer,
+                             CommentSerializer, GenerateTokenSerializer,
+                             GenreSerializer, ReviewSearchSerializer,
                              ReviewSerializer, SignUpSerializer,
-                             TitlePostSerializer, TitleReadSerializer,
-                             UserSerializer, )
-from reviews.models import Category, Genre, Review, Title, User
+                             TitleFacetsQuerySerializer, TitlePostSerializer,
+                             TitleReadSerializer, UserSerializer, )
+from reviews.autocomplete import DEFAULT_LIMIT, TITLE_AUTOCOMPLETE
+from reviews.content import TITLE_CONTENT
+from reviews.exporter import EXPORT_SOURCES, iter_export
+from reviews.facets import TITLE_FACETS
+from reviews.leaderboards import get_leaderboard
+from reviews.mail import queue_mail
+from reviews.ratings import get_rating
+from reviews.recommendations import NEIGHBOURS, get_similar
+from reviews.models import (Category, Comment, Genre, Review, Title,
+                            TitleRanking, User)
+from reviews.versions import ALL, CATALOGUE, TAXONOMY, title_key
+
+MAX_AUTOCOMPLETE_LIMIT = 50
+DEFAULT_LEADERBOARD_LIMIT = 10
+MAX_LEADERBOARD_LIMIT = 100
+MAX_SIMILAR_LIMIT = 50
+SIMILAR_BY_RATINGS = 'ratings'
+SIMILAR_BY_CONTENT = 'content'
+
+
+def get_limit(request, default, maximum):
+    '''Размер выдачи из ?limit=, в пределах 1..maximum.'''
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        raise ValidationError({'limit': 'Ожидается целое число.'})
+    return max(1, min(limit, maximum))
 
 
 class UserViewSet(viewsets.ModelViewSet):
     '''Вывод информации о пользователях.'''
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
     permission_classes = (IsAdmin,)
     http_method_names = ['get', 'post', 'patch', 'delete']
@@ -41,18 +72,23 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def me(self, request):
         '''Получение или изменение информации о себе.'''
+        user = request.user
+        if request.method == 'PATCH' or user.get_deferred_fields():
+            # Пользователь из кеша может быть устаревшим, а из claims
+            # токена — неполным: изменяем и выводим профиль из БД.
+            user = get_object_or_404(User, pk=user.pk)
         if request.method == 'PATCH':
             serializer = self.get_serializer(
-                request.user, data=request.data, partial=True
+                user, data=request.data, partial=True
             )
             serializer.is_valid(raise_exception=True)
             # Страхуемся от изменения пользовательской роли.
             if serializer.validated_data.get('role'):
-                serializer.validated_data['role'] = request.user.role
+                serializer.validated_data['role'] = user.role
             serializer.save()
             return Response(serializer.data)
 
-        serializer = self.get_serializer(request.user)
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
 
@@ -78,12 +114,12 @@ class SignUpView(APIView):
 
         confirmation_code = default_token_generator.make_token(user)
 
-        send_mail(
+        # Письмо отправит воркер send_queued_mail, ответ не ждёт SMTP.
+        queue_mail(
             'Код для подтверждения регистрации',
             f'Ваш код подтверждения: "{confirmation_code}".',
             settings.EMAIL,
             [email],
-            fail_silently=False,
         )
 
         return Response(
@@ -106,7 +142,7 @@ class GenerateTokenView(APIView):
             user,
             confirmation_code,
         ):
-            token = str(AccessToken.for_user(user))
+            token = str(get_access_token(user))
             return Response(
                 {'token': token},
                 status=status.HTTP_201_CREATED
@@ -114,27 +150,223 @@ class GenerateTokenView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class ExportView(APIView):
+    '''
+    Потоковая выгрузка таблицы в CSV или NDJSON (опционально gzip).
+    Доступна только админу.
+    '''
+    permission_classes = (IsAdmin,)
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request, name, export_format, compressed=None):
+        source = EXPORT_SOURCES.get(name)
+        if source is None:
+            raise Http404
+        compress = bool(compressed)
+        response = StreamingHttpResponse(
+            iter_export(source, export_format, compress=compress),
+            content_type=(
+                'application/gzip' if compress
+                else self.content_types[export_format]
+            ),
+        )
+        filename = source.get_filename(export_format, compress)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
+        return response
+
+
+class TitleViewSet(
+    CachedResponseMixin,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    viewsets.ModelViewSet,
+):
     '''
     Вывод действий с произведениями.
     Для запросов на чтения используется TitleReadSerializer.
     Для запросов на редактирования используется TitlePostSerializer.
+    Список и карточка для анонимных запросов кешируются вместе
+    с ETag и Last-Modified (api.cache).
     '''
-    queryset = Title.objects.annotate(
-        rating=Avg('reviews__score')
-    )
+    # Порядок по умолчанию — по id, чтобы страницы были стабильными;
+    # ?ordering= и поиск задают свой (api.filters.TitleFilter).
+    queryset = Title.objects.select_related(
+        'category'
+    ).prefetch_related('genre').order_by('id')
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = TitlePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TitleFilter
     http_method_names = ['get', 'post', 'patch', 'delete']
+    response_cache_scope = 'titles'
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return TitleReadSerializer
         return TitlePostSerializer
 
+    def get_version_keys(self):
+        '''
+        Список зависит от версии каталога, произведение — от своей
+        версии и версии жанров и категорий.
+        '''
+        if self.action == 'list':
+            return [ALL, CATALOGUE]
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        # /titles/01/ — то же произведение, что /titles/1/: версия
+        # по id, а не по строке из URL.
+        try:
+            title_id = int(lookup)
+        except ValueError:
+            return None
+        return [ALL, TAXONOMY, title_key(title_id)]
+
+    @action(detail=False, methods=('GET',))
+    def autocomplete(self, request):
+        '''
+        Подсказки для строки поиска: произведения, у которых слово
+        в названии начинается с ?q=, лучшие по рейтингу. Без запросов
+        к БД, из индекса в памяти.
+        '''
+        limit = get_limit(request, DEFAULT_LIMIT, MAX_AUTOCOMPLETE_LIMIT)
+        titles = TITLE_AUTOCOMPLETE.search(
+            request.query_params.get('q', ''), limit
+        )
+        return Response([
+            {'id': title_id, 'name': name, 'rating': rating}
+            for title_id, name, rating in titles
+        ])
+
+    @action(detail=False, methods=('GET',))
+    def facets(self, request):
+        '''
+        Число произведений под фильтры ?genre=a,b&genre_mode=any|all
+        &category=c&year_min=&year_max= и счётчики по жанрам,
+        категориям и десятилетиям. Считается по битовому индексу
+        в памяти, без запросов к БД.
+        '''
+        serializer = TitleFacetsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        return Response(TITLE_FACETS.search(
+            genres=query.get('genre', ()),
+            categories=query.get('category', ()),
+            year_min=query.get('year_min'),
+            year_max=query.get('year_max'),
+            genre_mode=query['genre_mode'],
+        ))
+
+    @action(detail=True, methods=('GET',))
+    def similar(self, request, pk=None):
+        '''
+        Похожие произведения. ?by=ratings (по умолчанию) — «оценившие
+        это произведение высоко оценили и…»: соседи по оценкам,
+        посчитанные заранее командой build_recommendations, один запрос
+        по индексу (произведение, место). ?by=content — по названию,
+        описанию, жанрам и категории из TF-IDF индекса в памяти
+        (reviews.content), для произведений с малым числом отзывов.
+        '''
+        if not pk.isdigit():
+            raise Http404
+        by = request.query_params.get('by', SIMILAR_BY_RATINGS)
+        if by not in (SIMILAR_BY_RATINGS, SIMILAR_BY_CONTENT):
+            raise ValidationError(
+                {'by': f'Допустимые значения: {SIMILAR_BY_RATINGS}, '
+                       f'{SIMILAR_BY_CONTENT}.'}
+            )
+        limit = get_limit(request, NEIGHBOURS, MAX_SIMILAR_LIMIT)
+        if by == SIMILAR_BY_CONTENT:
+            neighbours = self.get_content_neighbours(int(pk), limit)
+        else:
+            neighbours = [
+                (neighbour.similar, neighbour.similarity)
+                for neighbour in get_similar(int(pk), limit)
+            ]
+            if not neighbours:
+                get_object_or_404(Title, pk=pk)
+        return Response([
+            {
+                'id': title.id,
+                'name': title.name,
+                'year': title.year,
+                'rating': get_rating(
+                    title.rating_sum, title.rating_count
+                ),
+                'similarity': round(similarity, 3),
+            }
+            for title, similarity in neighbours
+        ])
+
+    def get_content_neighbours(self, title_id, limit):
+        '''
+        (произведение, сходство) по TF-IDF индексу. Произведение, которого
+        нет в индексе (изменено или создано другим процессом), читается
+        из БД и добавляется в индекс.
+        '''
+        if not TITLE_CONTENT.contains(title_id):
+            title = self.get_object()
+            TITLE_CONTENT.add(
+                title,
+                [genre.slug for genre in title.genre.all()],
+                title.category.slug if title.category else None,
+            )
+        neighbours = TITLE_CONTENT.similar(title_id, limit) or []
+        titles = Title.objects.in_bulk(
+            [other_id for other_id, _ in neighbours]
+        )
+        # Произведения, удалённые другим процессом, пропускаем.
+        return [
+            (titles[other_id], similarity)
+            for other_id, similarity in neighbours if other_id in titles
+        ]
+
+
+class LeaderboardView(APIView):
+    '''
+    Топ произведений по байесовскому рейтингу: общий, жанра,
+    категории или года. Читается из заранее посчитанной таблицы
+    TitleRanking (reviews.leaderboards) первыми ?limit= строками.
+    '''
+
+    def get(self, request, board=TitleRanking.ALL, key=None):
+        limit = get_limit(
+            request, DEFAULT_LEADERBOARD_LIMIT, MAX_LEADERBOARD_LIMIT
+        )
+        entries = get_leaderboard(board, self.get_key(board, key), limit)
+        return Response([
+            {
+                'rank': rank,
+                'id': entry.title_id,
+                'name': entry.title.name,
+                'year': entry.title.year,
+                'rating': get_rating(
+                    entry.title.rating_sum, entry.title.rating_count
+                ),
+                'review_count': entry.title.rating_count,
+                'weighted_rating': round(entry.score, 2),
+            }
+            for rank, entry in enumerate(entries, start=1)
+        ])
+
+    @staticmethod
+    def get_key(board, key):
+        '''Ключ топа: id жанра или категории по slug, год или 0.'''
+        if board == TitleRanking.GENRE:
+            return get_object_or_404(Genre, slug=key).pk
+        if board == TitleRanking.CATEGORY:
+            return get_object_or_404(Category, slug=key).pk
+        if board == TitleRanking.YEAR:
+            return int(key)
+        return 0
+
 
 class CategoryAndGenreMixin(
+    ConditionalListMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.DestroyModelMixin,
@@ -149,59 +381,115 @@ class CategoryAndGenreMixin(
 
 class CategoryViewSet(CategoryAndGenreMixin):
     '''Вывод действий с жанрами.'''
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
 
 
 class GenreViewSet(CategoryAndGenreMixin):
     '''Вывод действий с жанрами.'''
-    queryset = Genre.objects.all()
+    queryset = Genre.objects.order_by('id')
     serializer_class = GenreSerializer
 
 
-class ReviewViewset(viewsets.ModelViewSet):
-    '''Вывод действий с отзывами.'''
+class ParentObjectsMixin:
+    '''
+    Родительские объекты вложенных маршрутов. Загружаются один раз
+    за запрос и переиспользуются в get_queryset, сериализаторе
+    и perform_create.
+    '''
+
+    def get_title(self):
+        if not hasattr(self, '_title'):
+            self._title = get_object_or_404(
+                Title,
+                id=self.kwargs.get('title_id'),
+            )
+        return self._title
+
+    def get_review(self):
+        if not hasattr(self, '_review'):
+            # Отзыв и его произведение одним запросом; отзыв к другому
+            # произведению из URL не найдётся.
+            self._review = get_object_or_404(
+                Review.objects.select_related('title'),
+                id=self.kwargs.get('review_id'),
+                title_id=self.kwargs.get('title_id'),
+            )
+            self._title = self._review.title
+        return self._review
+
+
+class ReviewViewset(
+    ParentObjectsMixin,
+    CachedResponseMixin,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    viewsets.ModelViewSet,
+):
+    '''
+    Вывод действий с отзывами.
+    Список отзывов к произведению для анонимных запросов кешируется
+    (api.cache).
+    '''
     serializer_class = ReviewSerializer
     permission_classes = (PermissionsForReviewsAndComments,)
+    pagination_class = PubDatePagination
     http_method_names = ['get', 'post', 'patch', 'delete']
+    response_cache_scope = 'reviews'
+    response_cache_actions = ('list',)
 
     def get_queryset(self):
-        title = get_object_or_404(
-            Title,
-            id=self.kwargs.get('title_id'),
-        )
-        return title.reviews.all()
+        return self.get_title().reviews.select_related('author')
+
+    def get_version_keys(self):
+        # Отзывы меняют версию своего произведения (reviews.signals).
+        return [ALL, title_key(int(self.kwargs['title_id']))]
 
     def perform_create(self, serializer):
-        title = get_object_or_404(
-            Title,
-            id=self.kwargs.get('title_id'),
-        )
         serializer.save(
-            title=title,
+            title=self.get_title(),
             author=self.request.user,
         )
 
 
-class CommentViewset(viewsets.ModelViewSet):
+class CommentViewset(
+    ParentObjectsMixin,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    viewsets.ModelViewSet,
+):
     '''Вывод действий с комментариями.'''
     serializer_class = CommentSerializer
     permission_classes = (PermissionsForReviewsAndComments,)
+    pagination_class = PubDatePagination
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_queryset(self):
-        review = get_object_or_404(
-            Review,
-            id=self.kwargs.get('review_id'),
-        )
-        return review.comments.all()
+        return self.get_review().comments.select_related('author')
 
     def perform_create(self, serializer):
-        review = get_object_or_404(
-            Review,
-            id=self.kwargs.get('review_id'),
-        )
         serializer.save(
-            review=review,
+            review=self.get_review(),
             author=self.request.user,
         )
+
+
+class ReviewSearchViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    '''
+    Поиск отзывов по тексту для модераторов: ?search=, фильтры по
+    произведению, автору и дате публикации. Результаты выводятся
+    по курсору, без подсчёта всех совпадений.
+    '''
+    queryset = Review.objects.select_related('author')
+    serializer_class = ReviewSearchSerializer
+    permission_classes = (IsModerator,)
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = ReviewSearchFilter
+    pagination_class = SearchPagination
+
+
+class CommentSearchViewSet(ReviewSearchViewSet):
+    '''Поиск комментариев по тексту для модераторов.'''
+    queryset = Comment.objects.select_related('author', 'review')
+    serializer_class = CommentSearchSerializer
+    filterset_class = CommentSearchFilter
@@ -87,10 +87,9 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageSizePagination',
     'PAGE_SIZE': 10,
 }
 
@@ -101,6 +100,42 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Сколько секунд пользователь из JWT хранится в кеше.
+AUTH_USER_CACHE_TIMEOUT = 60
+# Доверять роли из подписанного токена и не читать пользователя из БД.
+JWT_TRUST_ROLE_CLAIM = False
+
+# Байесовский рейтинг в топах (reviews.leaderboards): вес средней
+# оценки по каталогу в отзывах.
+LEADERBOARD_PRIOR_REVIEWS = 5
+
+# Файл индекса похожих по содержанию произведений (reviews.content),
+# его пишет команда build_content_index. При нескольких серверах
+# файл должен быть общим.
+CONTENT_INDEX_PATH = BASE_DIR / 'content_index.npz'
+
+# Кеш Django: версии данных, агрегаты и ответы API. Локальный кеш
+# у каждого процесса свой; при нескольких процессах нужен общий,
+# например django.core.cache.backends.filebased.FileBasedCache.
+# В 'auth' — пользователи из JWT и отметки об их изменении
+# (api.authentication): отдельно от ответов, чтобы те не вытесняли
+# отметки. При нескольких процессах это должно быть общее хранилище
+# без вытеснения (например, Redis с maxmemory-policy noeviction).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Сколько секунд хранятся ответы списка и карточек произведений (api.cache).
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
 
 LANGUAGE_CODE = 'ru-RU'
 
@@ -0,0 +1,142 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+
+from reviews.indexes import BackgroundIndex
+from reviews.models import Title
+
+WORD_START_RE = re.compile(r'\b\w')
+DEFAULT_LIMIT = 10
+# Через сколько секунд индекс перечитывается из БД: изменения,
+# сделанные другими процессами, сюда не доходят.
+RELOAD_INTERVAL = 300
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+class TitleAutocomplete(BackgroundIndex):
+    '''
+    Индекс подсказок по названиям произведений в памяти процесса.
+
+    Отсортированный список ключей (хвост названия с начала каждого
+    слова, id) позволяет найти все совпадения по префиксу двумя
+    бинарными поисками. Загружается при первом запросе (reviews.indexes),
+    обновляется сигналами Title и изменениями рейтинга
+    (reviews.ratings).
+    '''
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        super().__init__(reload_interval)
+        self.keys = []
+        # id -> [название, сумма оценок, количество оценок]
+        self.titles = {}
+
+    @staticmethod
+    def get_keys(title_id, name):
+        name = normalize(name)
+        return [
+            (name[match.start():], title_id)
+            for match in WORD_START_RE.finditer(name)
+        ]
+
+    def read(self):
+        titles = {}
+        keys = []
+        rows = Title.objects.values_list(
+            'id', 'name', 'rating_sum', 'rating_count'
+        )
+        for title_id, name, rating_sum, rating_count in rows.iterator():
+            titles[title_id] = [name, rating_sum, rating_count]
+            keys.extend(self.get_keys(title_id, name))
+        keys.sort()
+        return titles, keys
+
+    def install(self, snapshot):
+        self.titles, self.keys = snapshot
+
+    def refresh(self, ids):
+        rows = Title.objects.filter(pk__in=ids).values_list(
+            'id', 'name', 'rating_sum', 'rating_count'
+        )
+        with self.lock:
+            found = set()
+            for title_id, name, rating_sum, rating_count in rows:
+                found.add(title_id)
+                self._set(title_id, name, rating_sum, rating_count)
+            for title_id in set(ids) - found:
+                self._remove(title_id)
+
+    def _remove_keys(self, title_id):
+        name = self.titles[title_id][0]
+        for key in self.get_keys(title_id, name):
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+
+    def _set(self, title_id, name, rating_sum, rating_count):
+        if title_id in self.titles:
+            self._remove_keys(title_id)
+        self.titles[title_id] = [name, rating_sum, rating_count]
+        for key in self.get_keys(title_id, name):
+            insort(self.keys, key)
+
+    def _remove(self, title_id):
+        if title_id in self.titles:
+            self._remove_keys(title_id)
+            del self.titles[title_id]
+
+    def update(self, title):
+        with self.lock:
+            if self.track(title.id):
+                self._set(
+                    title.id, title.name, title.rating_sum,
+                    title.rating_count,
+                )
+
+    def remove(self, title_id):
+        with self.lock:
+            if self.track(title_id):
+                self._remove(title_id)
+
+    def shift_rating(self, title_id, score_delta, count_delta):
+        with self.lock:
+            title = self.titles.get(title_id) if self.track(title_id) else None
+            if title is not None:
+                title[1] += score_delta
+                title[2] += count_delta
+
+    def get_rank(self, title_id):
+        '''Ключ сортировки: сначала с большим средним баллом.'''
+        name, rating_sum, rating_count = self.titles[title_id]
+        rating = rating_sum / rating_count if rating_count else -1
+        return rating, -title_id
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        '''
+        До limit произведений, у которых одно из слов названия
+        начинается с query: список (id, название, рейтинг).
+        '''
+        prefix = normalize(query.strip())
+        if not prefix:
+            return []
+        self.ensure_loaded()
+        with self.lock:
+            start = bisect_left(self.keys, (prefix,))
+            # Все ключи с префиксом меньше prefix + максимальный символ.
+            end = bisect_left(self.keys, (prefix + '\U0010ffff',), start)
+            ids = {title_id for _, title_id in self.keys[start:end]}
+            best = heapq.nlargest(limit, ids, key=self.get_rank)
+            result = []
+            for title_id in best:
+                name, rating_sum, rating_count = self.titles[title_id]
+                result.append((
+                    title_id,
+                    name,
+                    rating_sum // rating_count if rating_count else None,
+                ))
+        return result
+
+
+TITLE_AUTOCOMPLETE = TitleAutocomplete()
@@ -0,0 +1,398 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from reviews.models import Title
+from reviews.search import stem_words
+
+# Вес слова названия, жанра и категории относительно слова описания.
+NAME_WEIGHT = 3
+GENRE_WEIGHT = 2
+CATEGORY_WEIGHT = 1
+# Короткие слова — в основном предлоги и союзы.
+MIN_WORD_LENGTH = 3
+# Термины, которые встречаются больше чем в MAX_DF доле произведений,
+# не различают их и только удлиняют списки кандидатов.
+MAX_DF = 0.3
+# В векторе произведения остаются MAX_TERMS самых весомых терминов,
+# в запросе — QUERY_TERMS: память и время поиска не зависят от длины
+# описаний.
+MAX_TERMS = 32
+QUERY_TERMS = 16
+# Сколько новых произведений копится отдельно, прежде чем влиться
+# в основную матрицу.
+MERGE_SIZE = 1000
+BATCH_SIZE = 10000
+DEFAULT_LIMIT = 10
+
+
+def get_terms(name, description, genres=(), category=None):
+    '''Термины произведения с весами: основы слов, жанры и категория.'''
+    terms = Counter()
+    for word in stem_words(name):
+        if len(word) >= MIN_WORD_LENGTH:
+            terms[word] += NAME_WEIGHT
+    terms.update(
+        word for word in stem_words(description)
+        if len(word) >= MIN_WORD_LENGTH
+    )
+    for slug in genres:
+        terms[f'genre:{slug}'] += GENRE_WEIGHT
+    if category:
+        terms[f'category:{category}'] += CATEGORY_WEIGHT
+    return terms
+
+
+def iter_documents(batch_size=BATCH_SIZE):
+    '''(id, термины) всех произведений по возрастанию id, пачками.'''
+    titles = Title.objects.order_by('id').values_list(
+        'id', 'name', 'description', 'category__slug'
+    )
+    last_id = 0
+    while True:
+        batch = list(titles.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        genres = {}
+        for title_id, slug in Title.genre.through.objects.filter(
+            title_id__in=[row[0] for row in batch]
+        ).values_list('title_id', 'genre__slug'):
+            genres.setdefault(title_id, []).append(slug)
+        for title_id, name, description, category in batch:
+            yield title_id, get_terms(
+                name, description, genres.get(title_id, ()), category
+            )
+
+
+def prune_rows(matrix, max_terms):
+    '''Оставляет в каждой строке CSR max_terms наибольших значений.'''
+    lengths = np.diff(matrix.indptr)
+    for row in np.flatnonzero(lengths > max_terms):
+        start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+        values = matrix.data[start:stop]
+        threshold = np.partition(values, -max_terms)[-max_terms]
+        # При равенстве на пороге остаются первые по номеру термина.
+        keep = values > threshold
+        ties = np.flatnonzero(values == threshold)
+        keep[ties[:max_terms - keep.sum()]] = True
+        values[~keep] = 0
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)) @ matrix
+
+
+class ContentIndex:
+    '''
+    TF-IDF векторы произведений по названию, описанию, жанрам
+    и категории для поиска похожих по содержанию.
+
+    Строится пачками командой build_content_index и сохраняется
+    в CONTENT_INDEX_PATH; запрос только читает файл, без файла индекс
+    пуст. Процесс держит матрицу произведения x термины и её
+    транспонированную копию: похожие на произведение считаются по строкам
+    его терминов, то есть только по произведениям с общими терминами.
+    Новые произведения (TitlePostSerializer) добавляются без перестройки:
+    с сохранённым словарём и IDF.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.loaded_at = None
+        self.file_mtime = None
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.title_ids = np.zeros(0, dtype=np.int64)
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.matrix_t = self.matrix.T.tocsr()
+        self.removed = np.zeros(0, dtype=bool)
+        # id -> (номера терминов, веса): добавленные после загрузки.
+        self.pending = {}
+
+    def get_path(self):
+        return self.path or settings.CONTENT_INDEX_PATH
+
+    @staticmethod
+    def build(documents):
+        '''
+        Словарь, IDF, id произведений и матрица векторов из пар
+        (id, термины) по возрастанию id.
+        '''
+        vocabulary = {}
+        title_ids = []
+        rows, columns, counts = [], [], []
+        for row, (title_id, terms) in enumerate(documents):
+            title_ids.append(title_id)
+            for term, count in terms.items():
+                rows.append(row)
+                columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+        shape = (len(title_ids), len(vocabulary))
+        matrix = sparse.csr_matrix(
+            (np.array(counts, dtype=np.float32), (rows, columns)),
+            shape=shape,
+        )
+        df = np.bincount(matrix.indices, minlength=shape[1])
+        # Термин одного произведения не связывает его ни с кем.
+        useful = np.flatnonzero(
+            (df > 1) & (df <= max(MAX_DF * shape[0], 2))
+        )
+        idf = (
+            np.log((1 + shape[0]) / (1 + df[useful])) + 1
+        ).astype(np.float32)
+        matrix = matrix[:, useful]
+        matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+        matrix = normalize_rows(prune_rows(matrix, MAX_TERMS)).tocsr()
+        terms = {column: term for term, column in vocabulary.items()}
+        vocabulary = {
+            terms[column]: new_column
+            for new_column, column in enumerate(useful)
+        }
+        return vocabulary, idf, np.array(title_ids, dtype=np.int64), matrix
+
+    def save(self, vocabulary, idf, title_ids, matrix):
+        '''Записывает индекс в файл целиком, заменяя прежний.'''
+        path = self.get_path()
+        terms = np.array(
+            sorted(vocabulary, key=vocabulary.get), dtype=str
+        )
+        with open(f'{path}.tmp', 'wb') as file:
+            np.savez(
+                file,
+                terms=terms,
+                columns=np.array(
+                    [vocabulary[term] for term in terms], dtype=np.int64
+                ),
+                idf=idf,
+                title_ids=title_ids,
+                data=matrix.data,
+                indices=matrix.indices,
+                indptr=matrix.indptr,
+                shape=np.array(matrix.shape),
+            )
+        os.replace(f'{path}.tmp', path)
+
+    def read(self, path):
+        with np.load(path) as data:
+            vocabulary = dict(zip(data['terms'].tolist(),
+                                  data['columns'].tolist()))
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']),
+                shape=tuple(data['shape']),
+            )
+            return vocabulary, data['idf'], data['title_ids'], matrix
+
+    def load(self):
+        path = self.get_path()
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None:
+            # Индекс строит только команда: до неё похожих нет.
+            index = self.get_empty()
+        else:
+            index = self.read(path)
+        self.set_index(*index)
+        self.file_mtime = mtime
+
+    @staticmethod
+    def get_empty():
+        return (
+            {},
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int64),
+            sparse.csr_matrix((0, 0), dtype=np.float32),
+        )
+
+    def set_index(self, vocabulary, idf, title_ids, matrix):
+        with self.lock:
+            self.vocabulary = vocabulary
+            self.idf = idf
+            self.title_ids = title_ids
+            self.matrix = matrix
+            self.matrix_t = matrix.T.tocsr()
+            self.removed = np.zeros(len(title_ids), dtype=bool)
+            self.pending = {}
+            self.loaded_at = time.monotonic()
+
+    def is_stale(self):
+        try:
+            mtime = os.stat(self.get_path()).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        return mtime != self.file_mtime
+
+    def ensure_loaded(self):
+        if self.loaded_at is None or self.is_stale():
+            self.load()
+
+    def invalidate(self):
+        '''Индекс перечитается из файла при следующем запросе.'''
+        with self.lock:
+            self.loaded_at = None
+
+    def get_row(self, title_id):
+        '''Номер строки произведения в основной матрице или None.'''
+        row = np.searchsorted(self.title_ids, title_id)
+        if (
+            row < len(self.title_ids) and self.title_ids[row] == title_id
+            and not self.removed[row]
+        ):
+            return row
+        return None
+
+    def get_vector(self, terms):
+        '''Вектор новых терминов со словарём и IDF индекса.'''
+        columns, weights = [], []
+        for term, count in terms.items():
+            column = self.vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+                weights.append((1 + np.log(count)) * self.idf[column])
+        columns = np.array(columns, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float32)
+        if len(weights) > MAX_TERMS:
+            top = np.argsort(-weights, kind='stable')[:MAX_TERMS]
+            columns, weights = columns[top], weights[top]
+        norm = np.sqrt((weights ** 2).sum())
+        return columns, weights / norm if norm else weights
+
+    def add(self, title, genres=(), category=None):
+        '''
+        Добавляет или заменяет вектор произведения: термины считаются
+        по переданным жанрам и категории (slug), без запросов к БД.
+        '''
+        if self.loaded_at is None:
+            return
+        vector = self.get_vector(
+            get_terms(title.name, title.description, genres, category)
+        )
+        with self.lock:
+            row = self.get_row(title.pk)
+            if row is not None:
+                self.removed[row] = True
+            self.pending[title.pk] = vector
+            if len(self.pending) >= MERGE_SIZE:
+                self.merge()
+
+    def remove(self, title_id):
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            row = self.get_row(title_id)
+            if row is not None:
+                self.removed[row] = True
+            self.pending.pop(title_id, None)
+
+    def contains(self, title_id):
+        self.ensure_loaded()
+        with self.lock:
+            return (
+                title_id in self.pending
+                or self.get_row(title_id) is not None
+            )
+
+    def merge(self):
+        '''Вливает добавленные векторы в основную матрицу.'''
+        pending = sorted(self.pending.items())
+        rows = sparse.csr_matrix(
+            (
+                np.concatenate([w for _, (_, w) in pending]),
+                np.concatenate([c for _, (c, _) in pending]),
+                np.cumsum([0] + [len(c) for _, (c, _) in pending]),
+            ),
+            shape=(len(pending), self.matrix.shape[1]),
+            dtype=np.float32,
+        )
+        keep = np.flatnonzero(~self.removed)
+        title_ids = np.concatenate([
+            self.title_ids[keep],
+            np.array([title_id for title_id, _ in pending], dtype=np.int64),
+        ])
+        order = np.argsort(title_ids, kind='stable')
+        matrix = sparse.vstack([self.matrix[keep], rows]).tocsr()[order]
+        self.set_index(self.vocabulary, self.idf, title_ids[order], matrix)
+
+    def similar(self, title_id, limit=DEFAULT_LIMIT):
+        '''
+        [(id, сходство)] самых похожих произведений по убыванию
+        сходства или None, если произведения нет в индексе.
+        '''
+        self.ensure_loaded()
+        with self.lock:
+            row = self.get_row(title_id)
+            if row is not None:
+                vector = self.matrix[row]
+                columns, weights = vector.indices, vector.data
+            elif title_id in self.pending:
+                columns, weights = self.pending[title_id]
+            else:
+                return None
+            if len(weights) > QUERY_TERMS:
+                top = np.argsort(-weights, kind='stable')[:QUERY_TERMS]
+                columns, weights = columns[top], weights[top]
+            # Разреженная строка запроса на строки его терминов
+            # в транспонированной матрице: сходство считается только
+            # для произведений с общими терминами, без плотного вектора
+            # на весь каталог.
+            query = sparse.csr_matrix(
+                (weights, np.arange(len(columns)), [0, len(columns)]),
+                shape=(1, len(columns)),
+            )
+            scores = (query @ self.matrix_t[columns]).tocsr()
+            indices, values = scores.indices, scores.data
+            keep = ~self.removed[indices]
+            if row is not None:
+                keep &= indices != row
+            candidates = [
+                (float(score), int(self.title_ids[index]))
+                for index, score in self.top(
+                    indices[keep], values[keep], limit
+                )
+            ]
+            for other_id, (other_columns, other_weights) in (
+                self.pending.items()
+            ):
+                if other_id != title_id:
+                    common, first, second = np.intersect1d(
+                        columns, other_columns, return_indices=True
+                    )
+                    score = float(
+                        weights[first] @ other_weights[second]
+                    ) if len(common) else 0
+                    candidates.append((score, other_id))
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            (other_id, score) for score, other_id in candidates[:limit]
+            if score > 0
+        ]
+
+    def top(self, indices, scores, limit):
+        '''
+        (номер строки, сходство) limit наибольших из кандидатов — строк
+        indices со сходством scores, по убыванию.
+        '''
+        if not len(scores):
+            return []
+        count = min(limit, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.lexsort((self.title_ids[indices[top]], -scores[top]))]
+        return [
+            (indices[position], scores[position])
+            for position in top if scores[position] > 0
+        ]
+
+
+TITLE_CONTENT = ContentIndex()
@@ -0,0 +1,139 @@
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+from reviews.models import Category, Comment, Genre, Review, Title, User
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+
+class ExportSource:
+    '''
+    Выгружаемая таблица: имя для API, имя файла, совместимое с командой
+    import, и колонки в виде пар (заголовок CSV, атрибут модели).
+    '''
+
+    def __init__(self, name, filename, model, columns):
+        self.name = name
+        self.filename = filename
+        self.model = model
+        self.columns = columns
+
+    @property
+    def header(self):
+        return [column for column, _ in self.columns]
+
+    @property
+    def attnames(self):
+        return [attname for _, attname in self.columns]
+
+    def get_filename(self, export_format, compress=False):
+        stem = self.filename.rsplit('.', 1)[0]
+        return f'{stem}.{export_format}' + ('.gz' if compress else '')
+
+
+EXPORT_SOURCES = {
+    source.name: source for source in (
+        ExportSource('categories', 'category.csv', Category, [
+            ('id', 'id'), ('name', 'name'), ('slug', 'slug'),
+        ]),
+        ExportSource('genres', 'genre.csv', Genre, [
+            ('id', 'id'), ('name', 'name'), ('slug', 'slug'),
+        ]),
+        ExportSource('titles', 'titles.csv', Title, [
+            ('id', 'id'), ('name', 'name'), ('year', 'year'),
+            ('category', 'category_id'), ('description', 'description'),
+        ]),
+        ExportSource('genre_title', 'genre_title.csv', Title.genre.through, [
+            ('id', 'id'), ('title_id', 'title_id'), ('genre_id', 'genre_id'),
+        ]),
+        ExportSource('users', 'users.csv', User, [
+            ('id', 'id'), ('username', 'username'), ('email', 'email'),
+            ('role', 'role'), ('bio', 'bio'), ('first_name', 'first_name'),
+            ('last_name', 'last_name'),
+        ]),
+        ExportSource('reviews', 'review.csv', Review, [
+            ('id', 'id'), ('title_id', 'title_id'), ('text', 'text'),
+            ('author', 'author_id'), ('score', 'score'),
+            ('pub_date', 'pub_date'),
+        ]),
+        ExportSource('comments', 'comments.csv', Comment, [
+            ('id', 'id'), ('review_id', 'review_id'), ('text', 'text'),
+            ('author', 'author_id'), ('pub_date', 'pub_date'),
+        ]),
+    )
+}
+
+
+def format_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Строки таблицы по порядку id. iterator() читает их из БД порциями
+    (на PostgreSQL — серверным курсором) и не кеширует в QuerySet.
+    '''
+    rows = source.model.objects.order_by('id').values_list(*source.attnames)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield [format_value(value) for value in row]
+
+
+class Echo:
+    '''Буфер для csv.writer, который сразу возвращает записанную строку.'''
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(source.header)
+    lines = []
+    for row in iter_rows(source, chunk_size):
+        lines.append(writer.writerow(
+            ['' if value is None else value for value in row]
+        ))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_ndjson(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    lines = []
+    for row in iter_rows(source, chunk_size):
+        lines.append(json.dumps(
+            dict(zip(source.header, row)), ensure_ascii=False
+        ) + '\n')
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_gzip(chunks):
+    '''Сжимает поток строк в gzip по мере чтения.'''
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(source, export_format, compress=False,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Поток данных таблицы: строки текста или, со сжатием, байты.'''
+    if export_format not in FORMATS:
+        raise ValueError(f'Неизвестный формат {export_format}')
+    chunks = (iter_csv if export_format == 'csv' else iter_ndjson)(
+        source, chunk_size
+    )
+    return iter_gzip(chunks) if compress else chunks
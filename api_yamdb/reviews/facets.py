@@ -0,0 +1,269 @@
+from collections import defaultdict
+
+from reviews.indexes import BackgroundIndex
+from reviews.models import Category, Genre, Title
+
+# Через сколько секунд индекс перечитывается из БД: изменения,
+# сделанные другими процессами, сюда не доходят.
+RELOAD_INTERVAL = 300
+# Ширина интервала в счётчиках по годам: 1990 — это 1990–1999.
+YEAR_BUCKET = 10
+ANY = 'any'
+ALL = 'all'
+
+
+def make_bitset(ids):
+    '''Битовое множество (int, бит N — id N) из списка id за один проход.'''
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(bits):
+        return bits.bit_count()
+else:
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+class TitleFacets(BackgroundIndex):
+    '''
+    Битовый индекс произведений для фасетного поиска в памяти процесса.
+
+    Для каждого жанра, категории и года хранится множество id
+    произведений в виде int: пересечение и объединение фильтров —
+    побитовые & и |, счётчик — число единичных битов. Загружается при
+    первом запросе (reviews.indexes), обновляется сигналами Title, Genre,
+    Category и связи произведений с жанрами.
+    '''
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        super().__init__(reload_interval)
+        self.all = 0
+        self.genres = {}
+        self.categories = {}
+        self.years = {}
+        self.genre_ids = {}
+        self.category_ids = {}
+        # id -> [id категории, год, множество id жанров]
+        self.titles = {}
+
+    def read(self):
+        titles = {
+            title_id: [category_id, year, set()]
+            for title_id, category_id, year in Title.objects.values_list(
+                'id', 'category_id', 'year'
+            ).iterator()
+        }
+        pairs = Title.genre.through.objects.values_list('title_id', 'genre_id')
+        for title_id, genre_id in pairs.iterator():
+            if title_id in titles:
+                titles[title_id][2].add(genre_id)
+        genres = defaultdict(list)
+        categories = defaultdict(list)
+        years = defaultdict(list)
+        for title_id, (category_id, year, genre_ids) in titles.items():
+            if category_id is not None:
+                categories[category_id].append(title_id)
+            years[year].append(title_id)
+            for genre_id in genre_ids:
+                genres[genre_id].append(title_id)
+        return {
+            'titles': titles,
+            'all': make_bitset(list(titles)),
+            'genres': {key: make_bitset(ids) for key, ids in genres.items()},
+            'categories': {
+                key: make_bitset(ids) for key, ids in categories.items()
+            },
+            'years': {key: make_bitset(ids) for key, ids in years.items()},
+            'genre_ids': dict(Genre.objects.values_list('slug', 'id')),
+            'category_ids': dict(Category.objects.values_list('slug', 'id')),
+        }
+
+    def install(self, snapshot):
+        for name, value in snapshot.items():
+            setattr(self, name, value)
+
+    def refresh(self, ids):
+        titles = {
+            title_id: [category_id, year, set()]
+            for title_id, category_id, year in Title.objects.filter(
+                pk__in=ids
+            ).values_list('id', 'category_id', 'year')
+        }
+        pairs = Title.genre.through.objects.filter(
+            title_id__in=titles
+        ).values_list('title_id', 'genre_id')
+        for title_id, genre_id in pairs:
+            titles[title_id][2].add(genre_id)
+        with self.lock:
+            for title_id in ids:
+                self._remove(title_id)
+            for title_id, title in titles.items():
+                self._add(title_id, title)
+
+    @staticmethod
+    def _set_bit(bitsets, key, title_id, value):
+        bits = bitsets.get(key, 0)
+        if value:
+            bits |= 1 << title_id
+        else:
+            bits &= ~(1 << title_id)
+        if bits:
+            bitsets[key] = bits
+        else:
+            bitsets.pop(key, None)
+
+    def _set_title_bits(self, title_id, value):
+        category_id, year, genre_ids = self.titles[title_id]
+        if category_id is not None:
+            self._set_bit(self.categories, category_id, title_id, value)
+        self._set_bit(self.years, year, title_id, value)
+        for genre_id in genre_ids:
+            self._set_bit(self.genres, genre_id, title_id, value)
+
+    def _add(self, title_id, title):
+        self.titles[title_id] = title
+        self._set_title_bits(title_id, True)
+        self.all |= 1 << title_id
+
+    def _remove(self, title_id):
+        if title_id in self.titles:
+            self._set_title_bits(title_id, False)
+            del self.titles[title_id]
+            self.all &= ~(1 << title_id)
+
+    def update(self, title):
+        with self.lock:
+            if not self.track(title.id):
+                return
+            genre_ids = set()
+            if title.id in self.titles:
+                genre_ids = self.titles[title.id][2]
+                self._remove(title.id)
+            self._add(title.id, [title.category_id, title.year, genre_ids])
+
+    def remove(self, title_id):
+        with self.lock:
+            if self.track(title_id):
+                self._remove(title_id)
+
+    def set_genres(self, pairs, value):
+        '''Добавляет или убирает связи (id произведения, id жанра).'''
+        with self.lock:
+            if not self.track(*{title_id for title_id, _ in pairs}):
+                return
+            for title_id, genre_id in pairs:
+                title = self.titles.get(title_id)
+                if title is None:
+                    continue
+                if value:
+                    title[2].add(genre_id)
+                else:
+                    title[2].discard(genre_id)
+                self._set_bit(self.genres, genre_id, title_id, value)
+
+    def clear_genres(self, title_id):
+        with self.lock:
+            title = self.titles.get(title_id)
+            if self.track(title_id) and title is not None:
+                self.set_genres(
+                    [(title_id, genre_id) for genre_id in set(title[2])],
+                    False,
+                )
+
+    def _select(self, bitsets, ids, keys, mode):
+        '''Объединение (ANY) или пересечение (ALL) множеств по slug.'''
+        selected = [bitsets.get(ids.get(key), 0) for key in keys]
+        if mode == ALL:
+            bits = self.all
+            for value in selected:
+                bits &= value
+            return bits
+        bits = 0
+        for value in selected:
+            bits |= value
+        return bits
+
+    def _select_years(self, year_min, year_max):
+        bits = 0
+        for year, value in self.years.items():
+            if (
+                (year_min is None or year >= year_min)
+                and (year_max is None or year <= year_max)
+            ):
+                bits |= value
+        return bits
+
+    @staticmethod
+    def _count(bitsets, ids, base, selected_keys):
+        '''Счётчики по значениям фасета: ненулевые и выбранные.'''
+        counts = {}
+        for key, pk in ids.items():
+            count = popcount(bitsets.get(pk, 0) & base)
+            if count or key in selected_keys:
+                counts[key] = count
+        return counts
+
+    def search(self, genres=(), categories=(), year_min=None, year_max=None,
+               genre_mode=ANY):
+        '''
+        Число произведений, подходящих под фильтры, и счётчики по
+        жанрам, категориям и десятилетиям. Внутри фасета значения
+        объединяются (жанры — по genre_mode), фасеты пересекаются.
+        Счётчик фасета считается без его собственного фильтра, чтобы
+        показать, сколько добавит выбор ещё одного значения.
+        '''
+        self.ensure_loaded()
+        with self.lock:
+            masks = {}
+            if genres:
+                masks['genre'] = self._select(
+                    self.genres, self.genre_ids, genres, genre_mode
+                )
+            if categories:
+                masks['category'] = self._select(
+                    self.categories, self.category_ids, categories, ANY
+                )
+            if year_min is not None or year_max is not None:
+                masks['year'] = self._select_years(year_min, year_max)
+
+            def matching(exclude=None):
+                bits = self.all
+                for name, mask in masks.items():
+                    if name != exclude:
+                        bits &= mask
+                return bits
+
+            selected = matching()
+            year_counts = defaultdict(int)
+            year_base = matching('year')
+            for year, bits in self.years.items():
+                count = popcount(bits & year_base)
+                if count:
+                    year_counts[year // YEAR_BUCKET * YEAR_BUCKET] += count
+            return {
+                'count': popcount(selected),
+                'facets': {
+                    'genre': self._count(
+                        self.genres, self.genre_ids,
+                        selected if genre_mode == ALL else matching('genre'),
+                        genres,
+                    ),
+                    'category': self._count(
+                        self.categories, self.category_ids,
+                        matching('category'), categories,
+                    ),
+                    'year': {
+                        str(bucket): year_counts[bucket]
+                        for bucket in sorted(year_counts)
+                    },
+                },
+            }
+
+
+TITLE_FACETS = TitleFacets()
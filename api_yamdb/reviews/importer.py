@@ -0,0 +1,721 @@
+import csv
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from datetime import datetime
+
+import django
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from reviews import leaderboards, versions
+from reviews.autocomplete import TITLE_AUTOCOMPLETE
+from reviews.content import TITLE_CONTENT
+from reviews.facets import TITLE_FACETS
+from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.ratings import recalculate_ratings
+from reviews.search import (COMMENT_INDEX, REVIEW_INDEX, TITLE_INDEX,
+                            TITLE_TRIGRAM_INDEX)
+
+DEFAULT_BATCH_SIZE = 1000
+# Как часто (в секундах) печатать прогресс загрузки файла.
+PROGRESS_INTERVAL = 1.0
+
+
+class CSVImportError(Exception):
+    '''Файл не удалось загрузить в БД.'''
+
+
+class ImportRowError(ValueError):
+    '''Строку CSV нельзя загрузить в БД.'''
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'Ожидалось целое число, получено {value!r}')
+
+
+def to_datetime(value):
+    parsed = parse_datetime(value or '')
+    if parsed is None:
+        raise ImportRowError(f'Некорректная дата {value!r}')
+    return parsed
+
+
+def to_score(value):
+    score = to_int(value)
+    if not 1 <= score <= 10:
+        raise ImportRowError(f'Оценка {score} вне диапазона от 1 до 10')
+    return score
+
+
+def convert_category_and_genre(row):
+    return {
+        'id': to_int(row['id']),
+        'name': row['name'],
+        'slug': row['slug'],
+    }
+
+
+def convert_title(row):
+    category = row.get('category')
+    return {
+        'id': to_int(row['id']),
+        'name': row['name'],
+        'year': to_int(row['year']),
+        'description': row.get('description') or '',
+        'category_id': to_int(category) if category else None,
+    }
+
+
+def convert_genre_title(row):
+    return {
+        'id': to_int(row['id']),
+        'title_id': to_int(row['title_id']),
+        'genre_id': to_int(row['genre_id']),
+    }
+
+
+def convert_user(row):
+    return {
+        'id': to_int(row['id']),
+        'username': row['username'],
+        'email': row['email'],
+        'role': row.get('role') or 'user',
+        'bio': row.get('bio') or '',
+        'first_name': row.get('first_name') or '',
+        'last_name': row.get('last_name') or '',
+    }
+
+
+def convert_review(row):
+    return {
+        'id': to_int(row['id']),
+        'title_id': to_int(row['title_id']),
+        'text': row['text'],
+        'author_id': to_int(row['author']),
+        'score': to_score(row['score']),
+        'pub_date': to_datetime(row['pub_date']),
+    }
+
+
+def convert_comment(row):
+    return {
+        'id': to_int(row['id']),
+        'review_id': to_int(row['review_id']),
+        'text': row['text'],
+        'author_id': to_int(row['author']),
+        'pub_date': to_datetime(row['pub_date']),
+    }
+
+
+class CSVSource:
+    '''Описание одного CSV-файла: модель, разбор строки и внешние ключи.'''
+
+    def __init__(self, filename, model, convert, foreign_keys=None):
+        self.filename = filename
+        self.model = model
+        self.convert = convert
+        # {атрибут с id: модель, на которую он ссылается}
+        self.foreign_keys = foreign_keys or {}
+
+    def __str__(self):
+        return self.filename
+
+
+# Файлы перечислены в порядке зависимостей по внешним ключам.
+IMPORT_SOURCES = (
+    CSVSource('category.csv', Category, convert_category_and_genre),
+    CSVSource('genre.csv', Genre, convert_category_and_genre),
+    CSVSource(
+        'titles.csv', Title, convert_title,
+        foreign_keys={'category_id': Category},
+    ),
+    CSVSource(
+        'genre_title.csv', Title.genre.through, convert_genre_title,
+        foreign_keys={'title_id': Title, 'genre_id': Genre},
+    ),
+    CSVSource('users.csv', User, convert_user),
+    CSVSource(
+        'review.csv', Review, convert_review,
+        foreign_keys={'title_id': Title, 'author_id': User},
+    ),
+    CSVSource(
+        'comments.csv', Comment, convert_comment,
+        foreign_keys={'review_id': Review, 'author_id': User},
+    ),
+)
+SOURCES_BY_FILENAME = {source.filename: source for source in IMPORT_SOURCES}
+
+
+def get_dependencies(source, sources):
+    '''Файлы из sources, которые нужно записать раньше source.'''
+    models = set(source.foreign_keys.values())
+    return {
+        other for other in sources
+        if other is not source and other.model in models
+    }
+
+
+def read_csv(path, offset=0, row_number=0):
+    '''
+    Построчно читает CSV, не загружая файл в память целиком.
+    Возвращает номер строки, словарь значений и смещение в байтах
+    после этой строки, с которого можно продолжить чтение.
+    '''
+    with open(path, 'rb') as raw:
+        position = 0
+
+        def lines():
+            nonlocal position
+            for line in raw:
+                position += len(line)
+                yield line.decode('utf-8')
+
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        if header is None:
+            return
+        header[0] = header[0].lstrip('\ufeff')
+        if offset:
+            raw.seek(offset)
+            position = offset
+        for values in reader:
+            if not values:
+                continue
+            row_number += 1
+            yield row_number, dict(zip(header, values)), position
+
+
+def convert_row(source, row):
+    try:
+        return source.convert(row)
+    except KeyError as error:
+        raise ImportRowError(f'Нет колонки {error}')
+
+
+def parse_records(source, path, batch_size, offset=0, row_number=0):
+    '''
+    Разбирает файл пачками, не обращаясь к БД. Каждая запись —
+    (строки [(номер, значения)], ошибки [(номер, текст)],
+    номер последней строки, смещение в байтах после неё).
+    '''
+    batch, errors = [], []
+    for row_number, row, offset in read_csv(path, offset, row_number):
+        try:
+            batch.append((row_number, convert_row(source, row)))
+        except ImportRowError as error:
+            errors.append((row_number, str(error)))
+        if len(batch) + len(errors) >= batch_size:
+            yield batch, errors, row_number, offset
+            batch, errors = [], []
+    if batch or errors:
+        yield batch, errors, row_number, offset
+
+
+def init_worker():
+    django.setup()
+
+
+def parse_to_spool(filename, path, spool_path, batch_size, offset,
+                   row_number):
+    '''
+    Выполняется в пуле процессов: разбирает CSV во временный файл,
+    чтобы разобранные данные не копились в памяти до записи в БД.
+    '''
+    started = time.monotonic()
+    source = SOURCES_BY_FILENAME[filename]
+    with open(spool_path, 'wb') as spool:
+        for record in parse_records(
+            source, path, batch_size, offset, row_number
+        ):
+            pickle.dump(record, spool, pickle.HIGHEST_PROTOCOL)
+    return time.monotonic() - started
+
+
+def read_spool(spool_path):
+    with open(spool_path, 'rb') as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+
+def normalize_value(value):
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = value.astimezone(timezone.utc)
+        return value.isoformat()
+    return repr(value)
+
+
+def content_hash(values):
+    '''Хеш содержимого строки для пропуска неизменившихся записей.'''
+    payload = '\x1f'.join(
+        f'{name}={normalize_value(values[name])}' for name in sorted(values)
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class Checkpoint:
+    '''
+    Прогресс инкрементальной загрузки: для каждого файла номер строки
+    и смещение в байтах, до которых данные уже записаны в БД.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.files = json.load(file)
+
+    @staticmethod
+    def signature(csv_path):
+        stat = os.stat(csv_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def get(self, filename, csv_path):
+        '''Сохранённая позиция или None, если файл с тех пор изменился.'''
+        state = self.files.get(filename)
+        if not state or any(
+            state.get(key) != value
+            for key, value in self.signature(csv_path).items()
+        ):
+            return None
+        return state
+
+    def save(self, filename, csv_path, row, offset, done=False):
+        with self.lock:
+            self.files[filename] = {
+                'row': row,
+                'offset': offset,
+                'done': done,
+                **self.signature(csv_path),
+            }
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.files, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.files = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ImportStats:
+    '''Счётчики загрузки одного файла.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.parse_time = 0.0
+        self.write_time = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+        self.last_report = self.started
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.skipped + self.failed
+
+    @property
+    def rate(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'{self.filename}: добавлено {self.inserted}, '
+            f'обновлено {self.updated}, без изменений {self.skipped}, '
+            f'с ошибками {self.failed} ({self.rate:.0f} строк/с)'
+        )
+
+    @property
+    def timing(self):
+        return (
+            f'{self.filename}: разбор {self.parse_time:.2f} с, '
+            f'запись {self.write_time:.2f} с'
+        )
+
+
+class CSVImporter:
+    '''
+    Потоковая загрузка CSV пачками через bulk_create.
+    Внешние ключи проверяются по множествам id, загруженным из БД
+    один раз за запуск, а не запросом на каждую строку.
+
+    В инкрементальном режиме строки сохраняются по первичному ключу
+    (новые добавляются, изменившиеся обновляются, совпадающие по хешу
+    пропускаются), каждая пачка фиксируется отдельной транзакцией,
+    а позиция в файле записывается в checkpoint для продолжения
+    прерванной загрузки.
+    '''
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, log=print,
+                 max_logged_errors=10, incremental=False, checkpoint=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.log = log
+        self.max_logged_errors = max_logged_errors
+        self.incremental = incremental
+        self.checkpoint = checkpoint
+        self.known_ids = {}
+
+    def run(self, sources=IMPORT_SOURCES, workers=1):
+        started = time.monotonic()
+        if workers > 1:
+            results = ImportPipeline(self, sources, workers).run()
+        else:
+            results = [self.import_file(source) for source in sources]
+        self.finish({source.model for source in sources})
+        for stats in results:
+            self.log(str(stats))
+        if workers > 1:
+            for stats in results:
+                self.log(stats.timing)
+        self.log(f'Всего: {time.monotonic() - started:.2f} с')
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        return results
+
+    def finish(self, models):
+        '''
+        Сбрасывает последовательности id, пересчитывает рейтинги,
+        поисковые индексы, подсказки, фасеты, топы, время изменения
+        произведений и версии кеша ответов: массовая запись обходит
+        сигналы.
+        '''
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        if Review in models:
+            recalculate_ratings()
+        for model, index in (
+            (Title, TITLE_INDEX),
+            (Title, TITLE_TRIGRAM_INDEX),
+            (Review, REVIEW_INDEX),
+            (Comment, COMMENT_INDEX),
+        ):
+            if model in models:
+                index.rebuild()
+        if Title in models:
+            TITLE_AUTOCOMPLETE.invalidate()
+        if models & {Title.genre.through, Genre, Category}:
+            # Жанры и категории выводятся в произведениях.
+            Title.objects.update(updated_at=timezone.now())
+        if models & {Title, Title.genre.through, Genre, Category}:
+            TITLE_FACETS.invalidate()
+            TITLE_CONTENT.invalidate()
+        if models & {Title, Title.genre.through, Category, Review}:
+            leaderboards.rebuild()
+        versions.bump_on_commit(versions.ALL)
+
+    def get_known_ids(self, model):
+        if model not in self.known_ids:
+            self.known_ids[model] = set(
+                model.objects.values_list('id', flat=True).iterator()
+            )
+        return self.known_ids[model]
+
+    def check_foreign_keys(self, source, values):
+        for attname, model in source.foreign_keys.items():
+            value = values[attname]
+            if value is not None and value not in self.get_known_ids(model):
+                raise ImportRowError(
+                    f'{model.__name__} с id={value} не найден'
+                )
+
+    def get_path(self, source):
+        path = os.path.join(self.path, source.filename)
+        if not os.path.exists(path):
+            raise CSVImportError(f'Файл {path} не найден')
+        return path
+
+    def get_start_position(self, source, path):
+        '''
+        Смещение и номер строки, с которых нужно читать файл,
+        или None, если по checkpoint файл уже загружен.
+        '''
+        if not self.incremental or self.checkpoint is None:
+            return 0, 0
+        state = self.checkpoint.get(source.filename, path)
+        if not state:
+            return 0, 0
+        if state['done']:
+            self.log(f'{source.filename}: уже загружен, пропускаем')
+            return None
+        self.log(f'{source.filename}: продолжаем со строки {state["row"] + 1}')
+        return state['offset'], state['row']
+
+    def import_file(self, source):
+        path = self.get_path(source)
+        stats = ImportStats(source.filename)
+        position = self.get_start_position(source, path)
+        if position is not None:
+            records = parse_records(source, path, self.batch_size, *position)
+            self.write_records(source, path, records, stats)
+        return stats
+
+    def write_records(self, source, path, records, stats):
+        '''
+        Записывает разобранные пачки: одной транзакцией на файл
+        или, в инкрементальном режиме, транзакцией на пачку
+        с сохранением позиции в checkpoint.
+        '''
+        stats.started = stats.last_report = time.monotonic()
+        if not self.incremental:
+            with transaction.atomic():
+                for record in records:
+                    self.write_record(source, record, stats)
+            stats.finished = time.monotonic()
+            return
+        row_number = offset = 0
+        for record in records:
+            with transaction.atomic():
+                self.write_record(source, record, stats)
+            _, _, row_number, offset = record
+            if self.checkpoint is not None:
+                self.checkpoint.save(source.filename, path, row_number, offset)
+        if self.checkpoint is not None:
+            self.checkpoint.save(
+                source.filename, path, row_number, offset, done=True
+            )
+        stats.finished = time.monotonic()
+
+    def write_record(self, source, record, stats):
+        batch, errors, _, _ = record
+        for row_number, message in errors:
+            self.report_error(stats, row_number, message)
+        valid = []
+        for row_number, values in batch:
+            try:
+                self.check_foreign_keys(source, values)
+            except ImportRowError as error:
+                self.report_error(stats, row_number, error)
+                continue
+            valid.append((row_number, values))
+        if valid:
+            started = time.monotonic()
+            self.write(source, valid, stats)
+            stats.write_time += time.monotonic() - started
+        self.report_progress(stats)
+
+    def report_progress(self, stats):
+        if time.monotonic() - stats.last_report >= PROGRESS_INTERVAL:
+            stats.last_report = time.monotonic()
+            self.log(str(stats))
+
+    def report_error(self, stats, row_number, error):
+        stats.failed += 1
+        if stats.failed <= self.max_logged_errors:
+            self.log(f'{stats.filename}, строка {row_number}: {error}')
+
+    def write(self, source, batch, stats):
+        '''
+        Записывает пачку одним запросом; если БД её отвергла,
+        повторяет построчно, чтобы отбросить только ошибочные строки.
+        '''
+        save = self.upsert if self.incremental else self.insert
+        rows = [values for _, values in batch]
+        try:
+            with transaction.atomic():
+                counts = save(source, rows)
+        except DatabaseError:
+            counts = [0, 0, 0]
+            saved = []
+            for row_number, values in batch:
+                try:
+                    with transaction.atomic():
+                        row_counts = save(source, [values])
+                except DatabaseError as error:
+                    self.report_error(stats, row_number, error)
+                    continue
+                counts = [a + b for a, b in zip(counts, row_counts)]
+                saved.append(values)
+            rows = saved
+        stats.inserted += counts[0]
+        stats.updated += counts[1]
+        stats.skipped += counts[2]
+        known_ids = self.known_ids.get(source.model)
+        if known_ids is not None:
+            known_ids.update(values['id'] for values in rows)
+
+    def insert(self, source, rows):
+        source.model.objects.bulk_create(
+            [source.model(**values) for values in rows],
+            batch_size=self.batch_size,
+        )
+        return len(rows), 0, 0
+
+    def upsert(self, source, rows):
+        '''Добавляет новые строки и обновляет изменившиеся по id.'''
+        model = source.model
+        existing = model.objects.in_bulk([values['id'] for values in rows])
+        to_create = []
+        to_update = []
+        skipped = 0
+        for values in rows:
+            obj = existing.get(values['id'])
+            if obj is None:
+                to_create.append(model(**values))
+                continue
+            current = {name: getattr(obj, name) for name in values}
+            if content_hash(current) == content_hash(values):
+                skipped += 1
+                continue
+            for name, value in values.items():
+                setattr(obj, name, value)
+            to_update.append(obj)
+        if to_create:
+            model.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            fields = [name for name in rows[0] if name != 'id']
+            # bulk_update не заполняет auto_now, в отличие от save().
+            now = timezone.now()
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    fields.append(field.name)
+                    for obj in to_update:
+                        setattr(obj, field.attname, now)
+            model.objects.bulk_update(
+                to_update, fields, batch_size=self.batch_size
+            )
+        return len(to_create), len(to_update), skipped
+
+
+class ImportPipeline:
+    '''
+    Параллельная загрузка: файлы разбираются одновременно в пуле
+    процессов, а в БД записываются по графу внешних ключей — файл
+    записывается, как только он разобран и записаны все файлы,
+    на которые он ссылается. Независимые файлы (категории, жанры,
+    пользователи) пишутся одновременно в отдельных потоках. SQLite
+    не допускает параллельной записи, поэтому для него запись идёт
+    в текущем потоке, но по-прежнему перекрывается с разбором.
+    '''
+
+    def __init__(self, importer, sources, workers):
+        self.importer = importer
+        self.sources = sources
+        self.workers = workers
+        self.writers = 1 if connection.vendor == 'sqlite' else workers
+        self.dependencies = {
+            source: get_dependencies(source, sources) for source in sources
+        }
+        self.stats = {
+            source: ImportStats(source.filename) for source in sources
+        }
+        self.paths = {}
+        self.spools = {}
+        self.parsing = {}
+        self.writing = {}
+        self.parsed = set()
+        self.written = set()
+
+    def run(self):
+        positions = self.get_positions()
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+        parse_pool = ProcessPoolExecutor(
+            self.workers, initializer=init_worker
+        )
+        with tempfile.TemporaryDirectory() as spool_dir, parse_pool as pool, \
+                ThreadPoolExecutor(self.writers) as write_pool:
+            for source, (offset, row_number) in positions.items():
+                self.spools[source] = os.path.join(spool_dir, source.filename)
+                future = pool.submit(
+                    parse_to_spool, source.filename, self.paths[source],
+                    self.spools[source], self.importer.batch_size,
+                    offset, row_number,
+                )
+                self.parsing[future] = source
+            while len(self.written) < len(self.sources):
+                if not self.start_writing(write_pool):
+                    self.wait()
+        return [self.stats[source] for source in self.sources]
+
+    def get_positions(self):
+        positions = {}
+        for source in self.sources:
+            path = self.paths[source] = self.importer.get_path(source)
+            position = self.importer.get_start_position(source, path)
+            if position is None:
+                self.written.add(source)
+            else:
+                positions[source] = position
+        return positions
+
+    def is_ready(self, source):
+        return (
+            source in self.parsed
+            and source not in self.written
+            and source not in self.writing.values()
+            and self.dependencies[source] <= self.written
+        )
+
+    def start_writing(self, write_pool):
+        '''
+        Запускает запись готовых файлов. Возвращает True, если что-то
+        было записано в текущем потоке и стоит сразу проверить,
+        не стали ли готовы зависящие от него файлы.
+        '''
+        wrote = False
+        for source in filter(self.is_ready, self.sources):
+            if self.writers == 1:
+                self.write(source)
+                self.written.add(source)
+                wrote = True
+            else:
+                future = write_pool.submit(self.write_in_thread, source)
+                self.writing[future] = source
+        return wrote
+
+    def wait(self):
+        if not self.parsing and not self.writing:
+            raise CSVImportError(
+                'Не удалось упорядочить файлы по зависимостям'
+            )
+        done, _ = wait(
+            set(self.parsing) | set(self.writing),
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            if future in self.parsing:
+                source = self.parsing.pop(future)
+                self.stats[source].parse_time = future.result()
+                self.parsed.add(source)
+            else:
+                source = self.writing.pop(future)
+                future.result()
+                self.written.add(source)
+
+    def write(self, source):
+        self.importer.write_records(
+            source, self.paths[source], read_spool(self.spools[source]),
+            self.stats[source],
+        )
+
+    def write_in_thread(self, source):
+        try:
+            self.write(source)
+        finally:
+            connections.close_all()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from django.db import connection
+
+
+class BackgroundIndex:
+    '''
+    Индекс в памяти процесса, который читается из БД в отдельном потоке.
+    Первый запрос ждёт первой загрузки; устаревший индекс отвечает,
+    пока в фоне читается новый.
+
+    Снимок БД может не увидеть изменения, пришедшие во время загрузки,
+    поэтому их id копятся в dirty и после подмены перечитываются из БД,
+    пока не останется ни одного.
+
+    Наследник реализует read() — снимок данных, install(snapshot) —
+    подмену данных под self.lock и refresh(ids) — перечитывание
+    отдельных объектов. Методы изменения вызывают track(*ids).
+    '''
+
+    def __init__(self, reload_interval):
+        self.reload_interval = reload_interval
+        self.lock = threading.RLock()
+        self.loaded_at = None
+        self.stale = False
+        self.loader = None
+        # id, изменённые во время загрузки; None, если загрузки нет.
+        self.dirty = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def install(self, snapshot):
+        raise NotImplementedError
+
+    def refresh(self, ids):
+        raise NotImplementedError
+
+    def load(self):
+        '''Читает индекс из БД и подменяет им текущий.'''
+        with self.lock:
+            self.dirty = set()
+        try:
+            snapshot = self.read()
+            with self.lock:
+                self.install(snapshot)
+                self.loaded_at = time.monotonic()
+            while True:
+                with self.lock:
+                    ids, self.dirty = self.dirty, set()
+                    if not ids:
+                        return
+                self.refresh(ids)
+        finally:
+            with self.lock:
+                self.dirty = None
+
+    def track(self, *ids):
+        '''
+        Отмечает изменённые объекты. Возвращает, есть ли данные, к которым
+        изменение нужно применить сразу.
+        '''
+        with self.lock:
+            if self.dirty is not None:
+                self.dirty.update(ids)
+            return self.loaded_at is not None
+
+    def is_stale(self):
+        return (
+            self.loaded_at is None
+            or self.stale
+            or time.monotonic() - self.loaded_at > self.reload_interval
+        )
+
+    def ensure_loaded(self):
+        '''
+        Запускает загрузку устаревшего индекса; ждёт её, только если
+        индекс ещё ни разу не загружен.
+        '''
+        with self.lock:
+            if self.loader is None and self.is_stale():
+                self.stale = False
+                self.loader = threading.Thread(
+                    target=self.load_in_background, daemon=True
+                )
+                self.loader.start()
+            loader = self.loader
+            first = self.loaded_at is None
+        if first and loader is not None:
+            loader.join()
+
+    def load_in_background(self):
+        try:
+            self.load()
+        finally:
+            # У потока своё соединение с БД.
+            connection.close()
+            with self.lock:
+                self.loader = None
+
+    def wait(self, timeout=None):
+        '''Дожидается фоновой загрузки, если она идёт.'''
+        loader = self.loader
+        if loader is not None:
+            loader.join(timeout)
+
+    def invalidate(self):
+        '''Индекс перечитается из БД после следующего запроса.'''
+        with self.lock:
+            self.stale = True
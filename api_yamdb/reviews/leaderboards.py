@@ -0,0 +1,254 @@
+from django.conf import settings
+from django.db.models import (Case, F, FloatField, Q, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Cast, Coalesce
+
+from reviews.models import LeaderboardPrior, Title, TitleRanking
+
+# Средняя оценка, пока отзывов нет: середина шкалы 1–10.
+DEFAULT_MEAN = 5.5
+# Единственная строка LeaderboardPrior.
+PRIOR_ID = 1
+BATCH_SIZE = 1000
+
+
+def get_mean():
+    '''
+    Средняя оценка по каталогу, с которой посчитаны рейтинги топов.
+    Хранится в БД и меняется только пересборкой (rebuild): иначе
+    в одном топе оказались бы рейтинги с разными средними.
+    '''
+    mean = LeaderboardPrior.objects.filter(pk=PRIOR_ID).values_list(
+        'mean', flat=True
+    ).first()
+    return DEFAULT_MEAN if mean is None else mean
+
+
+def get_mean_expression():
+    '''Та же средняя подзапросом: UPDATE без отдельного чтения.'''
+    return Coalesce(
+        Subquery(
+            LeaderboardPrior.objects.filter(pk=PRIOR_ID).values('mean')
+        ),
+        Value(DEFAULT_MEAN),
+        output_field=FloatField(),
+    )
+
+
+def get_catalogue_mean():
+    '''Средняя оценка по всем отзывам каталога.'''
+    totals = Title.objects.aggregate(
+        score_sum=Sum('rating_sum'),
+        score_count=Sum('rating_count'),
+    )
+    if not totals['score_count']:
+        return DEFAULT_MEAN
+    return totals['score_sum'] / totals['score_count']
+
+
+def weighted_rating(rating_sum, rating_count, mean, prior):
+    '''
+    Байесовская средняя: к оценкам произведения добавляется prior
+    «виртуальных» отзывов со средней по каталогу, поэтому один отзыв
+    на 10 не поднимает произведение выше сотни отзывов на 9.
+    '''
+    if not rating_count:
+        return None
+    return (rating_sum + prior * mean) / (rating_count + prior)
+
+
+def get_boards(title, genre_ids=()):
+    '''Топы, в которые входит произведение: (топ, ключ).'''
+    boards = [(TitleRanking.ALL, 0), (TitleRanking.YEAR, title.year)]
+    if title.category_id is not None:
+        boards.append((TitleRanking.CATEGORY, title.category_id))
+    boards.extend((TitleRanking.GENRE, genre_id) for genre_id in genre_ids)
+    return boards
+
+
+def make_rows(boards, title_id, rating_sum, rating_count, mean=None):
+    '''
+    Строки топов произведения с копией его агрегатов оценок. Средняя
+    читается из БД, если не передана, и только для рейтинга с отзывами.
+    '''
+    score = None
+    if rating_count:
+        score = weighted_rating(
+            rating_sum, rating_count,
+            get_mean() if mean is None else mean,
+            settings.LEADERBOARD_PRIOR_REVIEWS,
+        )
+    return [
+        TitleRanking(
+            board=board, key=key, title_id=title_id,
+            rating_sum=rating_sum, rating_count=rating_count, score=score,
+        )
+        for board, key in boards
+    ]
+
+
+def add_title(title, genre_ids=()):
+    TitleRanking.objects.bulk_create(make_rows(
+        get_boards(title, genre_ids), title.pk,
+        title.rating_sum, title.rating_count,
+    ))
+    title._loaded_boards = (title.category_id, title.year)
+
+
+def move_title(title):
+    '''Переносит произведение в топы новой категории и года.'''
+    if getattr(title, '_loaded_boards', None) == (
+        title.category_id, title.year
+    ):
+        return
+    TitleRanking.objects.filter(
+        title_id=title.pk,
+        board__in=(TitleRanking.CATEGORY, TitleRanking.YEAR),
+    ).delete()
+    TitleRanking.objects.bulk_create(make_rows(
+        [
+            (board, key) for board, key in get_boards(title)
+            if board != TitleRanking.ALL
+        ],
+        title.pk, title.rating_sum, title.rating_count,
+    ))
+    title._loaded_boards = (title.category_id, title.year)
+
+
+def add_genres(pairs, title=None):
+    '''
+    Добавляет произведения в топы жанров: пары (id произведения, жанра).
+    Агрегаты оценок берутся из title, если связи добавлены к нему,
+    иначе читаются из БД.
+    '''
+    if not pairs:
+        return
+    genres = {}
+    for title_id, genre_id in pairs:
+        genres.setdefault(title_id, []).append(genre_id)
+    if title is not None:
+        totals = [(title.pk, title.rating_sum, title.rating_count)]
+    else:
+        totals = list(Title.objects.filter(pk__in=genres).values_list(
+            'pk', 'rating_sum', 'rating_count'
+        ))
+    rows = []
+    # У новых произведений отзывов нет: средняя не нужна.
+    mean = get_mean() if any(count for _, _, count in totals) else None
+    for title_id, rating_sum, rating_count in totals:
+        rows.extend(make_rows(
+            [(TitleRanking.GENRE, genre_id) for genre_id in genres[title_id]],
+            title_id, rating_sum, rating_count, mean,
+        ))
+    TitleRanking.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def remove_genres(pairs):
+    condition = Q()
+    for title_id, genre_id in pairs:
+        condition |= Q(title_id=title_id, key=genre_id)
+    if condition:
+        TitleRanking.objects.filter(
+            condition, board=TitleRanking.GENRE
+        ).delete()
+
+
+def remove_board(board, key):
+    '''Убирает топ удалённого жанра или категории.'''
+    TitleRanking.objects.filter(board=board, key=key).delete()
+
+
+def shift_scores(title_id, score_delta, count_delta):
+    '''
+    Сдвигает агрегаты оценок произведения во всех его топах и там же
+    пересчитывает рейтинг: один UPDATE, правые части которого видят
+    значения до изменения.
+    '''
+    prior = settings.LEADERBOARD_PRIOR_REVIEWS
+    TitleRanking.objects.filter(title_id=title_id).update(
+        rating_sum=F('rating_sum') + score_delta,
+        rating_count=F('rating_count') + count_delta,
+        score=Case(
+            When(
+                rating_count__gt=-count_delta,
+                then=(
+                    Cast('rating_sum', FloatField())
+                    + score_delta + prior * get_mean_expression()
+                ) / (F('rating_count') + count_delta + prior),
+            ),
+            default=None,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def get_genres(title_ids=None):
+    links = Title.genre.through.objects.values_list('title_id', 'genre_id')
+    if title_ids is not None:
+        links = links.filter(title_id__in=title_ids)
+    genres = {}
+    for title_id, genre_id in links.iterator():
+        genres.setdefault(title_id, []).append(genre_id)
+    return genres
+
+
+def refresh_titles(title_ids, batch_size=BATCH_SIZE):
+    '''Пересобирает строки топов произведений по их текущим данным.'''
+    title_ids = list(title_ids)
+    mean = get_mean()
+    for start in range(0, len(title_ids), batch_size):
+        batch = title_ids[start:start + batch_size]
+        genres = get_genres(batch)
+        rows = []
+        for title in Title.objects.filter(pk__in=batch):
+            rows.extend(make_rows(
+                get_boards(title, genres.get(title.pk, ())), title.pk,
+                title.rating_sum, title.rating_count, mean,
+            ))
+        TitleRanking.objects.filter(title_id__in=batch).delete()
+        TitleRanking.objects.bulk_create(rows)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    '''
+    Пересобирает все топы со свежей средней по каталогу и сохраняет
+    её для обновлений между пересборками.
+    Возвращает число строк в топах.
+    '''
+    mean = get_catalogue_mean()
+    LeaderboardPrior.objects.update_or_create(
+        pk=PRIOR_ID, defaults={'mean': mean}
+    )
+    genres = get_genres()
+    TitleRanking.objects.all().delete()
+    count = 0
+    batch = []
+    titles = Title.objects.only(
+        'id', 'year', 'category', 'rating_sum', 'rating_count'
+    ).order_by('id')
+    for title in titles.iterator(chunk_size=batch_size):
+        batch.extend(make_rows(
+            get_boards(title, genres.get(title.pk, ())), title.pk,
+            title.rating_sum, title.rating_count, mean,
+        ))
+        if len(batch) >= batch_size:
+            TitleRanking.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    TitleRanking.objects.bulk_create(batch)
+    return count + len(batch)
+
+
+def get_leaderboard_queryset(board, key=0):
+    '''
+    Топ по убыванию рейтинга: обратный проход по индексу
+    (топ, ключ, рейтинг, произведение), без агрегации отзывов.
+    '''
+    return TitleRanking.objects.filter(
+        board=board, key=key, score__isnull=False
+    ).select_related('title').order_by('-score', '-title_id')
+
+
+def get_leaderboard(board, key=0, limit=10):
+    '''Первые limit произведений топа.'''
+    return list(get_leaderboard_queryset(board, key)[:limit])
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from reviews.models import OutgoingEmail
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+# Задержка перед повторной попыткой удваивается с каждой неудачей.
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    '''Ставит письмо в очередь вместо отправки во время запроса.'''
+    OutgoingEmail.objects.bulk_create(
+        OutgoingEmail(
+            subject=subject,
+            body=message,
+            from_email=from_email,
+            recipient=recipient,
+        )
+        for recipient in recipient_list
+    )
+
+
+def get_retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def mark_failed(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt_at = (
+            timezone.now() + get_retry_delay(email.attempts)
+        )
+
+
+def send_queued_mail(batch_size=DEFAULT_BATCH_SIZE,
+                     max_attempts=DEFAULT_MAX_ATTEMPTS):
+    '''
+    Отправляет пачку писем, у которых подошло время попытки, через одно
+    SMTP-соединение. Неудачные письма откладываются с экспоненциальной
+    задержкой, после max_attempts попыток помечаются как неотправленные.
+    Возвращает количество отправленных и неудачных писем.
+    '''
+    sent = failed = 0
+    with transaction.atomic():
+        queue = OutgoingEmail.objects.filter(
+            status=OutgoingEmail.PENDING,
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Несколько воркеров не возьмут одни и те же письма.
+            queue = queue.select_for_update(skip_locked=True)
+        emails = list(queue[:batch_size])
+        if not emails:
+            return sent, failed
+
+        mail_connection = get_connection()
+        try:
+            mail_connection.open()
+        except Exception as error:
+            # SMTP-сервер недоступен: откладываем всю пачку.
+            for email in emails:
+                mark_failed(email, error, max_attempts)
+            failed = len(emails)
+        else:
+            try:
+                for email in emails:
+                    try:
+                        EmailMessage(
+                            email.subject,
+                            email.body,
+                            email.from_email,
+                            [email.recipient],
+                            connection=mail_connection,
+                        ).send()
+                    except Exception as error:
+                        mark_failed(email, error, max_attempts)
+                        failed += 1
+                    else:
+                        email.attempts += 1
+                        email.status = OutgoingEmail.SENT
+                        email.sent_at = timezone.now()
+                        sent += 1
+            finally:
+                mail_connection.close()
+        OutgoingEmail.objects.bulk_update(emails, (
+            'attempts', 'status', 'last_error', 'next_attempt_at', 'sent_at'
+        ))
+    return sent, failed
@@ -0,0 +1,125 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.models import Title
+from reviews.search import TITLE_TRIGRAM_INDEX
+
+CONSONANTS = 'бвгджзклмнпрстфхцчшщ'
+VOWELS = 'аеёиоуыэюя'
+ALPHABET = 'абвгдежзийклмнопрстуфхцчшщъыьэюя'
+
+
+def make_word(rng):
+    '''Псевдослово из слогов «согласная + гласная (+ согласная)».'''
+    return ''.join(
+        rng.choice(CONSONANTS) + rng.choice(VOWELS)
+        + (rng.choice(CONSONANTS) if rng.random() < 0.3 else '')
+        for _ in range(rng.randint(2, 4))
+    )
+
+
+def make_typo(rng, text):
+    '''Одна случайная опечатка: замена, пропуск, вставка или перестановка.'''
+    position = rng.randrange(len(text) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return text[:position] + rng.choice(ALPHABET) + text[position + 1:]
+    if kind == 1:
+        return text[:position] + text[position + 1:]
+    if kind == 2:
+        return text[:position] + rng.choice(ALPHABET) + text[position:]
+    return (
+        text[:position] + text[position + 1] + text[position]
+        + text[position + 2:]
+    )
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку нечёткого поиска по названиям на синтетическом '
+        'каталоге. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--titles',
+            type=int,
+            default=1_000_000,
+            help='Сколько синтетических произведений создать.',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Сколько запросов с опечатками выполнить.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пачки при создании данных.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            names = self.create_titles(rng, options)
+            self.run_queries(rng, names, options['queries'])
+            # Синтетический каталог не должен остаться в БД.
+            transaction.set_rollback(True)
+
+    def create_titles(self, rng, options):
+        started = time.perf_counter()
+        names = []
+        batch = []
+        for _ in range(options['titles']):
+            name = ' '.join(
+                make_word(rng) for _ in range(rng.randint(1, 3))
+            ).capitalize()
+            names.append(name)
+            batch.append(Title(name=name, year=2000, description=''))
+            if len(batch) >= options['batch_size']:
+                Title.objects.bulk_create(batch)
+                batch = []
+        Title.objects.bulk_create(batch)
+        loaded = time.perf_counter()
+        TITLE_TRIGRAM_INDEX.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Создано произведений: {len(names)} за '
+            f'{loaded - started:.1f} с, триграммы построены за '
+            f'{time.perf_counter() - loaded:.1f} с'
+        )
+        return names
+
+    def run_queries(self, rng, names, count):
+        timings = []
+        found = 0
+        for _ in range(count):
+            name = rng.choice(names)
+            word = rng.choice(name.split())
+            query = make_typo(rng, word) if len(word) > 3 else word
+            started = time.perf_counter()
+            result = TITLE_TRIGRAM_INDEX.find(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            found += any(
+                word.lower() in value.lower()
+                for value in Title.objects.filter(
+                    id__in=[pk for pk, _ in result]
+                ).values_list('name', flat=True)
+            )
+        timings.sort()
+        self.stdout.write(
+            f'Запросов: {count}, исходное слово найдено: {found}\n'
+            f'Задержка, мс: p50 {percentile(timings, 0.5):.1f}, '
+            f'p95 {percentile(timings, 0.95):.1f}, '
+            f'p99 {percentile(timings, 0.99):.1f}, '
+            f'max {timings[-1]:.1f}'
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.content import (BATCH_SIZE, TITLE_CONTENT, ContentIndex,
+                             iter_documents)
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит TF-IDF индекс похожих по содержанию произведений '
+        '(название, описание, жанры, категория) и сохраняет его в '
+        'CONTENT_INDEX_PATH. Процессы сервера перечитывают файл при '
+        'изменении.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Сколько произведений читать из БД за раз.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        vocabulary, idf, title_ids, matrix = ContentIndex.build(
+            iter_documents(options['batch_size'])
+        )
+        TITLE_CONTENT.save(vocabulary, idf, title_ids, matrix)
+        self.stdout.write(self.style.SUCCESS(
+            f'Произведений: {len(title_ids)}, терминов: {len(vocabulary)}, '
+            f'ненулевых весов: {matrix.nnz}, '
+            f'{time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,58 @@
+from argparse import ArgumentTypeError
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.recommendations import (BATCH_SIZE, CHUNK_SIZE, MIN_COMMON,
+                                     NEIGHBOURS, rebuild)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise ArgumentTypeError('Значение должно быть не меньше 1.')
+    return number
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие произведения по оценкам пользователей '
+        '(adjusted cosine). Запускайте по расписанию: между запусками '
+        'новые отзывы на соседей не влияют.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours',
+            type=positive_int,
+            default=NEIGHBOURS,
+            help='Сколько похожих произведений хранить для каждого.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=positive_int,
+            default=CHUNK_SIZE,
+            help='Сколько строк матрицы сходства считать за раз.',
+        )
+        parser.add_argument(
+            '--min-common',
+            type=int,
+            default=MIN_COMMON,
+            help='Минимум пользователей, оценивших оба произведения.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=positive_int,
+            default=BATCH_SIZE,
+            help='Размер пачки при записи результатов.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild(
+                neighbours=options['neighbours'],
+                chunk_size=options['chunk_size'],
+                min_common=options['min_common'],
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(f'Похожих пар: {count}'))
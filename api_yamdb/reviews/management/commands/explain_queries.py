@@ -0,0 +1,202 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.urls import router_v1
+from api.views import ParentObjectsMixin
+from reviews.leaderboards import get_leaderboard_queryset
+from reviews.models import Review, Title, TitleRanking
+from reviews.recommendations import get_similar_queryset
+
+# Параметры запросов списка, план которых проверяется для маршрута.
+# Фильтры ?search= и ?fuzzy= идут через собственные индексы
+# (reviews.search) и здесь не проверяются.
+PROBES = {
+    'titles': (
+        {},
+        {'year': '2000'},
+        {'name': 'x'},
+        {'category': 'x'},
+        {'category': 'x', 'year': '2000'},
+        {'genre': 'x'},
+        {'genre': 'x,y', 'genre_mode': 'all'},
+        {'genre__any': 'x,y'},
+        {'genre__all': 'x,y', 'year_min': '1990'},
+        {'year_min': '1990', 'year_max': '2000'},
+        {'rating_min': '7', 'ordering': '-rating'},
+        {'ordering': 'rating'},
+        {'ordering': '-rating'},
+        {'ordering': '-rating,-review_count'},
+        {'ordering': '-review_count'},
+        {'ordering': 'year'},
+        {'ordering': '-year'},
+        {'ordering': 'year,name'},
+        {'ordering': 'name'},
+    ),
+    'search-reviews': (
+        {},
+        {'title': '1'},
+        {'author': 'x'},
+        {'pub_date_after': '2000-01-01T00:00:00'},
+    ),
+    'search-comments': (
+        {},
+        {'title': '1'},
+        {'review': '1'},
+        {'pub_date_after': '2000-01-01T00:00:00'},
+    ),
+}
+DEFAULT_PROBES = ({},)
+# Полный просмотр таблицы в плане SQLite и PostgreSQL.
+FULL_SCAN_RES = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\s*$'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+SORT_RES = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def get_sorts(plan, vendor):
+    '''Строки плана, где строки сортируются без индекса.'''
+    return [
+        line.strip() for line in plan.splitlines()
+        if SORT_RES[vendor].search(line)
+    ]
+
+
+def get_full_scans(plan, vendor, allowed_table=None):
+    '''
+    Таблицы, которые план читает целиком. Полный просмотр таблицы
+    модели допустим для списка без фильтров, если строки идут в нужном
+    порядке без сортировки: постраничный вывод прочитает только начало.
+    '''
+    scans = []
+    lines = plan.splitlines()
+    sorted_ = any(SORT_RES[vendor].search(line) for line in lines)
+    for line in lines:
+        match = FULL_SCAN_RES[vendor].search(line)
+        if match is None:
+            continue
+        table = match.group(1)
+        if table == allowed_table and not sorted_:
+            continue
+        scans.append(table)
+    return scans
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит план выполнения (EXPLAIN QUERY PLAN в SQLite, EXPLAIN '
+        'в PostgreSQL) для запросов списков и объектов всех маршрутов API '
+        'и отмечает полные просмотры таблиц, а для списков без фильтров '
+        '(в том числе с ?ordering=) — сортировку без индекса. '
+        'На PostgreSQL с маленькими '
+        'таблицами планировщик предпочитает Seq Scan — проверяйте на '
+        'данных, близких к боевым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help=(
+                'Завершиться с ошибкой, если найдены полные просмотры '
+                'или сортировки без индекса.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_RES:
+            raise CommandError(f'СУБД {vendor} не поддерживается.')
+        flagged = 0
+        seen = set()
+        for prefix, viewset, basename in router_v1.registry:
+            if viewset in seen:
+                continue
+            seen.add(viewset)
+            for name, queryset, filtered, ordered in self.get_querysets(
+                viewset, basename
+            ):
+                flagged += self.explain(
+                    name, queryset, vendor,
+                    None if filtered else queryset.model._meta.db_table,
+                    check_sort=ordered,
+                )
+        for board in (TitleRanking.ALL, TitleRanking.GENRE):
+            flagged += self.explain(
+                f'leaderboard-{board}',
+                get_leaderboard_queryset(board, 1), vendor, None,
+                check_sort=True,
+            )
+        flagged += self.explain(
+            'titles-similar', get_similar_queryset(1), vendor, None,
+            check_sort=True,
+        )
+        message = f'Полных просмотров и сортировок без индекса: {flagged}'
+        if flagged and options['fail']:
+            raise CommandError(message)
+        self.stdout.write(message)
+
+    def get_view(self, viewset, params):
+        request = Request(RequestFactory().get('/', params))
+        view = viewset(
+            request=request, format_kwarg=None, action='list', kwargs={}
+        )
+        if isinstance(view, ParentObjectsMixin):
+            # Родители вложенных маршрутов без обращения к БД: для плана
+            # важен только фильтр по их id.
+            view._title = Title(pk=1)
+            view._review = Review(pk=1, title=view._title)
+        return view
+
+    def get_querysets(self, viewset, basename):
+        '''
+        (название, queryset, есть ли фильтр, проверять ли сортировку)
+        для проверки маршрута. Без фильтров, кроме ?ordering=, порядок
+        должен давать индекс: строк может быть сколько угодно.
+        '''
+        for params in PROBES.get(basename, DEFAULT_PROBES):
+            view = self.get_view(viewset, params)
+            queryset = view.filter_queryset(view.get_queryset())
+            query = '&'.join(f'{key}={value}' for key, value in params.items())
+            nested = isinstance(view, ParentObjectsMixin)
+            yield (
+                f'{basename}-list{"?" + query if query else ""}',
+                queryset,
+                bool(params) or nested,
+                not set(params) - {'ordering'},
+            )
+        view = self.get_view(viewset, {})
+        lookup = view.lookup_url_kwarg or view.lookup_field
+        view.kwargs = {lookup: '1'}
+        yield (
+            f'{basename}-detail',
+            view.get_queryset().filter(**{view.lookup_field: '1'}),
+            True,
+            False,
+        )
+
+    def explain(self, name, queryset, vendor, allowed_table,
+                check_sort=False):
+        plan = queryset.explain()
+        scans = get_full_scans(plan, vendor, allowed_table)
+        sorts = get_sorts(plan, vendor) if check_sort else []
+        if scans:
+            self.stdout.write(self.style.WARNING(
+                f'{name}: полный просмотр {", ".join(scans)}'
+            ))
+        if sorts:
+            self.stdout.write(self.style.WARNING(
+                f'{name}: сортировка без индекса'
+            ))
+        if not scans and not sorts:
+            self.stdout.write(self.style.SUCCESS(name))
+        for line in plan.splitlines():
+            self.stdout.write(f'    {line}')
+        return len(scans) + len(sorts)
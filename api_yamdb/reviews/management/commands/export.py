@@ -0,0 +1,77 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews.exporter import (DEFAULT_CHUNK_SIZE, EXPORT_SOURCES, FORMATS,
+                              iter_export)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает таблицы в CSV (совместимый с командой import) '
+        'или NDJSON, не загружая их в память целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=(
+                'Таблицы для выгрузки: '
+                f'{", ".join(EXPORT_SOURCES)} (по умолчанию все).'
+            ),
+        )
+        parser.add_argument(
+            '--path',
+            default='.',
+            help='Каталог для выгружаемых файлов.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            dest='export_format',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать файлы в gzip.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Количество строк, читаемых из БД за один раз.',
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(EXPORT_SOURCES)
+        unknown = set(names) - set(EXPORT_SOURCES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные таблицы: {", ".join(sorted(unknown))}'
+            )
+        os.makedirs(options['path'], exist_ok=True)
+        for name in names:
+            source = EXPORT_SOURCES[name]
+            filename = source.get_filename(
+                options['export_format'], options['gzip']
+            )
+            chunks = iter_export(
+                source,
+                options['export_format'],
+                compress=options['gzip'],
+                chunk_size=options['chunk_size'],
+            )
+            path = os.path.join(options['path'], filename)
+            if options['gzip']:
+                with open(path, 'wb') as file:
+                    for chunk in chunks:
+                        file.write(chunk)
+            else:
+                with open(path, 'w', encoding='utf-8', newline='') as file:
+                    for chunk in chunks:
+                        file.write(chunk)
+            self.stdout.write(f'{name}: {path}')
+
+        self.stdout.write(self.style.SUCCESS('Данные выгружены'))
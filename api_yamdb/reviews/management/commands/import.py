@@ -1,10 +1,10 @@
-import csv
 import os
 
 from django.core.management.base import BaseCommand, CommandError
 
 from api_yamdb.settings import BASE_DIR
-from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.importer import (DEFAULT_BATCH_SIZE, Checkpoint, CSVImporter,
+                              CSVImportError)
 
 FILE_PATH = os.path.join(
     BASE_DIR,
@@ -13,119 +13,71 @@ FILE_PATH = os.path.join(
 
 
 class Command(BaseCommand):
+    help = 'Загружает в БД данные из CSV-файлов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=FILE_PATH,
+            help='Каталог с CSV-файлами.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной пачке bulk_create.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Количество процессов для параллельного разбора файлов; '
+                'независимые файлы записываются в БД одновременно.'
+            ),
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=(
+                'Обновлять существующие записи по id, пропуская '
+                'неизменившиеся, и продолжать прерванную загрузку '
+                'с сохранённой позиции.'
+            ),
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'Файл с позицией инкрементальной загрузки '
+                '(по умолчанию .import_checkpoint.json в каталоге данных).'
+            ),
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Игнорировать сохранённую позицию и начать заново.',
+        )
 
     def handle(self, *args, **options):
+        checkpoint = None
+        if options['incremental']:
+            checkpoint = Checkpoint(
+                options['checkpoint']
+                or os.path.join(options['path'], '.import_checkpoint.json')
+            )
+            if options['restart']:
+                checkpoint.clear()
+        importer = CSVImporter(
+            options['path'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+            incremental=options['incremental'],
+            checkpoint=checkpoint,
+        )
         try:
-            with open(
-                os.path.join(FILE_PATH, 'category.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    Category.objects.create(
-                        id=row['id'],
-                        name=row['name'],
-                        slug=row['slug'],
-                    )
-                print('Файл category.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'genre.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    Genre.objects.create(
-                        id=row['id'],
-                        name=row['name'],
-                        slug=row['slug'],
-                    )
-                print('Файл genre.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'titles.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    Title.objects.create(
-                        id=row['id'],
-                        name=row['name'],
-                        year=row['year'],
-                        category=Category.objects.get_or_create(
-                            id=row['category'],
-                        )[0],
-                    )
-                print('Файл titles.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'genre_title.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    title, id = Title.objects.get_or_create(
-                        id=row['title_id'],
-                    )
-                    genre, id = Genre.objects.get_or_create(
-                        id=row['genre_id'],
-                    )
-                    title.genre.add(genre)
-                    title.save()
-                print('Файл genre_title.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'users.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    User.objects.create(
-                        id=row['id'],
-                        username=row['username'],
-                        email=row['email'],
-                        role=row['role'],
-                        bio=row['bio'],
-                        first_name=row['first_name'],
-                        last_name=row['last_name'],
-                    )
-                print('Файл users.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'review.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    Review.objects.create(
-                        id=row['id'],
-                        title=Title.objects.get_or_create(
-                            id=row['title_id'],
-                        )[0],
-                        text=row['text'],
-                        author=User.objects.get_or_create(
-                            id=row['author'],
-                        )[0],
-                        score=row['score'],
-                        pub_date=row['pub_date'],
-
-                    )
-                print('Файл review.csv успешно импортировал данные в БД')
-
-            with open(
-                os.path.join(FILE_PATH, 'comments.csv')
-            ) as file_csv:
-                file_read = csv.DictReader(file_csv, delimiter=',')
-                for row in file_read:
-                    Comment.objects.create(
-                        id=row['id'],
-                        review=Review.objects.get_or_create(
-                            id=row['review_id'],
-                        )[0],
-                        text=row['text'],
-                        author=User.objects.get_or_create(
-                            id=row['author'],
-                        )[0],
-                        pub_date=row['pub_date'],
-                    )
-                print('Файл comments.csv успешно импортировал данные в БД')
-
-        except Exception:
-            raise CommandError('Произошла ошибка')
+            importer.run(workers=options['workers'])
+        except CSVImportError as error:
+            raise CommandError(error)
 
         self.stdout.write(
             self.style.SUCCESS('Данные были загружены в БД')
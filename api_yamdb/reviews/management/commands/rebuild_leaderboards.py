@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.leaderboards import BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает топы произведений со свежей средней оценкой по '
+        'каталогу. Между пересборками топы обновляются по мере отзывов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Размер пачки при чтении произведений и записи топов.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Строк в топах: {count}'))
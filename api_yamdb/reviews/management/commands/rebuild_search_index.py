@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reviews.search import SEARCH_INDEXES
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовые поисковые индексы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=(
+                'Индексы для перестройки: '
+                f'{", ".join(SEARCH_INDEXES)}. По умолчанию все.'
+            ),
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при чтении и индексации объектов.',
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(SEARCH_INDEXES)
+        unknown = set(names) - set(SEARCH_INDEXES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные индексы: {", ".join(sorted(unknown))}'
+            )
+        for name in names:
+            with transaction.atomic():
+                count = SEARCH_INDEXES[name].rebuild(
+                    batch_size=options['batch_size']
+                )
+            self.stdout.write(
+                self.style.SUCCESS(f'{name}: проиндексировано {count}')
+            )
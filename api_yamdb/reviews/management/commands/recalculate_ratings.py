@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.ratings import recalculate_ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые рейтинги произведений по отзывам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при чтении и обновлении произведений.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = recalculate_ratings(
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        for title_id, stored, expected in drift:
+            self.stdout.write(
+                f'Произведение {title_id}: сумма/количество '
+                f'{stored[0]}/{stored[1]} -> {expected[0]}/{expected[1]}'
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'Найдено расхождений: {len(drift)}')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Исправлено расхождений: {len(drift)}')
+            )
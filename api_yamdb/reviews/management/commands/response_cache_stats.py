@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_stats, reset_stats
+
+SCOPE_NAMES = {
+    'titles-list': 'Список произведений',
+    'titles-retrieve': 'Произведение',
+    'reviews-list': 'Отзывы к произведению',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит попадания и промахи кеша ответов списка и карточек '
+        'произведений и списков отзывов: сколько запросов получили '
+        'устаревший ответ или дождались чужого пересчёта вместо своего '
+        'и сколько ответов обновлено досрочно. Счётчики хранятся в кеше '
+        'Django: у локального кеша они свои в каждом процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        for scope, counters in get_stats().items():
+            # Без пересчёта обошлись и устаревшие, и дождавшиеся ответы.
+            served = (
+                counters['hit'] + counters['stale'] + counters['coalesced']
+            )
+            total = sum(counters.values())
+            ratio = f'{served / total:.1%}' if total else '—'
+            self.stdout.write(
+                f'{SCOPE_NAMES[scope]}: попаданий {counters["hit"]}, '
+                f'промахов {counters["miss"]}, доля попаданий {ratio}, '
+                f'устаревших {counters["stale"]}, '
+                f'дождавшихся пересчёта {counters["coalesced"]}, '
+                f'досрочных пересчётов {counters["early"]}'
+            )
+        if options['reset']:
+            reset_stats()
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.mail import (DEFAULT_BATCH_SIZE, DEFAULT_MAX_ATTEMPTS,
+                          send_queued_mail)
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди исходящих писем.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Сколько писем отправлять через одно соединение.',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help='После стольких неудач письмо больше не отправляется.',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а проверять очередь каждые --interval с.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = self.send_all(options)
+            if sent or failed:
+                self.stdout.write(
+                    f'Отправлено писем: {sent}, с ошибками: {failed}'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def send_all(self, options):
+        '''Разбирает очередь пачками, пока в ней есть готовые письма.'''
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued_mail(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < options['batch_size']:
+                return total_sent, total_failed
@@ -0,0 +1,55 @@
+# Generated by Django 3.2 on 2026-10-18 14:15
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import reviews.validators
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    rows = Review.objects.order_by().values('title').annotate(
+        score_sum=Sum('score'),
+        score_count=Count('id'),
+    )
+    for row in rows.iterator():
+        Title.objects.filter(id=row['title']).update(
+            rating_sum=row['score_sum'],
+            rating_count=row['score_count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('pub_date',), 'verbose_name': 'Комментарий', 'verbose_name_plural': 'Комментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='review',
+            options={'ordering': ('pub_date',), 'verbose_name': 'Отзыв', 'verbose_name_plural': 'Отзывы'},
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AlterField(
+            model_name='title',
+            name='year',
+            field=models.IntegerField(validators=[reviews.validators.validate_year], verbose_name='Год выпуска'),
+        ),
+        migrations.RunPython(
+            fill_rating_aggregates, migrations.RunPython.noop
+        ),
+    ]
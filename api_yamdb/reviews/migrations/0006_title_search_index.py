@@ -0,0 +1,78 @@
+import re
+
+import snowballstemmer
+from django.db import migrations
+
+BATCH_SIZE = 1000
+WORD_RE = re.compile(r'\w+')
+
+PG_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(\"reviews_title\".\"name\", "
+    "'')), 'A') || setweight(to_tsvector('russian', coalesce("
+    "\"reviews_title\".\"description\", '')), 'B')"
+)
+
+
+def stem_words(stemmer, text):
+    # Копия reviews.search.stem_words на момент миграции: миграция
+    # не должна меняться вместе с кодом приложения.
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return stemmer.stemWords(words)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX reviews_title_search_idx ON reviews_title '
+            f'USING GIN (({PG_VECTOR}))'
+        )
+    if vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS reviews_title_fts '
+        'USING fts5(name, description, tokenize="unicode61")'
+    )
+    Title = apps.get_model('reviews', 'Title')
+    stemmer = snowballstemmer.stemmer('russian')
+    titles = Title.objects.only('id', 'name', 'description').order_by('id')
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for title in titles.iterator(chunk_size=BATCH_SIZE):
+            rows.append((
+                title.id,
+                ' '.join(stem_words(stemmer, title.name)),
+                ' '.join(stem_words(stemmer, title.description)),
+            ))
+            if len(rows) >= BATCH_SIZE:
+                insert_rows(cursor, rows)
+                rows = []
+        insert_rows(cursor, rows)
+
+
+def insert_rows(cursor, rows):
+    if rows:
+        cursor.executemany(
+            'INSERT INTO reviews_title_fts (rowid, name, description) '
+            'VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS reviews_title_search_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS reviews_title_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,76 @@
+import re
+
+import snowballstemmer
+from django.db import migrations
+
+BATCH_SIZE = 1000
+WORD_RE = re.compile(r'\w+')
+
+# (модель, таблица FTS5 в SQLite, GIN-индекс в PostgreSQL)
+INDEXES = (
+    ('Review', 'reviews_review_fts', 'reviews_review_search_idx'),
+    ('Comment', 'reviews_comment_fts', 'reviews_comment_search_idx'),
+)
+
+
+def stem_words(stemmer, text):
+    # Копия reviews.search.stem_words на момент миграции: миграция
+    # не должна меняться вместе с кодом приложения.
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return stemmer.stemWords(words)
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    stemmer = snowballstemmer.stemmer('russian')
+    for model_name, fts_table, pg_index in INDEXES:
+        model = apps.get_model('reviews', model_name)
+        db_table = model._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX {pg_index} ON {db_table} USING GIN (('
+                f"setweight(to_tsvector('russian', coalesce("
+                f'"{db_table}"."text", \'\')), \'A\')))'
+            )
+        if vendor != 'sqlite':
+            continue
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} '
+            'USING fts5(text, tokenize="unicode61")'
+        )
+        objects = model.objects.only('id', 'text').order_by('id')
+        rows = []
+        with schema_editor.connection.cursor() as cursor:
+            for obj in objects.iterator(chunk_size=BATCH_SIZE):
+                rows.append((obj.id, ' '.join(stem_words(stemmer, obj.text))))
+                if len(rows) >= BATCH_SIZE:
+                    insert_rows(cursor, fts_table, rows)
+                    rows = []
+            insert_rows(cursor, fts_table, rows)
+
+
+def insert_rows(cursor, fts_table, rows):
+    if rows:
+        cursor.executemany(
+            f'INSERT INTO {fts_table} (rowid, text) VALUES (%s, %s)', rows
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for _, fts_table, pg_index in INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {pg_index}')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_title_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-18 14:41
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+WORD_RE = re.compile(r'\w+')
+
+
+def get_trigrams(text):
+    # Копия reviews.search.get_trigrams на момент миграции: миграция
+    # не должна меняться вместе с кодом приложения.
+    trigrams = set()
+    for word in WORD_RE.findall((text or '').lower().replace('ё', 'е')):
+        word = f'  {word} '
+        trigrams.update(
+            word[start:start + 3] for start in range(len(word) - 2)
+        )
+    return trigrams
+
+
+def fill_title_trigrams(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    TitleTrigram = apps.get_model('reviews', 'TitleTrigram')
+    titles = Title.objects.order_by('id').values_list('id', 'name')
+    rows = []
+    for title_id, name in titles.iterator(chunk_size=BATCH_SIZE):
+        rows.extend(
+            TitleTrigram(title_id=title_id, trigram=trigram)
+            for trigram in get_trigrams(name)
+        )
+        if len(rows) >= BATCH_SIZE:
+            TitleTrigram.objects.bulk_create(rows)
+            rows = []
+    TitleTrigram.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_review_comment_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='titletrigram',
+            index=models.Index(fields=['trigram', 'title'], name='title_trigram_idx'),
+        ),
+        migrations.RunPython(fill_title_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_title_trigram'),
+    ]
+
+    operations = [
+        # У автоматической таблицы связи ManyToManyField нет Meta, поэтому
+        # индекс "произведения жанра" создаётся вручную. Он покрывающий:
+        # фильтр ?genre= не читает строки таблицы связи.
+        migrations.RunSQL(
+            'CREATE INDEX title_genre_genre_title_idx '
+            'ON reviews_title_genre (genre_id, title_id)',
+            'DROP INDEX title_genre_genre_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['pub_date', 'id'], name='comment_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['pub_date', 'id'], name='review_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['year', 'name'], name='title_year_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['name'], name='title_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['category', 'year'], name='title_category_year_idx'),
+        ),
+    ]
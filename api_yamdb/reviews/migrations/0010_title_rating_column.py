@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-18 14:57
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_rating(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    # Целочисленное деление, как в reviews.ratings.get_rating.
+    Title.objects.filter(rating_count__gt=0).update(
+        rating=F('rating_sum') / F('rating_count')
+    )
+
+
+def create_rating_desc_index(apps, schema_editor):
+    # В PostgreSQL NULL при DESC идут первыми, а список сортируется
+    # с NULLS LAST: обратный проход по title_rating_idx не подходит.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX title_rating_desc_idx ON reviews_title '
+            '(rating DESC NULLS LAST, rating_count DESC, id DESC)'
+        )
+
+
+def drop_rating_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS title_rating_desc_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='rating',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['rating', 'rating_count', 'id'], name='title_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['rating_count', 'id'], name='title_review_count_idx'),
+        ),
+        migrations.RunPython(fill_rating, migrations.RunPython.noop),
+        migrations.RunPython(
+            create_rating_desc_index, drop_rating_desc_index
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2 on 2026-10-18 15:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+# Копии reviews.leaderboards на момент миграции: миграция не должна
+# меняться вместе с кодом приложения.
+DEFAULT_MEAN = 5.5
+PRIOR_REVIEWS = 5
+
+
+def weighted_rating(rating_sum, rating_count, mean, prior):
+    if not rating_count:
+        return None
+    return (rating_sum + prior * mean) / (rating_count + prior)
+
+
+def fill_title_rankings(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    TitleRanking = apps.get_model('reviews', 'TitleRanking')
+    totals = Title.objects.aggregate(
+        score_sum=Sum('rating_sum'), score_count=Sum('rating_count')
+    )
+    mean = (
+        totals['score_sum'] / totals['score_count']
+        if totals['score_count'] else DEFAULT_MEAN
+    )
+    prior = getattr(settings, 'LEADERBOARD_PRIOR_REVIEWS', PRIOR_REVIEWS)
+    titles = Title.objects.only(
+        'id', 'year', 'category', 'rating_sum', 'rating_count'
+    ).order_by('id')
+    batch = []
+    for title in titles.iterator(chunk_size=BATCH_SIZE):
+        batch.append(title)
+        if len(batch) >= BATCH_SIZE:
+            fill_batch(TitleRanking, Title.genre.through, batch, mean, prior)
+            batch = []
+    fill_batch(TitleRanking, Title.genre.through, batch, mean, prior)
+
+
+def fill_batch(TitleRanking, TitleGenre, titles, mean, prior):
+    genres = {}
+    for title_id, genre_id in TitleGenre.objects.filter(
+        title_id__in=[title.id for title in titles]
+    ).values_list('title_id', 'genre_id'):
+        genres.setdefault(title_id, []).append(genre_id)
+    rows = []
+    for title in titles:
+        score = weighted_rating(
+            title.rating_sum, title.rating_count, mean, prior
+        )
+        boards = [('all', 0), ('year', title.year)]
+        if title.category_id is not None:
+            boards.append(('category', title.category_id))
+        boards.extend(
+            ('genre', genre_id) for genre_id in genres.get(title.id, ())
+        )
+        rows.extend(
+            TitleRanking(
+                board=board, key=key, title_id=title.id,
+                rating_sum=title.rating_sum,
+                rating_count=title.rating_count, score=score,
+            )
+            for board, key in boards
+        )
+    TitleRanking.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_title_rating_column'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('all', 'Все произведения'), ('genre', 'Жанр'), ('category', 'Категория'), ('year', 'Год')], max_length=16, verbose_name='Топ')),
+                ('key', models.IntegerField(default=0, verbose_name='Ключ')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Количество оценок')),
+                ('score', models.FloatField(null=True, verbose_name='Взвешенный рейтинг')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='titleranking',
+            index=models.Index(fields=['board', 'key', 'score', 'title'], name='title_ranking_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='titleranking',
+            constraint=models.UniqueConstraint(fields=('board', 'key', 'title'), name='unique_title_ranking'),
+        ),
+        migrations.RunPython(
+            fill_title_rankings, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 3.2 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+# Копия reviews.models.HISTOGRAM_FIELDS на момент миграции.
+HISTOGRAM_FIELDS = tuple(f'histogram_{score}' for score in range(1, 11))
+
+
+def fill_histograms(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    title_ids = Title.objects.filter(rating_count__gt=0).order_by(
+        'id'
+    ).values_list('id', flat=True)
+    batch = []
+    for title_id in title_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(title_id)
+        if len(batch) >= BATCH_SIZE:
+            fill_batch(Title, Review, batch)
+            batch = []
+    fill_batch(Title, Review, batch)
+
+
+def fill_batch(Title, Review, title_ids):
+    titles = {title_id: Title(id=title_id) for title_id in title_ids}
+    for title in titles.values():
+        for field in HISTOGRAM_FIELDS:
+            setattr(title, field, 0)
+    scores = Review.objects.filter(title_id__in=title_ids).values_list(
+        'title_id', 'score'
+    )
+    for title_id, score in scores.iterator(chunk_size=BATCH_SIZE):
+        field = f'histogram_{score}'
+        title = titles[title_id]
+        setattr(title, field, getattr(title, field) + 1)
+    Title.objects.bulk_update(titles.values(), HISTOGRAM_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0011_title_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='histogram_1',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_10',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 10'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_2',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_3',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_4',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_5',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_6',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 6'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_7',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 7'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_8',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 8'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='histogram_9',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 9'),
+        ),
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
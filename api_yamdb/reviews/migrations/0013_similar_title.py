@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 15:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_title_score_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarTitle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('similarity', models.FloatField(verbose_name='Сходство')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similartitle',
+            constraint=models.UniqueConstraint(fields=('title', 'rank'), name='unique_similar_title_rank'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+
+# Копии reviews.leaderboards на момент миграции: миграция не должна
+# меняться вместе с кодом приложения.
+DEFAULT_MEAN = 5.5
+PRIOR_REVIEWS = 5
+
+
+def store_mean(apps, schema_editor):
+    '''
+    Сохраняет среднюю по каталогу и пересчитывает с ней рейтинги всех
+    строк топов одним UPDATE: до миграции они могли быть посчитаны
+    с разными значениями из кеша.
+    '''
+    Title = apps.get_model('reviews', 'Title')
+    TitleRanking = apps.get_model('reviews', 'TitleRanking')
+    LeaderboardPrior = apps.get_model('reviews', 'LeaderboardPrior')
+    totals = Title.objects.aggregate(
+        score_sum=Sum('rating_sum'), score_count=Sum('rating_count')
+    )
+    mean = (
+        totals['score_sum'] / totals['score_count']
+        if totals['score_count'] else DEFAULT_MEAN
+    )
+    prior = getattr(settings, 'LEADERBOARD_PRIOR_REVIEWS', PRIOR_REVIEWS)
+    LeaderboardPrior.objects.create(pk=1, mean=mean)
+    TitleRanking.objects.filter(rating_count__gt=0).update(
+        score=(Cast('rating_sum', FloatField()) + prior * mean)
+        / (F('rating_count') + prior)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0014_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(verbose_name='Средняя оценка')),
+            ],
+            options={
+                'verbose_name': 'Средняя оценка топов',
+            },
+        ),
+        migrations.RunPython(store_mean, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-18 16:56
+
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+
+def fill_average(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    # Точное среднее, как в reviews.ratings.get_average.
+    Title.objects.filter(rating_count__gt=0).update(
+        rating=Cast(F('rating_sum'), FloatField()) / F('rating_count')
+    )
+
+
+def fill_integer_part(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Title.objects.filter(rating_count__gt=0).update(
+        rating=F('rating_sum') / F('rating_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0015_leaderboard_prior'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='title',
+            name='rating',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Рейтинг'),
+        ),
+        migrations.RunPython(fill_average, fill_integer_part),
+    ]
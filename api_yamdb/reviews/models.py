@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 
 from reviews.validators import validate_year
 
@@ -16,6 +17,19 @@ ROLES = [
     ('admin', 'Администратор'),
 ]
 
+# Допустимые оценки отзыва и поля произведения со счётчиками каждой
+# из них (гистограмма оценок).
+SCORES = range(1, 11)
+HISTOGRAM_FIELDS = tuple(f'histogram_{score}' for score in SCORES)
+
+
+def histogram_field(score):
+    return models.PositiveIntegerField(
+        verbose_name=f'Количество оценок {score}',
+        default=0,
+        editable=False,
+    )
+
 
 class User(AbstractUser):
     username = models.CharField(
@@ -56,6 +70,15 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем имя из БД: оно выводится в отзывах и комментариях,
+        # и при переименовании меняются их валидаторы и кеш ответов.
+        if 'username' in field_names:
+            instance._loaded_username = instance.username
+        return instance
+
     # Создаем методы модератор и админ, чтобы в дальнейшем использовать их
     # как атрибуты класса.
     @property
@@ -81,6 +104,13 @@ class CategoryAndGenreModel(models.Model):
         max_length=50,
         unique=True,
     )
+    # Время последнего изменения: из него и числа строк строятся
+    # ETag и Last-Modified ответов API (api.cache).
+    updated_at = models.DateTimeField(
+        verbose_name='Время изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -131,14 +161,201 @@ class Title(models.Model):
         verbose_name='Жанр',
         related_name='titles',
     )
+    # Агрегаты оценок хранятся в самом произведении и обновляются
+    # при изменении отзывов (см. reviews.ratings), чтобы не считать
+    # Avg() по всем отзывам на каждый запрос.
+    rating_sum = models.PositiveIntegerField(
+        verbose_name='Сумма оценок',
+        default=0,
+        editable=False,
+    )
+    rating_count = models.PositiveIntegerField(
+        verbose_name='Количество оценок',
+        default=0,
+        editable=False,
+    )
+    # Средняя оценка (None без отзывов). Хранится вместе с агрегатами,
+    # чтобы сортировать и фильтровать список по индексу; до целой
+    # части округляется только при выводе (api.serializers).
+    rating = models.FloatField(
+        verbose_name='Рейтинг',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    # Гистограмма оценок: сколько отзывов поставили 1, 2, …, 10.
+    # Обновляется вместе с агрегатами, чтобы страница произведения
+    # не группировала его отзывы.
+    histogram_1 = histogram_field(1)
+    histogram_2 = histogram_field(2)
+    histogram_3 = histogram_field(3)
+    histogram_4 = histogram_field(4)
+    histogram_5 = histogram_field(5)
+    histogram_6 = histogram_field(6)
+    histogram_7 = histogram_field(7)
+    histogram_8 = histogram_field(8)
+    histogram_9 = histogram_field(9)
+    histogram_10 = histogram_field(10)
+    # Время последнего изменения представления произведения: кроме
+    # сохранения обновляется при изменении отзывов, жанров и категории
+    # (reviews.ratings, reviews.signals). Из него строятся ETag
+    # и Last-Modified ответов API (api.cache).
+    updated_at = models.DateTimeField(
+        verbose_name='Время изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
+        # Фильтры и сортировки списка произведений (api.filters).
+        # Принадлежность жанру ищется по индексу (genre_id, title_id)
+        # таблицы связи, см. миграцию 0009.
+        indexes = [
+            models.Index(fields=['year', 'name'],
+                         name='title_year_name_idx'),
+            models.Index(fields=['name'], name='title_name_idx'),
+            models.Index(fields=['category', 'year'],
+                         name='title_category_year_idx'),
+            models.Index(fields=['rating', 'rating_count', 'id'],
+                         name='title_rating_idx'),
+            models.Index(fields=['rating_count', 'id'],
+                         name='title_review_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def histogram(self):
+        '''Количество отзывов с каждой оценкой, от 1 до 10.'''
+        return [getattr(self, field) for field in HISTOGRAM_FIELDS]
+
+    @histogram.setter
+    def histogram(self, counts):
+        for field, count in zip(HISTOGRAM_FIELDS, counts):
+            setattr(self, field, count)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем значения из БД, чтобы не перестраивать поисковые
+        # индексы (reviews.search) и рейтинги (reviews.leaderboards),
+        # если поля не менялись.
+        if 'name' in field_names:
+            instance._loaded_name = instance.name
+        if 'description' in field_names:
+            instance._loaded_description = instance.description
+        if 'category_id' in field_names and 'year' in field_names:
+            instance._loaded_boards = (instance.category_id, instance.year)
+        return instance
+
+
+class TitleTrigram(models.Model):
+    '''Триграмма названия произведения для нечёткого поиска.'''
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        # Покрывающий индекс: кандидаты ищутся только по нему.
+        indexes = [
+            models.Index(fields=['trigram', 'title'],
+                         name='title_trigram_idx'),
+        ]
+
+
+class TitleRanking(models.Model):
+    '''
+    Произведение в одном из топов (см. reviews.leaderboards):
+    общем, жанра, категории или года.
+    '''
+    ALL = 'all'
+    GENRE = 'genre'
+    CATEGORY = 'category'
+    YEAR = 'year'
+    BOARDS = [
+        (ALL, 'Все произведения'),
+        (GENRE, 'Жанр'),
+        (CATEGORY, 'Категория'),
+        (YEAR, 'Год'),
+    ]
+
+    board = models.CharField('Топ', max_length=16, choices=BOARDS)
+    # id жанра или категории, год; 0 для общего топа.
+    key = models.IntegerField('Ключ', default=0)
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    # Копия агрегатов произведения: рейтинг пересчитывается одним
+    # UPDATE этой таблицы, без чтения Title.
+    rating_sum = models.PositiveIntegerField('Сумма оценок', default=0)
+    rating_count = models.PositiveIntegerField(
+        'Количество оценок',
+        default=0,
+    )
+    # Байесовский рейтинг; None, пока у произведения нет отзывов.
+    score = models.FloatField('Взвешенный рейтинг', null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'key', 'title'],
+                                    name='unique_title_ranking')
+        ]
+        # Топ читается обратным проходом по индексу: первые k строк.
+        indexes = [
+            models.Index(fields=['board', 'key', 'score', 'title'],
+                         name='title_ranking_idx'),
+        ]
+
+
+class LeaderboardPrior(models.Model):
+    '''
+    Средняя оценка по каталогу C, с которой посчитаны рейтинги всех
+    строк TitleRanking. Одна строка; меняется только полной пересборкой
+    топов (reviews.leaderboards.rebuild), чтобы в одном топе не было
+    рейтингов с разными C.
+    '''
+    mean = models.FloatField('Средняя оценка')
+
+    class Meta:
+        verbose_name = 'Средняя оценка топов'
+
+
+class SimilarTitle(models.Model):
+    '''
+    Похожее произведение: сосед по оценкам пользователей
+    (см. reviews.recommendations). Пересчитывается офлайн командой
+    build_recommendations.
+    '''
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    # Место в списке похожих, с 1.
+    rank = models.PositiveSmallIntegerField('Место')
+    similarity = models.FloatField('Сходство')
+
+    class Meta:
+        # Соседи произведения читаются по этому индексу первыми k
+        # строками, без сортировки.
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'rank'],
+                                    name='unique_similar_title_rank')
+        ]
+
 
 class Review(models.Model):
     text = models.TextField('Текст отзыва')
@@ -152,13 +369,15 @@ class Review(models.Model):
     score = models.IntegerField(
         'Рейтинг произведения',
         validators=[
-            MaxValueValidator(10),
-            MinValueValidator(1)
+            MaxValueValidator(SCORES[-1]),
+            MinValueValidator(SCORES[0])
         ],
     )
+    # Дата задаётся по умолчанию, а не через auto_now_add, чтобы импорт
+    # сохранял исходные даты публикации.
     pub_date = models.DateTimeField(
         'Дата публикации отзыва',
-        auto_now_add=True,
+        default=timezone.now,
     )
     # При удалении произвеления удаляется отзыв.
     title = models.ForeignKey(
@@ -167,19 +386,51 @@ class Review(models.Model):
         related_name='reviews',
         verbose_name='ID произведения',
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Время изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
-        ordering = ('pub_date',)
+        ordering = ('pub_date', 'id')
         constraints = [
             models.UniqueConstraint(fields=['author', 'title'],
                                     name='unique_author_title')
         ]
+        # Ключ курсорной пагинации отзывов произведения и порядок
+        # ленты отзывов в поиске модератора.
+        indexes = [
+            models.Index(fields=['title', 'pub_date', 'id'],
+                         name='review_title_pub_date_idx'),
+            models.Index(fields=['pub_date', 'id'],
+                         name='review_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем оценку из БД, чтобы при изменении отзыва
+        # скорректировать агрегаты произведения на разницу, и текст,
+        # чтобы не переиндексировать неизменённый (reviews.search).
+        if 'score' in field_names:
+            instance._loaded_score = instance.score
+        if 'text' in field_names:
+            instance._loaded_text = instance.text
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Отзыв и агрегаты произведения (обновляются в post_save)
+        # сохраняются в одной транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_score = self.score
+
 
 class Comment(models.Model):
     text = models.TextField('Текст комментария')
@@ -190,9 +441,11 @@ class Comment(models.Model):
         related_name='comments',
         verbose_name='Автор комментария',
     )
+    # Дата задаётся по умолчанию, а не через auto_now_add, чтобы импорт
+    # сохранял исходные даты публикации.
     pub_date = models.DateTimeField(
         'Дата публикации комментария',
-        auto_now_add=True,
+        default=timezone.now,
     )
     # При удалении отзыва или произведения удаляется комментарий.
     review = models.ForeignKey(
@@ -201,11 +454,80 @@ class Comment(models.Model):
         related_name='comments',
         verbose_name='ID отзыва',
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Время изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
-        ordering = ('pub_date',)
+        ordering = ('pub_date', 'id')
+        # Ключ курсорной пагинации комментариев к отзыву и порядок
+        # ленты комментариев в поиске модератора.
+        indexes = [
+            models.Index(fields=['review', 'pub_date', 'id'],
+                         name='comment_review_pub_date_idx'),
+            models.Index(fields=['pub_date', 'id'],
+                         name='comment_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем текст из БД, чтобы не переиндексировать
+        # неизменённый (reviews.search).
+        if 'text' in field_names:
+            instance._loaded_text = instance.text
+        return instance
+
+
+class OutgoingEmail(models.Model):
+    '''Письмо в очереди на отправку (см. reviews.mail).'''
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    ]
+
+    subject = models.CharField('Тема', max_length=256)
+    body = models.TextField('Текст')
+    from_email = models.CharField('Отправитель', max_length=254)
+    recipient = models.EmailField('Получатель', max_length=254)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Количество попыток',
+        default=0,
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    next_attempt_at = models.DateTimeField(
+        'Время следующей попытки',
+        default=timezone.now,
+    )
+    sent_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        ordering = ('id',)
+        # Выборка очередной пачки писем воркером.
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='outgoing_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
@@ -0,0 +1,133 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, FloatField, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from reviews import leaderboards, versions
+from reviews.autocomplete import TITLE_AUTOCOMPLETE
+from reviews.models import HISTOGRAM_FIELDS, SCORES, Review, Title
+
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating') + HISTOGRAM_FIELDS
+
+
+def get_rating(rating_sum, rating_count):
+    '''Рейтинг для вывода: целая часть средней оценки или None.'''
+    return rating_sum // rating_count if rating_count else None
+
+
+def get_average(rating_sum, rating_count):
+    '''Средняя оценка для столбца Title.rating или None.'''
+    return rating_sum / rating_count if rating_count else None
+
+
+def update_title_rating(title_id, score_delta, count_delta, histogram=None):
+    '''
+    Атомарно сдвигает агрегаты оценок произведения и пересчитывает
+    рейтинг в том же UPDATE (правые части видят старые значения).
+    Там же обновляется время изменения произведения.
+    histogram — сдвиги счётчиков гистограммы: {оценка: +1 или -1}.
+    '''
+    histogram = {
+        f'histogram_{score}': F(f'histogram_{score}') + delta
+        for score, delta in (histogram or {}).items() if delta
+    }
+    Title.objects.filter(id=title_id).update(
+        **histogram,
+        rating_sum=F('rating_sum') + score_delta,
+        rating_count=F('rating_count') + count_delta,
+        updated_at=timezone.now(),
+        rating=Case(
+            When(
+                rating_count__gt=-count_delta,
+                then=Cast(F('rating_sum') + score_delta, FloatField())
+                / (F('rating_count') + count_delta),
+            ),
+            default=None,
+            output_field=FloatField(),
+        ),
+    )
+    leaderboards.shift_scores(title_id, score_delta, count_delta)
+    # Рейтинги в подсказках сдвигаем так же, но только после фиксации.
+    transaction.on_commit(lambda: TITLE_AUTOCOMPLETE.shift_rating(
+        title_id, score_delta, count_delta
+    ))
+
+
+def count_scores(title_ids, pairs):
+    '''
+    Гистограммы оценок произведений за один проход numpy.bincount.
+    title_ids — отсортированные id, pairs — пары (id произведения,
+    оценка). Возвращает матрицу len(title_ids) x 10.
+    '''
+    title_ids = np.asarray(title_ids, dtype=np.int64)
+    pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+    # Номер ячейки: строка произведения * 10 + (оценка - 1).
+    cells = (
+        np.searchsorted(title_ids, pairs[:, 0]) * len(SCORES)
+        + pairs[:, 1] - SCORES[0]
+    )
+    return np.bincount(
+        cells, minlength=len(title_ids) * len(SCORES)
+    ).reshape(len(title_ids), len(SCORES))
+
+
+def recalculate_batch(titles, dry_run):
+    '''Сверяет и исправляет агрегаты пачки произведений.'''
+    if not titles:
+        return []
+    histograms = count_scores(
+        [title.id for title in titles],
+        Review.objects.filter(
+            title_id__in=[title.id for title in titles]
+        ).values_list('title_id', 'score').iterator(),
+    )
+    sums = histograms @ np.array(SCORES)
+    counts = histograms.sum(axis=1)
+    drift = []
+    changed = []
+    for title, histogram, score_sum, score_count in zip(
+        titles, histograms.tolist(), sums.tolist(), counts.tolist()
+    ):
+        stored = (title.rating_sum, title.rating_count)
+        expected = (score_sum, score_count)
+        rating = get_average(*expected)
+        if (
+            stored == expected and title.rating == rating
+            and title.histogram == histogram
+        ):
+            continue
+        drift.append((title.id, stored, expected))
+        title.rating_sum, title.rating_count = expected
+        title.rating = rating
+        title.histogram = histogram
+        title.updated_at = timezone.now()
+        changed.append(title)
+    if not dry_run and changed:
+        Title.objects.bulk_update(changed, RATING_FIELDS + ('updated_at',))
+    return drift
+
+
+def recalculate_ratings(title_ids=None, batch_size=1000, dry_run=False):
+    '''
+    Пересчитывает агрегаты и гистограммы оценок по таблице отзывов
+    пачками по batch_size произведений.
+    Возвращает список расхождений вида
+    (id, (сумма, количество) в БД, (сумма, количество) по отзывам).
+    '''
+    titles = Title.objects.only('id', *RATING_FIELDS)
+    if title_ids is not None:
+        titles = titles.filter(id__in=title_ids)
+    drift = []
+    batch = []
+    for title in titles.order_by('id').iterator(chunk_size=batch_size):
+        batch.append(title)
+        if len(batch) >= batch_size:
+            drift.extend(recalculate_batch(batch, dry_run))
+            batch = []
+    drift.extend(recalculate_batch(batch, dry_run))
+    if not dry_run and drift:
+        leaderboards.refresh_titles([title_id for title_id, *_ in drift])
+        transaction.on_commit(TITLE_AUTOCOMPLETE.invalidate)
+        versions.bump_on_commit(versions.ALL)
+    return drift
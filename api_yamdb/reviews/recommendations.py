@@ -0,0 +1,155 @@
+from itertools import islice
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import norm
+
+from reviews.models import Review, SimilarTitle
+
+# Сколько соседей хранится для каждого произведения.
+NEIGHBOURS = 10
+# Сколько строк матрицы сходства считается за раз: память на пачку —
+# CHUNK_SIZE x число произведений чисел float32.
+CHUNK_SIZE = 256
+# Минимум пользователей, оценивших оба произведения: сходство
+# по одному общему читателю — шум.
+MIN_COMMON = 2
+BATCH_SIZE = 1000
+# Сколько отзывов читается из БД за раз при построении матриц.
+READ_CHUNK_SIZE = 10000
+
+
+def read_reviews(chunk_size=READ_CHUNK_SIZE):
+    '''
+    Массивы (автор, произведение, оценка) всех отзывов. Заполняются
+    пачками по chunk_size строк в заранее выделенные массивы numpy,
+    без промежуточного списка кортежей на все отзывы.
+    '''
+    capacity = Review.objects.count()
+    columns = np.empty((capacity, 3), dtype=np.int64)
+    size = 0
+    rows = Review.objects.values_list(
+        'author_id', 'title_id', 'score'
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        if size + len(chunk) > capacity:
+            # Отзывы, добавленные после подсчёта.
+            capacity = max(size + len(chunk), capacity * 2)
+            columns = np.resize(columns, (capacity, 3))
+        columns[size:size + len(chunk)] = chunk
+        size += len(chunk)
+    return columns[:size, 0], columns[:size, 1], columns[:size, 2]
+
+
+def load_scores():
+    '''
+    Разреженные матрицы произведения x пользователи по отзывам.
+    Оценки скорректированы на среднюю оценку пользователя (adjusted
+    cosine: строгий и щедрый читатели сравнимы), строки нормированы,
+    поэтому скалярное произведение строк — косинус. Вторая матрица —
+    факт оценки (1), для подсчёта общих читателей.
+    Возвращает (id произведений, оценки, факты оценки).
+    '''
+    authors, titles, scores = read_reviews()
+    users, user_rows = np.unique(authors, return_inverse=True)
+    title_ids, title_rows = np.unique(titles, return_inverse=True)
+    scores = scores.astype(np.float32)
+    user_means = (
+        np.bincount(user_rows, weights=scores, minlength=len(users))
+        / np.maximum(np.bincount(user_rows, minlength=len(users)), 1)
+    )
+    shape = (len(title_ids), len(users))
+    matrix = sparse.csr_matrix(
+        (scores - user_means[user_rows], (title_rows, user_rows)),
+        shape=shape, dtype=np.float32,
+    )
+    norms = norm(matrix, axis=1) if matrix.nnz else np.zeros(shape[0])
+    norms[norms == 0] = 1
+    matrix = sparse.diags((1 / norms).astype(np.float32)) @ matrix
+    rated = sparse.csr_matrix(
+        (np.ones(len(scores), dtype=np.float32), (title_rows, user_rows)),
+        shape=shape,
+    )
+    return title_ids, matrix.tocsr(), rated
+
+
+def top_neighbours(similarity, neighbours):
+    '''
+    Индексы и значения neighbours наибольших элементов каждой строки,
+    по убыванию (при равенстве — по индексу).
+    '''
+    count = min(neighbours, similarity.shape[1])
+    top = np.argpartition(-similarity, count - 1, axis=1)[:, :count]
+    values = np.take_along_axis(similarity, top, axis=1)
+    order = np.lexsort((top, -values), axis=1)
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(values, order, axis=1),
+    )
+
+
+def iter_neighbours(title_ids, matrix, rated, neighbours=NEIGHBOURS,
+                    chunk_size=CHUNK_SIZE, min_common=MIN_COMMON):
+    '''
+    Для каждого произведения — (id, [(id соседа, сходство), ...]).
+    Сходство считается пачками строк: произведение разреженных
+    матриц, затем поиск top-k векторно по всей пачке.
+    '''
+    matrix_t = matrix.T.tocsr()
+    rated_t = rated.T.tocsr()
+    for start in range(0, len(title_ids), chunk_size):
+        stop = min(start + chunk_size, len(title_ids))
+        similarity = (matrix[start:stop] @ matrix_t).toarray()
+        common = (rated[start:stop] @ rated_t).toarray()
+        similarity[common < min_common] = 0
+        rows = np.arange(stop - start)
+        similarity[rows, rows + start] = 0
+        top, values = top_neighbours(similarity, neighbours)
+        for row in rows:
+            yield int(title_ids[start + row]), [
+                (int(title_ids[column]), float(value))
+                for column, value in zip(top[row], values[row])
+                if value > 0
+            ]
+
+
+def rebuild(neighbours=NEIGHBOURS, chunk_size=CHUNK_SIZE,
+            min_common=MIN_COMMON, batch_size=BATCH_SIZE):
+    '''
+    Пересчитывает похожие произведения по всем отзывам.
+    Возвращает число сохранённых пар.
+    '''
+    title_ids, matrix, rated = load_scores()
+    SimilarTitle.objects.all().delete()
+    count = 0
+    batch = []
+    for title_id, similar in iter_neighbours(
+        title_ids, matrix, rated, neighbours, chunk_size, min_common
+    ):
+        batch.extend(
+            SimilarTitle(
+                title_id=title_id, similar_id=similar_id, rank=rank,
+                similarity=similarity,
+            )
+            for rank, (similar_id, similarity) in enumerate(similar, 1)
+        )
+        if len(batch) >= batch_size:
+            SimilarTitle.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    SimilarTitle.objects.bulk_create(batch)
+    return count + len(batch)
+
+
+def get_similar_queryset(title_id):
+    '''Соседи произведения по месту: проход по индексу (title, rank).'''
+    return SimilarTitle.objects.filter(
+        title_id=title_id
+    ).select_related('similar').order_by('rank')
+
+
+def get_similar(title_id, limit=NEIGHBOURS):
+    return list(get_similar_queryset(title_id)[:limit])
@@ -0,0 +1,471 @@
+import re
+import threading
+
+import snowballstemmer
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, FloatField, Q, When
+from django.db.models.expressions import RawSQL
+
+from reviews.models import Comment, Review, Title, TitleTrigram
+
+WORD_RE = re.compile(r'\w+')
+# Веса полей: в PostgreSQL это метки setweight, в SQLite — множители bm25.
+WEIGHTS = {'A': 10.0, 'B': 1.0}
+# Сколько id удаляется из индекса одним запросом.
+REMOVE_BATCH_SIZE = 500
+# Нечёткий поиск: сколько кандидатов по триграммам проверять
+# расстоянием Левенштейна и сколько результатов отдавать.
+FUZZY_CANDIDATES = 200
+FUZZY_LIMIT = 50
+# Сколько строк индекса триграмм читать на триграмму запроса: частые
+# триграммы встречаются в доле всех названий, и без ограничения время
+# поиска растёт вместе с каталогом.
+FUZZY_MAX_POSTINGS = 10000
+
+_local = threading.local()
+
+
+def get_stemmer():
+    # Объект стеммера хранит состояние: у каждого потока свой.
+    if not hasattr(_local, 'stemmer'):
+        _local.stemmer = snowballstemmer.stemmer('russian')
+    return _local.stemmer
+
+
+def stem_words(text):
+    '''Основы слов текста в нижнем регистре, ё заменена на е.'''
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return get_stemmer().stemWords(words)
+
+
+def normalize(text):
+    return (text or '').lower().replace('ё', 'е')
+
+
+def get_trigrams(text):
+    '''
+    Триграммы слов текста, как в pg_trgm: слово дополняется двумя
+    пробелами в начале и одним в конце.
+    '''
+    trigrams = set()
+    for word in WORD_RE.findall(normalize(text)):
+        word = f'  {word} '
+        trigrams.update(
+            word[start:start + 3] for start in range(len(word) - 2)
+        )
+    return trigrams
+
+
+def levenshtein(first, second, max_distance):
+    '''
+    Расстояние редактирования между строками или max_distance + 1,
+    если оно больше max_distance (тогда счёт прекращается досрочно).
+    '''
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, 1):
+        current = [row]
+        for column, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (first_char != second_char),
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+def get_fuzzy_distance(query, text, max_distance):
+    '''
+    Расстояние от запроса до ближайшего фрагмента текста из стольких
+    же слов: опечатка в одном слове названия не тонет в остальных.
+    '''
+    query_words = WORD_RE.findall(normalize(query))
+    words = WORD_RE.findall(normalize(text))
+    size = min(len(query_words), len(words))
+    query = ' '.join(query_words)
+    return min(
+        levenshtein(query, ' '.join(words[start:start + size]), max_distance)
+        for start in range(len(words) - size + 1)
+    )
+
+
+class PendingRemoval:
+    '''
+    id, которые нужно удалить из индекса после фиксации транзакции.
+    Колбэк регистрируется на каждый id, но удаляет весь набор первый
+    из них, остальные находят набор пустым. После отката id остаются
+    в наборе и уходят со следующей фиксацией, но remove не трогает
+    строки объектов, которые есть в таблице модели.
+    '''
+
+    def __init__(self, index):
+        self.index = index
+        self.ids = set()
+
+    def add(self, pk):
+        self.ids.add(pk)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        ids, self.ids = self.ids, set()
+        self.index.remove(sorted(ids), deleted_only=True)
+
+
+class FullTextIndex:
+    '''
+    Полнотекстовый индекс по текстовым полям модели.
+
+    SQLite: виртуальная таблица FTS5 с rowid = id объекта. В FTS5 нет
+    русского стеммера, поэтому в таблицу пишутся основы слов, а запрос
+    стеммится так же. Индекс обновляется сигналами, после импорта
+    и командой rebuild_search_index.
+
+    PostgreSQL: GIN-индекс по to_tsvector('russian', ...) из миграции,
+    обновлять ничего не нужно.
+    '''
+
+    def __init__(self, table, model, fields):
+        self.table = table
+        self.model = model
+        # Пары (поле, вес).
+        self.fields = fields
+
+    @property
+    def vendor(self):
+        return connection.vendor
+
+    @property
+    def field_names(self):
+        return [field for field, _ in self.fields]
+
+    def get_document(self, obj):
+        return [
+            ' '.join(stem_words(getattr(obj, field)))
+            for field in self.field_names
+        ]
+
+    def create_sql(self):
+        columns = ', '.join(self.field_names)
+        return (
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+            f'USING fts5({columns}, tokenize="unicode61")'
+        )
+
+    def get_loaded(self, obj):
+        '''Значения полей из БД (Model.from_db) или None у нового объекта.'''
+        return [
+            getattr(obj, f'_loaded_{field}', None)
+            for field in self.field_names
+        ]
+
+    def update(self, objects):
+        '''
+        Переиндексирует объекты, у которых изменились индексируемые поля
+        (только SQLite).
+        '''
+        if self.vendor != 'sqlite':
+            return
+        # Значения _loaded_* не обновляются: name у произведения общий
+        # с TrigramIndex, который сравнивает его следующим.
+        self.write([
+            obj for obj in objects
+            if self.get_loaded(obj) != [
+                getattr(obj, field) for field in self.field_names
+            ]
+        ])
+
+    def write(self, objects):
+        '''Записывает строки индекса объектов.'''
+        rows = [[obj.pk] + self.get_document(obj) for obj in objects]
+        if not rows:
+            return
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        columns = ', '.join(self.field_names)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (rowid, {columns}) '
+                f'VALUES ({placeholders})',
+                rows,
+            )
+
+    def remove(self, ids, deleted_only=False):
+        '''
+        Удаляет строки индекса; с deleted_only только строки объектов,
+        которых уже нет в таблице модели.
+        '''
+        if self.vendor != 'sqlite' or not ids:
+            return
+        ids = list(ids)
+        condition = ''
+        if deleted_only:
+            model_table = self.model._meta.db_table
+            condition = (
+                f' AND NOT EXISTS (SELECT 1 FROM {model_table} '
+                f'WHERE {model_table}.id = {self.table}.rowid)'
+            )
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), REMOVE_BATCH_SIZE):
+                batch = ids[start:start + REMOVE_BATCH_SIZE]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f'DELETE FROM {self.table} '
+                    f'WHERE rowid IN ({placeholders}){condition}',
+                    batch,
+                )
+
+    def remove_on_commit(self, pk):
+        '''
+        Удаляет объект из индекса после фиксации транзакции, одним
+        запросом на все объекты транзакции: каскадное удаление шлёт
+        post_delete на каждый объект. До этого строки удалённых объектов
+        не попадут в выдачу: поиск соединяет индекс с таблицей модели.
+        '''
+        if self.vendor != 'sqlite':
+            return
+        pending = getattr(_local, self.table, None)
+        if pending is None:
+            pending = PendingRemoval(self)
+            setattr(_local, self.table, pending)
+        pending.add(pk)
+
+    def rebuild(self, batch_size=1000):
+        '''Строит индекс заново, возвращает число объектов.'''
+        if self.vendor != 'sqlite':
+            return self.model.objects.count()
+        with connection.cursor() as cursor:
+            cursor.execute(self.create_sql())
+            cursor.execute(f'DELETE FROM {self.table}')
+        count = 0
+        batch = []
+        objects = self.model.objects.only('id', *self.field_names)
+        for obj in objects.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                self.write(batch)
+                count += len(batch)
+                batch = []
+        self.write(batch)
+        return count + len(batch)
+
+    def get_match_query(self, text):
+        '''Запрос FTS5: все основы слов должны встретиться.'''
+        return ' '.join(f'"{stem}"' for stem in stem_words(text))
+
+    def get_pg_vector(self):
+        '''Выражение tsvector; совпадает с выражением GIN-индекса.'''
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        return ' || '.join(
+            f"setweight(to_tsvector('russian', coalesce("
+            f"{table}.{connection.ops.quote_name(field)}, '')), '{weight}')"
+            for field, weight in self.fields
+        )
+
+    def search(self, queryset, text):
+        '''
+        Объекты queryset, подходящие под запрос, по убыванию
+        релевантности (аннотация search_rank).
+        '''
+        if self.vendor == 'postgresql':
+            return self.search_postgresql(queryset, text)
+        if self.vendor == 'sqlite':
+            return self.search_sqlite(queryset, text)
+        condition = Q()
+        for word in text.split():
+            word_condition = Q()
+            for field in self.field_names:
+                word_condition |= Q(**{f'{field}__icontains': word})
+            condition &= word_condition
+        return queryset.filter(condition)
+
+    def search_sqlite(self, queryset, text):
+        query = self.get_match_query(text)
+        if not query:
+            return queryset.none()
+        db_table = connection.ops.quote_name(self.model._meta.db_table)
+        weights = ', '.join(
+            str(WEIGHTS[weight]) for _, weight in self.fields
+        )
+        # Таблица индекса соединяется с таблицей модели по rowid: bm25
+        # считается в том же проходе по совпадениям, а не подзапросом
+        # на каждую строку. В ORM нет модели для виртуальной таблицы,
+        # поэтому соединение задаётся через extra().
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {db_table}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[query],
+        ).annotate(search_rank=RawSQL(
+            # bm25 тем меньше, чем документ релевантнее.
+            f'-bm25({self.table}, {weights})',
+            (),
+            output_field=FloatField(),
+        )).order_by('-search_rank', 'id')
+
+    def search_postgresql(self, queryset, text):
+        vector = self.get_pg_vector()
+        return queryset.annotate(
+            search_match=RawSQL(
+                f"{vector} @@ plainto_tsquery('russian', %s)",
+                (text,),
+                output_field=BooleanField(),
+            ),
+            search_rank=RawSQL(
+                f"ts_rank({vector}, plainto_tsquery('russian', %s))",
+                (text,),
+                output_field=FloatField(),
+            ),
+        ).filter(search_match=True).order_by('-search_rank', 'id')
+
+
+class TrigramIndex:
+    '''
+    Нечёткий поиск по полю модели: триграммы хранятся в отдельной
+    таблице с индексом (триграмма, объект). Кандидаты — объекты
+    с наибольшим числом общих с запросом триграмм, затем они
+    упорядочиваются по расстоянию Левенштейна.
+    '''
+
+    def __init__(self, model, field, trigram_model, related_field):
+        self.model = model
+        self.field = field
+        self.trigram_model = trigram_model
+        self.related_field = related_field
+        self.loaded_attr = f'_loaded_{field}'
+
+    def get_rows(self, obj):
+        return [
+            self.trigram_model(**{self.related_field: obj, 'trigram': trigram})
+            for trigram in get_trigrams(getattr(obj, self.field))
+        ]
+
+    def update(self, objects):
+        '''Перестраивает триграммы объектов, у которых изменилось поле.'''
+        changed = [
+            obj for obj in objects
+            if getattr(obj, self.loaded_attr, None) != getattr(obj, self.field)
+        ]
+        if not changed:
+            return
+        with transaction.atomic():
+            self.trigram_model.objects.filter(**{
+                f'{self.related_field}__in': [obj.pk for obj in changed]
+            }).delete()
+            self.trigram_model.objects.bulk_create(
+                row for obj in changed for row in self.get_rows(obj)
+            )
+        for obj in changed:
+            setattr(obj, self.loaded_attr, getattr(obj, self.field))
+
+    def remove_on_commit(self, pk):
+        '''Триграммы удаляются каскадом вместе с объектом.'''
+
+    def rebuild(self, batch_size=1000):
+        '''
+        Строит таблицу триграмм заново. Строки пишутся через executemany
+        без создания объектов моделей: их в 10–20 раз больше, чем
+        самих объектов.
+        '''
+        self.trigram_model.objects.all().delete()
+        table, column = self.get_table()
+        sql = f'INSERT INTO {table} ({column}, trigram) VALUES (%s, %s)'
+        count = 0
+        rows = []
+        values = self.model.objects.values_list('id', self.field)
+        with connection.cursor() as cursor:
+            for pk, value in values.iterator(chunk_size=batch_size):
+                rows.extend((pk, trigram) for trigram in get_trigrams(value))
+                count += 1
+                if len(rows) >= batch_size:
+                    cursor.executemany(sql, rows)
+                    rows = []
+            if rows:
+                cursor.executemany(sql, rows)
+        return count
+
+    @staticmethod
+    def get_max_distance(query):
+        '''Допустимое число опечаток: одна на каждые три символа.'''
+        return max(1, len(normalize(query).strip()) // 3)
+
+    def get_table(self):
+        '''Имена таблицы триграмм и столбца объекта для сырого SQL.'''
+        return (
+            connection.ops.quote_name(self.trigram_model._meta.db_table),
+            connection.ops.quote_name(
+                self.trigram_model._meta.get_field(self.related_field).column
+            ),
+        )
+
+    def get_candidates(self, trigrams):
+        '''
+        {id: число общих триграмм} для FUZZY_CANDIDATES объектов с
+        наибольшим числом общих триграмм. Из каждой триграммы читается
+        не больше FUZZY_MAX_POSTINGS строк индекса: редкие триграммы
+        учитываются целиком, а частые (вроде начала слова «  с»)
+        не заставляют читать строки всего каталога.
+        '''
+        table, column = self.get_table()
+        postings = ' UNION ALL '.join(
+            f'SELECT {column} FROM (SELECT {column} FROM {table} '
+            f'WHERE trigram = %s LIMIT %s) AS postings{number}'
+            for number in range(len(trigrams))
+        )
+        params = []
+        for trigram in trigrams:
+            params.extend((trigram, FUZZY_MAX_POSTINGS))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {column}, COUNT(*) AS shared FROM ({postings}) '
+                f'AS postings GROUP BY {column} '
+                f'ORDER BY shared DESC, {column} LIMIT %s',
+                params + [FUZZY_CANDIDATES],
+            )
+            return dict(cursor.fetchall())
+
+    def find(self, query, limit=FUZZY_LIMIT):
+        '''Список (id, расстояние) по возрастанию расстояния.'''
+        trigrams = sorted(get_trigrams(query))
+        if not trigrams:
+            return []
+        shared = self.get_candidates(trigrams)
+        values = self.model.objects.filter(id__in=shared).values_list(
+            'id', self.field
+        )
+        max_distance = self.get_max_distance(query)
+        found = []
+        for pk, value in values:
+            distance = get_fuzzy_distance(query, value, max_distance)
+            if distance <= max_distance:
+                found.append((distance, -shared[pk], pk))
+        found.sort()
+        return [(pk, distance) for distance, _, pk in found[:limit]]
+
+    def search(self, queryset, query):
+        '''Объекты queryset, похожие на запрос, ближайшие первыми.'''
+        ids = [pk for pk, _ in self.find(query)]
+        return queryset.filter(id__in=ids).order_by(Case(
+            *(When(id=pk, then=position) for position, pk in enumerate(ids)),
+            default=len(ids),
+        ))
+
+
+TITLE_INDEX = FullTextIndex(
+    'reviews_title_fts', Title, (('name', 'A'), ('description', 'B'))
+)
+REVIEW_INDEX = FullTextIndex('reviews_review_fts', Review, (('text', 'A'),))
+COMMENT_INDEX = FullTextIndex(
+    'reviews_comment_fts', Comment, (('text', 'A'),)
+)
+TITLE_TRIGRAM_INDEX = TrigramIndex(Title, 'name', TitleTrigram, 'title')
+SEARCH_INDEXES = {
+    'titles': TITLE_INDEX,
+    'title_trigrams': TITLE_TRIGRAM_INDEX,
+    'reviews': REVIEW_INDEX,
+    'comments': COMMENT_INDEX,
+}
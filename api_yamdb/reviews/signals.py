@@ -0,0 +1,306 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from reviews import leaderboards, versions
+from reviews.autocomplete import TITLE_AUTOCOMPLETE
+from reviews.content import TITLE_CONTENT
+from reviews.facets import TITLE_FACETS
+from reviews.models import (Category, Comment, Genre, Review, Title,
+                            TitleRanking, User)
+from reviews.ratings import recalculate_ratings, update_title_rating
+from reviews.search import (COMMENT_INDEX, REVIEW_INDEX, TITLE_INDEX,
+                            TITLE_TRIGRAM_INDEX)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    '''Учитываем новую или изменённую оценку в агрегатах произведения.'''
+    if raw:
+        return
+    if created:
+        update_title_rating(
+            instance.title_id, instance.score, 1, {instance.score: 1}
+        )
+        return
+    loaded_score = getattr(instance, '_loaded_score', None)
+    if loaded_score is None:
+        # Исходная оценка неизвестна: пересчитываем произведение целиком.
+        recalculate_ratings(title_ids=[instance.title_id])
+    elif loaded_score != instance.score:
+        update_title_rating(
+            instance.title_id, instance.score - loaded_score, 0,
+            {instance.score: 1, loaded_score: -1},
+        )
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    '''
+    Убираем оценку из агрегатов произведения.
+    Срабатывает и при каскадном удалении пользователя или произведения.
+    '''
+    score = getattr(instance, '_loaded_score', instance.score)
+    update_title_rating(instance.title_id, -score, -1, {score: -1})
+
+
+SEARCH_INDEXES_BY_MODEL = {
+    Title: (TITLE_INDEX, TITLE_TRIGRAM_INDEX),
+    Review: (REVIEW_INDEX,),
+    Comment: (COMMENT_INDEX,),
+}
+
+
+def search_indexed_saved(sender, instance, raw=False, **kwargs):
+    '''Переиндексируем текст объекта для поиска.'''
+    if not raw:
+        for index in SEARCH_INDEXES_BY_MODEL[sender]:
+            index.update([instance])
+
+
+def search_indexed_deleted(sender, instance, **kwargs):
+    for index in SEARCH_INDEXES_BY_MODEL[sender]:
+        index.remove_on_commit(instance.pk)
+
+
+for model in SEARCH_INDEXES_BY_MODEL:
+    post_save.connect(search_indexed_saved, sender=model)
+    post_delete.connect(search_indexed_deleted, sender=model)
+
+
+@receiver(post_save, sender=Title)
+def title_autocomplete_saved(sender, instance, raw=False, **kwargs):
+    '''Обновляем подсказки по названиям после фиксации транзакции.'''
+    if not raw:
+        transaction.on_commit(lambda: TITLE_AUTOCOMPLETE.update(instance))
+
+
+@receiver(post_delete, sender=Title)
+def title_autocomplete_deleted(sender, instance, **kwargs):
+    title_id = instance.pk
+    transaction.on_commit(lambda: TITLE_AUTOCOMPLETE.remove(title_id))
+
+
+@receiver(post_save, sender=Title)
+def title_facets_saved(sender, instance, raw=False, **kwargs):
+    '''Обновляем категорию и год в фасетном индексе.'''
+    if not raw:
+        transaction.on_commit(lambda: TITLE_FACETS.update(instance))
+
+
+@receiver(post_delete, sender=Title)
+def title_facets_deleted(sender, instance, **kwargs):
+    title_id = instance.pk
+    transaction.on_commit(lambda: TITLE_FACETS.remove(title_id))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    '''Переносим изменения связей произведений с жанрами в индекс.'''
+    if action == 'post_clear':
+        if reverse:
+            # Затронутые произведения неизвестны: перечитываем индекс.
+            transaction.on_commit(TITLE_FACETS.invalidate)
+        else:
+            title_id = instance.pk
+            transaction.on_commit(
+                lambda: TITLE_FACETS.clear_genres(title_id)
+            )
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        pairs = [(title_id, instance.pk) for title_id in pk_set]
+    else:
+        pairs = [(instance.pk, genre_id) for genre_id in pk_set]
+    value = action == 'post_add'
+    transaction.on_commit(lambda: TITLE_FACETS.set_genres(pairs, value))
+
+
+@receiver(post_save, sender=Title)
+def title_content_saved(sender, instance, created, raw=False, **kwargs):
+    '''
+    Изменённое произведение убираем из индекса похожих по содержанию:
+    его вектор пересчитается при следующем запросе похожих. Новые
+    произведения добавляет TitlePostSerializer — там известны жанры.
+    '''
+    if not raw and not created:
+        title_id = instance.pk
+        transaction.on_commit(lambda: TITLE_CONTENT.remove(title_id))
+
+
+@receiver(post_delete, sender=Title)
+def title_content_deleted(sender, instance, **kwargs):
+    title_id = instance.pk
+    transaction.on_commit(lambda: TITLE_CONTENT.remove(title_id))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_content_genres_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        transaction.on_commit(TITLE_CONTENT.invalidate)
+    else:
+        title_id = instance.pk
+        transaction.on_commit(lambda: TITLE_CONTENT.remove(title_id))
+
+
+def facet_values_changed(sender, instance, raw=False, **kwargs):
+    '''
+    Новый slug, удалённый жанр или категория (каскад и SET_NULL
+    обходят сигналы Title): перечитываем индекс целиком.
+    '''
+    if not raw:
+        transaction.on_commit(TITLE_FACETS.invalidate)
+
+
+for model in (Genre, Category):
+    post_save.connect(facet_values_changed, sender=model)
+    post_delete.connect(facet_values_changed, sender=model)
+
+
+@receiver(post_save, sender=Title)
+def title_ranking_saved(sender, instance, created, raw=False, **kwargs):
+    '''Добавляем произведение в топы или переносим при смене категории.'''
+    if raw:
+        return
+    if created:
+        leaderboards.add_title(instance)
+    else:
+        leaderboards.move_title(instance)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_ranking_genres_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action == 'post_clear':
+        if reverse:
+            leaderboards.remove_board(TitleRanking.GENRE, instance.pk)
+        else:
+            TitleRanking.objects.filter(
+                title_id=instance.pk, board=TitleRanking.GENRE
+            ).delete()
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        pairs = [(title_id, instance.pk) for title_id in pk_set]
+    else:
+        pairs = [(instance.pk, genre_id) for genre_id in pk_set]
+    if action == 'post_add':
+        leaderboards.add_genres(pairs, None if reverse else instance)
+    else:
+        leaderboards.remove_genres(pairs)
+
+
+@receiver(post_delete, sender=Genre)
+def genre_ranking_deleted(sender, instance, **kwargs):
+    leaderboards.remove_board(TitleRanking.GENRE, instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def category_ranking_deleted(sender, instance, **kwargs):
+    leaderboards.remove_board(TitleRanking.CATEGORY, instance.pk)
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def response_versions_changed(sender, instance, raw=False, **kwargs):
+    '''
+    Меняем версии закешированных ответов (api.cache): отзыв сдвигает
+    рейтинг произведения и в карточке, и в списке.
+    '''
+    if raw:
+        return
+    title_id = instance.pk if sender is Title else instance.title_id
+    versions.bump_on_commit(versions.CATALOGUE, versions.title_key(title_id))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def response_versions_genres_changed(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        keys = [versions.title_key(instance.pk)]
+    elif action == 'post_clear':
+        # Затронутые произведения неизвестны.
+        keys = [versions.ALL]
+    else:
+        keys = [versions.title_key(title_id) for title_id in pk_set]
+    versions.bump_on_commit(versions.CATALOGUE, *keys)
+
+
+def response_taxonomy_changed(sender, instance, raw=False, **kwargs):
+    '''Жанры и категории выводятся в каждом произведении.'''
+    if not raw:
+        versions.bump_on_commit(versions.CATALOGUE, versions.TAXONOMY)
+
+
+for model in (Genre, Category):
+    post_save.connect(response_taxonomy_changed, sender=model)
+    post_delete.connect(response_taxonomy_changed, sender=model)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_touched(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    '''
+    Жанры входят в представление произведения: обновляем время его
+    изменения (ETag и Last-Modified в api.cache).
+    '''
+    now = timezone.now()
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Title.objects.filter(pk=instance.pk).update(updated_at=now)
+            instance.updated_at = now
+    elif action in ('post_add', 'post_remove'):
+        Title.objects.filter(pk__in=pk_set).update(updated_at=now)
+    elif action == 'pre_clear':
+        instance.titles.update(updated_at=now)
+
+
+def taxonomy_touched(sender, instance, created=False, raw=False, **kwargs):
+    '''
+    Переименование или удаление жанра и категории меняет представление
+    их произведений; SET_NULL и каскад связей обходят сигналы Title.
+    '''
+    if raw or created:
+        return
+    lookup = 'genre' if sender is Genre else 'category'
+    Title.objects.filter(**{lookup: instance}).update(
+        updated_at=timezone.now()
+    )
+
+
+for model in (Genre, Category):
+    post_save.connect(taxonomy_touched, sender=model)
+    pre_delete.connect(taxonomy_touched, sender=model)
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, created, raw=False, **kwargs):
+    '''
+    Имя автора выводится в отзывах и комментариях: при переименовании
+    обновляем время их изменения (ETag в api.cache) и версии списков
+    отзывов его произведений в кеше ответов.
+    '''
+    loaded = getattr(instance, '_loaded_username', instance.username)
+    instance._loaded_username = instance.username
+    if raw or created or loaded == instance.username:
+        return
+    now = timezone.now()
+    reviews = Review.objects.filter(author=instance)
+    reviews.update(updated_at=now)
+    Comment.objects.filter(author=instance).update(updated_at=now)
+    title_ids = reviews.values_list('title_id', flat=True)
+    versions.bump_on_commit(*(
+        versions.title_key(title_id) for title_id in title_ids.iterator()
+    ))
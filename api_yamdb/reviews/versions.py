@@ -0,0 +1,45 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Версии данных, от которых зависят закешированные ответы API
+# (api.cache). Версия входит в ключ ответа: после изменения данных
+# ключ другой, а старые ответы вытесняются из кеша по таймауту.
+ALL = 'versions:all'
+CATALOGUE = 'versions:catalogue'
+TAXONOMY = 'versions:taxonomy'
+
+
+def title_key(title_id):
+    return f'versions:title:{title_id}'
+
+
+def new_version():
+    # Уникальное значение, а не счётчик: версия, вытесненная из кеша,
+    # не начнётся заново с 1 и не вернёт старые ответы.
+    return time.time_ns()
+
+
+def get_versions(keys):
+    '''Текущие версии по ключам; недостающие создаются.'''
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump(*keys):
+    version = new_version()
+    cache.set_many({key: version for key in keys}, None)
+
+
+def bump_on_commit(*keys):
+    '''
+    Меняет версии после фиксации транзакции: иначе параллельный запрос
+    успел бы сохранить под новой версией ещё старые данные.
+    '''
+    transaction.on_commit(lambda: bump(*keys))
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+from django.core.cache import caches
 from django.utils.version import get_version
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -33,3 +35,23 @@ assert get_version() < '4.0.0', 'Пожалуйста, используйте в
 pytest_plugins = [
     'tests.fixtures.fixture_user',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    '''Кеш не должен переживать тест: id пользователей переиспользуются.'''
+    for cache in caches.all():
+        cache.clear()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def finish_index_loading():
+    '''Фоновая загрузка индексов не должна пережить тест и его БД.'''
+    yield
+    from reviews.autocomplete import TITLE_AUTOCOMPLETE
+    from reviews.facets import TITLE_FACETS
+    TITLE_AUTOCOMPLETE.wait()
+    TITLE_FACETS.wait()
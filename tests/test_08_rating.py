@@ -0,0 +1,77 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Review, Title
+from tests.utils import create_single_review, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08RatingAggregates:
+
+    def get_rating(self, client, title_id):
+        response = client.get(f'/api/v1/titles/{title_id}/')
+        assert response.status_code == HTTPStatus.OK
+        return response.json().get('rating')
+
+    def test_01_rating_follows_reviews(self, client, admin_client,
+                                       user_client, moderator_client,
+                                       moderator):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        create_single_review(user_client, title_id, 'Так себе', 3)
+        response = create_single_review(
+            moderator_client, title_id, 'Отлично', 9
+        )
+        assert self.get_rating(client, title_id) == 6, (
+            'Проверьте, что после создания отзывов рейтинг произведения '
+            'равен средней оценке.'
+        )
+
+        review_id = response.json()['id']
+        response = moderator_client.patch(
+            f'/api/v1/titles/{title_id}/reviews/{review_id}/',
+            data={'score': 5}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_rating(client, title_id) == 4, (
+            'Проверьте, что при изменении оценки в отзыве пересчитывается '
+            'рейтинг произведения.'
+        )
+
+        moderator.delete()
+        assert self.get_rating(client, title_id) == 3, (
+            'Проверьте, что при удалении автора вместе с его отзывами '
+            'пересчитывается рейтинг произведения.'
+        )
+
+        Review.objects.filter(title_id=title_id).delete()
+        assert self.get_rating(client, title_id) is None, (
+            'Проверьте, что у произведения без отзывов рейтинг равен `None`.'
+        )
+
+    def test_02_recalculate_ratings_command(self, admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        create_single_review(user_client, title_id, 'Неплохо', 7)
+        Title.objects.filter(id=title_id).update(
+            rating_sum=100, rating_count=3
+        )
+
+        out = StringIO()
+        call_command('recalculate_ratings', '--dry-run', stdout=out)
+        assert str(title_id) in out.getvalue()
+        title = Title.objects.get(id=title_id)
+        assert (title.rating_sum, title.rating_count) == (100, 3), (
+            'Проверьте, что с флагом `--dry-run` команда только сообщает '
+            'о расхождениях.'
+        )
+
+        call_command('recalculate_ratings', stdout=StringIO())
+        title = Title.objects.get(id=title_id)
+        assert (title.rating_sum, title.rating_count) == (7, 1), (
+            'Проверьте, что команда `recalculate_ratings` исправляет '
+            'расхождения в сохранённых рейтингах.'
+        )
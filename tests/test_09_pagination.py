@@ -0,0 +1,147 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from api.pagination import KeysetPagination
+from reviews.models import Review, Title, User
+from tests.utils import create_titles
+
+
+def collect_pages(client, url, direction='next'):
+    ids = []
+    pages = 0
+    response = None
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{url}` в режиме курсорной '
+            'пагинации возвращает ответ со статусом 200.'
+        )
+        data = response.json()
+        assert 'count' not in data, (
+            'Проверьте, что в режиме курсорной пагинации не выполняется '
+            'подсчёт общего количества объектов.'
+        )
+        ids.extend(item['id'] for item in data['results'])
+        url = data[direction]
+        pages += 1
+    return ids, pages, response
+
+
+@pytest.mark.django_db(transaction=True)
+class Test09KeysetPagination:
+
+    def test_01_titles_cursor(self, client, admin_client):
+        create_titles(admin_client)
+        Title.objects.bulk_create(
+            Title(name=f'Произведение {idx}', year=2000, description='')
+            for idx in range(21)
+        )
+        expected = list(Title.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+
+        ids, pages, _ = collect_pages(
+            client, '/api/v1/titles/?pagination=cursor'
+        )
+        assert ids == expected, (
+            'Проверьте, что курсорная пагинация `/api/v1/titles/` '
+            'возвращает все произведения по возрастанию `id` без пропусков '
+            'и повторов.'
+        )
+        assert pages == 3
+
+        response = client.get('/api/v1/titles/')
+        assert response.json()['count'] == len(expected), (
+            'Проверьте, что без параметра `pagination=cursor` сохраняется '
+            'пагинация по номеру страницы.'
+        )
+
+    def test_02_reviews_cursor_with_equal_pub_date(self, client,
+                                                   admin_client):
+        titles, _, _ = create_titles(admin_client)
+        title = Title.objects.get(id=titles[0]['id'])
+        users = User.objects.bulk_create(
+            User(username=f'reader{idx}', email=f'reader{idx}@yamdb.fake')
+            for idx in range(25)
+        )
+        for user in User.objects.filter(username__startswith='reader'):
+            Review.objects.create(
+                title=title, author=user, text='Отзыв', score=5
+            )
+        # Одинаковые даты публикации не должны ломать порядок курсора.
+        same_date = timezone.now()
+        Review.objects.filter(
+            id__in=Review.objects.order_by('id').values('id')[5:15]
+        ).update(pub_date=same_date)
+        expected = list(Review.objects.filter(title=title).order_by(
+            'pub_date', 'id'
+        ).values_list('id', flat=True))
+        assert len(expected) == len(users)
+
+        url = f'/api/v1/titles/{title.id}/reviews/?pagination=cursor'
+        ids, pages, last_response = collect_pages(client, url)
+        assert ids == expected, (
+            'Проверьте, что курсорная пагинация отзывов упорядочена по '
+            '`(pub_date, id)` и не теряет и не повторяет отзывы.'
+        )
+        assert pages == 3
+
+        previous_url = last_response.json()['previous']
+        back_ids, _, _ = collect_pages(client, previous_url, 'previous')
+        ordered_back = []
+        for page_start in range(0, len(back_ids), 10):
+            ordered_back = back_ids[page_start:page_start + 10] + ordered_back
+        assert ordered_back == expected[:20], (
+            'Проверьте, что ссылка `previous` курсорной пагинации '
+            'возвращает предыдущие страницы.'
+        )
+
+    def test_03_invalid_cursor(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        response = client.get(
+            f'/api/v1/titles/{titles[0]["id"]}/reviews/?cursor=broken'
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что некорректный курсор приводит к ответу со '
+            'статусом 404.'
+        )
+
+    def test_04_cursor_keeps_own_order(self, client, admin_client):
+        create_titles(admin_client)
+        for params in (
+            {'ordering': '-rating'},
+            {'search': 'произведение'},
+            {'fuzzy': 'произведение'},
+        ):
+            response = client.get(
+                '/api/v1/titles/', {'pagination': 'cursor', **params}
+            )
+            assert response.status_code == HTTPStatus.BAD_REQUEST, (
+                'Проверьте, что курсорная пагинация по `id` не сочетается '
+                'с параметрами, задающими свой порядок: ответ 400.'
+            )
+            assert list(response.json()) == list(params)
+            response = client.get('/api/v1/titles/', params)
+            assert response.status_code == HTTPStatus.OK
+
+    @pytest.mark.skipif(
+        connection.vendor != 'sqlite',
+        reason='Планы PostgreSQL зависят от статистики таблиц.'
+    )
+    def test_05_cursor_seeks_index(self):
+        values = [timezone.now(), 1]
+        for ordering, bound in (
+            (('pub_date', 'id'), 'pub_date>?'),
+            (('-pub_date', '-id'), 'pub_date<?'),
+        ):
+            plan = Review.objects.filter(
+                KeysetPagination.get_keyset_filter(ordering, values),
+                title_id=1,
+            ).order_by(*ordering)[:10].explain()
+            assert f'(title_id=? AND {bound})' in plan, (
+                'Проверьте, что следующая страница ищется по индексу '
+                f'с позиции курсора, а не просмотром всех строк:\n{plan}'
+            )
@@ -0,0 +1,170 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.importer import CSVImporter
+from reviews.models import Comment, Genre, Review, Title, User
+
+CSV_FILES = {
+    'category.csv': 'id,name,slug\n1,Фильм,movie\n',
+    'genre.csv': 'id,name,slug\n1,Драма,drama\n2,Комедия,comedy\n',
+    'titles.csv': (
+        'id,name,year,category\n'
+        '1,Побег из Шоушенка,1994,1\n'
+        '2,Крестный отец,1972,1\n'
+    ),
+    'genre_title.csv': 'id,title_id,genre_id\n1,1,1\n2,2,1\n3,2,2\n',
+    'users.csv': (
+        'id,username,email,role,bio,first_name,last_name\n'
+        '100,bingobongo,bingobongo@yamdb.fake,user,,,\n'
+        '101,capt_obvious,capt_obvious@yamdb.fake,admin,,,\n'
+    ),
+    'review.csv': (
+        'id,title_id,text,author,score,pub_date\n'
+        '1,1,"Ставлю десять звёзд!\nСмотреть всем.",100,10,'
+        '2019-09-24T21:08:21.567Z\n'
+        '2,1,Неплохо,101,7,2019-09-25T21:08:21.567Z\n'
+        '3,999,Отзыв к несуществующему произведению,100,5,'
+        '2019-09-25T21:08:21.567Z\n'
+    ),
+    'comments.csv': (
+        'id,review_id,text,author,pub_date\n'
+        '1,1,Согласен,101,2020-01-13T23:20:02.422Z\n'
+    ),
+}
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    for filename, content in CSV_FILES.items():
+        (tmp_path / filename).write_text(content, encoding='utf-8')
+    return tmp_path
+
+
+@pytest.mark.django_db(transaction=True)
+class Test10Import:
+
+    def test_01_import_from_csv(self, csv_dir):
+        out = StringIO()
+        call_command(
+            'import', path=str(csv_dir), batch_size=1, stdout=out
+        )
+        assert Title.objects.count() == 2
+        assert Genre.objects.get(id=2).titles.get().id == 2, (
+            'Проверьте, что команда `import` загружает связи произведений '
+            'с жанрами из `genre_title.csv`.'
+        )
+        assert User.objects.filter(id__in=(100, 101)).count() == 2
+        assert Review.objects.count() == 2, (
+            'Проверьте, что строки со ссылкой на несуществующий объект '
+            'пропускаются, а остальные загружаются.'
+        )
+        assert 'review.csv, строка 3' in out.getvalue(), (
+            'Проверьте, что команда `import` сообщает о пропущенных строках.'
+        )
+        review = Review.objects.get(id=1)
+        assert review.text == 'Ставлю десять звёзд!\nСмотреть всем.'
+        assert review.pub_date.isoformat() == (
+            '2019-09-24T21:08:21.567000+00:00'
+        ), (
+            'Проверьте, что при импорте сохраняется дата публикации отзыва '
+            'из CSV-файла.'
+        )
+        assert Comment.objects.get(id=1).review_id == 1
+        title = Title.objects.get(id=1)
+        assert title.rating == 8.5, (
+            'Проверьте, что после импорта отзывов пересчитываются рейтинги '
+            'произведений.'
+        )
+
+    def test_02_imported_ids_do_not_clash(self, csv_dir, user_client):
+        call_command('import', path=str(csv_dir), stdout=StringIO())
+        response = user_client.post(
+            '/api/v1/titles/2/reviews/', data={'text': 'Шедевр', 'score': 9}
+        )
+        assert response.status_code == 201, (
+            'Проверьте, что после импорта с явными `id` новые объекты '
+            'создаются без конфликта первичных ключей.'
+        )
+
+    def test_03_incremental_import(self, csv_dir):
+        call_command('import', path=str(csv_dir), stdout=StringIO())
+        review_csv = csv_dir / 'review.csv'
+        review_csv.write_text(
+            review_csv.read_text(encoding='utf-8').replace(
+                'Неплохо,101,7', 'Хорошо,101,9'
+            ),
+            encoding='utf-8',
+        )
+
+        out = StringIO()
+        call_command(
+            'import', path=str(csv_dir), incremental=True, stdout=out
+        )
+        assert (
+            'review.csv: добавлено 0, обновлено 1, без изменений 1, '
+            'с ошибками 1'
+        ) in out.getvalue(), (
+            'Проверьте, что инкрементальный импорт выводит по каждому '
+            'файлу количество добавленных, обновлённых, пропущенных и '
+            'ошибочных строк.'
+        )
+        assert Review.objects.get(id=2).text == 'Хорошо'
+        assert Title.objects.get(id=1).rating == 9.5, (
+            'Проверьте, что после инкрементального импорта пересчитываются '
+            'рейтинги произведений.'
+        )
+        assert not (csv_dir / '.import_checkpoint.json').exists(), (
+            'Проверьте, что после успешного импорта checkpoint удаляется.'
+        )
+
+    def test_04_resume_from_checkpoint(self, csv_dir, monkeypatch):
+        upsert = CSVImporter.upsert
+        calls = []
+
+        def interrupted_upsert(importer, source, rows):
+            if source.filename == 'review.csv':
+                calls.append(rows)
+                if len(calls) == 2:
+                    raise KeyboardInterrupt
+            return upsert(importer, source, rows)
+
+        monkeypatch.setattr(CSVImporter, 'upsert', interrupted_upsert)
+        with pytest.raises(KeyboardInterrupt):
+            call_command(
+                'import', path=str(csv_dir), incremental=True, batch_size=1,
+                stdout=StringIO()
+            )
+        assert Review.objects.count() == 1
+        assert (csv_dir / '.import_checkpoint.json').exists()
+
+        monkeypatch.setattr(CSVImporter, 'upsert', upsert)
+        out = StringIO()
+        call_command(
+            'import', path=str(csv_dir), incremental=True, batch_size=1,
+            stdout=out
+        )
+        assert 'titles.csv: уже загружен' in out.getvalue()
+        assert 'review.csv: продолжаем со строки 2' in out.getvalue(), (
+            'Проверьте, что прерванный инкрементальный импорт продолжается '
+            'с сохранённой позиции.'
+        )
+        assert Review.objects.count() == 2
+        assert Comment.objects.count() == 1
+
+    def test_05_parallel_import(self, csv_dir):
+        out = StringIO()
+        call_command(
+            'import', path=str(csv_dir), workers=3, batch_size=1, stdout=out
+        )
+        assert Genre.objects.get(id=2).titles.get().id == 2
+        assert Review.objects.count() == 2
+        assert Comment.objects.get(id=1).review_id == 1, (
+            'Проверьте, что при параллельном импорте файлы записываются '
+            'после файлов, на которые они ссылаются.'
+        )
+        assert 'review.csv: разбор' in out.getvalue(), (
+            'Проверьте, что параллельный импорт выводит время разбора и '
+            'записи каждого файла.'
+        )
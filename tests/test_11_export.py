@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Category, Comment, Genre, Review, Title, User
+from tests.conftest import MANAGE_PATH
+
+DATA_PATH = os.path.join(MANAGE_PATH, 'static', 'data')
+
+
+def snapshot():
+    return {
+        'titles': list(Title.objects.order_by('id').values_list(
+            'id', 'name', 'year', 'category_id', 'description',
+            'rating_sum', 'rating_count',
+        )),
+        'genre_title': list(Title.genre.through.objects.order_by(
+            'id'
+        ).values_list('id', 'title_id', 'genre_id')),
+        'reviews': list(Review.objects.order_by('id').values_list(
+            'id', 'title_id', 'author_id', 'text', 'score', 'pub_date'
+        )),
+        'comments': list(Comment.objects.order_by('id').values_list(
+            'id', 'review_id', 'author_id', 'text', 'pub_date'
+        )),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class Test11Export:
+
+    def test_01_export_endpoint(self, admin_client, user_client, client):
+        call_command('import', path=DATA_PATH, stdout=StringIO())
+        url = '/api/v1/export/titles.ndjson'
+
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+        response = user_client.get(url)
+        assert response.status_code == HTTPStatus.FORBIDDEN, (
+            f'Проверьте, что `{url}` доступен только администратору.'
+        )
+
+        response = admin_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response.streaming, (
+            f'Проверьте, что `{url}` отдаёт данные потоком.'
+        )
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        titles = [json.loads(line) for line in lines]
+        assert [title['id'] for title in titles] == list(
+            Title.objects.order_by('id').values_list('id', flat=True)
+        )
+        assert titles[0]['name'] == Title.objects.get(id=1).name
+
+        response = admin_client.get('/api/v1/export/reviews.csv.gz')
+        assert response.status_code == HTTPStatus.OK
+        content = gzip.decompress(b''.join(response.streaming_content))
+        header = content.decode().splitlines()[0]
+        assert header == 'id,title_id,text,author,score,pub_date', (
+            'Проверьте, что заголовок CSV совпадает с форматом команды '
+            '`import`.'
+        )
+
+        response = admin_client.get('/api/v1/export/unknown.csv')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_02_export_import_round_trip(self, tmp_path):
+        call_command('import', path=DATA_PATH, stdout=StringIO())
+        before = snapshot()
+
+        call_command('export', path=str(tmp_path), stdout=StringIO())
+        assert (tmp_path / 'review.csv').exists()
+        for model in (Comment, Review, Title, Genre, Category, User):
+            model.objects.all().delete()
+        Title.genre.through.objects.all().delete()
+
+        out = StringIO()
+        call_command('import', path=str(tmp_path), stdout=out)
+        assert out.getvalue().count('с ошибками 0') == 7
+        assert snapshot() == before, (
+            'Проверьте, что файлы, выгруженные командой `export`, '
+            'загружаются командой `import` без потерь.'
+        )
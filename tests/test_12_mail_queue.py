@@ -0,0 +1,86 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.utils import timezone
+
+from reviews.models import OutgoingEmail
+
+
+class BrokenEmailBackend(BaseEmailBackend):
+    '''Почтовый backend, который не может отправить ни одного письма.'''
+
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@pytest.mark.django_db(transaction=True)
+class Test12MailQueue:
+    url_signup = '/api/v1/auth/signup/'
+
+    def test_01_signup_queues_mail(self, client):
+        data = {'email': 'queued@yamdb.fake', 'username': 'queued'}
+        response = client.post(self.url_signup, data=data)
+        assert response.status_code == 200
+        assert len(mail.outbox) == 0, (
+            f'Проверьте, что POST-запрос к `{self.url_signup}` не отправляет '
+            'письмо во время запроса, а ставит его в очередь.'
+        )
+        email = OutgoingEmail.objects.get()
+        assert email.recipient == data['email']
+        assert email.status == OutgoingEmail.PENDING
+
+        out = StringIO()
+        call_command('send_queued_mail', stdout=out)
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == [data['email']]
+        email.refresh_from_db()
+        assert email.status == OutgoingEmail.SENT
+        assert email.sent_at is not None
+        assert 'Отправлено писем: 1' in out.getvalue()
+
+    def test_02_failed_mail_is_retried_with_backoff(self, client, settings):
+        settings.EMAIL_BACKEND = (
+            'tests.test_12_mail_queue.BrokenEmailBackend'
+        )
+        client.post(
+            self.url_signup,
+            data={'email': 'retry@yamdb.fake', 'username': 'retry'}
+        )
+        call_command('send_queued_mail', stdout=StringIO())
+        email = OutgoingEmail.objects.get()
+        assert email.status == OutgoingEmail.PENDING
+        assert email.attempts == 1
+        assert 'SMTP недоступен' in email.last_error
+        assert email.next_attempt_at > timezone.now(), (
+            'Проверьте, что неудачная отправка откладывается на потом.'
+        )
+
+        call_command('send_queued_mail', stdout=StringIO())
+        email.refresh_from_db()
+        assert email.attempts == 1, (
+            'Проверьте, что письмо не отправляется повторно до наступления '
+            'времени следующей попытки.'
+        )
+
+        OutgoingEmail.objects.update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        call_command(
+            'send_queued_mail', max_attempts=2, stdout=StringIO()
+        )
+        email.refresh_from_db()
+        assert email.attempts == 2
+        assert email.status == OutgoingEmail.FAILED, (
+            'Проверьте, что после исчерпания попыток письмо помечается '
+            'как неотправленное.'
+        )
+
+        settings.EMAIL_BACKEND = (
+            'django.core.mail.backends.locmem.EmailBackend'
+        )
+        call_command('send_queued_mail', stdout=StringIO())
+        assert len(mail.outbox) == 0
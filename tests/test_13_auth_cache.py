@@ -0,0 +1,95 @@
+from http import HTTPStatus
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.authentication import get_access_token
+from reviews.models import User
+
+URL = '/api/v1/export/categories.csv'
+
+
+def get_user_queries(client, url=URL):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    queries = [
+        query['sql'] for query in context.captured_queries
+        if '"reviews_user"' in query['sql']
+    ]
+    return response, queries
+
+
+@pytest.mark.django_db(transaction=True)
+class Test13AuthCache:
+
+    def test_01_user_is_cached(self, admin_client, admin):
+        response, queries = get_user_queries(admin_client)
+        assert response.status_code == HTTPStatus.OK
+        assert len(queries) == 1
+
+        response, queries = get_user_queries(admin_client)
+        assert response.status_code == HTTPStatus.OK
+        assert queries == [], (
+            'Проверьте, что пользователь из JWT-токена берётся из кеша, '
+            'а не из БД на каждый запрос.'
+        )
+
+    def test_02_role_change_invalidates_cache(self, admin_client,
+                                              user_superuser_client, admin):
+        get_user_queries(admin_client)
+        response = user_superuser_client.patch(
+            f'/api/v1/users/{admin.username}/', data={'role': 'user'}
+        )
+        assert response.status_code == HTTPStatus.OK
+
+        response, _ = get_user_queries(admin_client)
+        assert response.status_code == HTTPStatus.FORBIDDEN, (
+            'Проверьте, что после смены роли пользователь не берётся '
+            'из кеша со старой ролью.'
+        )
+
+    def test_03_trusted_role_claim(self, admin, settings):
+        settings.JWT_TRUST_ROLE_CLAIM = True
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {get_access_token(admin)}'
+        )
+        response, queries = get_user_queries(client)
+        assert response.status_code == HTTPStatus.OK
+        assert queries == [], (
+            'Проверьте, что при `JWT_TRUST_ROLE_CLAIM = True` роль берётся '
+            'из токена без запроса к БД.'
+        )
+
+        response = client.get('/api/v1/users/me/')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['email'] == admin.email
+
+        admin.role = 'user'
+        admin.save()
+        # Ответы API не должны вытеснять отметку об изменении.
+        cache.clear()
+        response, _ = get_user_queries(client)
+        assert response.status_code == HTTPStatus.FORBIDDEN, (
+            'Проверьте, что роль из токена не используется после '
+            'изменения пользователя.'
+        )
+
+    def test_04_me_patch_reads_fresh_user(self, admin_client, admin):
+        get_user_queries(admin_client)
+        # Изменение в другом процессе: кеш этого процесса устарел.
+        User.objects.filter(pk=admin.pk).update(role='moderator')
+        response = admin_client.patch(
+            '/api/v1/users/me/', data={'bio': 'Новая биография'}
+        )
+        assert response.status_code == HTTPStatus.OK
+        admin.refresh_from_db()
+        assert (admin.role, admin.bio) == ('moderator', 'Новая биография'), (
+            'Проверьте, что PATCH `/api/v1/users/me/` изменяет профиль '
+            'из БД, а не устаревшую копию из кеша.'
+        )
@@ -0,0 +1,70 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Review
+from tests.utils import create_reviews, create_titles
+
+
+def count_queries(context, table):
+    return sum(
+        f'FROM "{table}"' in query['sql']
+        for query in context.captured_queries
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test14NestedRoutes:
+
+    def test_01_review_create_loads_title_once(self, admin_client,
+                                               user_client):
+        titles, _, _ = create_titles(admin_client)
+        url = f'/api/v1/titles/{titles[0]["id"]}/reviews/'
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.post(url, data={'text': 'Ок', 'score': 7})
+        assert response.status_code == HTTPStatus.CREATED
+        assert count_queries(context, 'reviews_title') == 1, (
+            f'Проверьте, что при POST-запросе к `{url}` произведение '
+            'загружается из БД один раз.'
+        )
+
+        response = user_client.post(
+            f'/api/v1/titles/{titles[1]["id"]}/reviews/',
+            data={'text': 'Ок', 'score': 7}
+        )
+        assert response.status_code == HTTPStatus.CREATED, (
+            'Проверьте, что пользователь может оставить отзывы к разным '
+            'произведениям.'
+        )
+
+    def test_02_comment_review_must_match_title(self, admin_client,
+                                                admin, user_client):
+        reviews, titles = create_reviews(admin_client, {admin: admin_client})
+        review = Review.objects.get(id=reviews[0]['id'])
+        other_title_id = next(
+            title['id'] for title in titles if title['id'] != review.title_id
+        )
+
+        url = (
+            f'/api/v1/titles/{other_title_id}/reviews/{review.id}/comments/'
+        )
+        assert user_client.get(url).status_code == HTTPStatus.NOT_FOUND
+        response = user_client.post(url, data={'text': 'Комментарий'})
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что комментарий нельзя оставить к отзыву через '
+            'URL другого произведения.'
+        )
+
+        url = (
+            f'/api/v1/titles/{review.title_id}/reviews/{review.id}/comments/'
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.post(url, data={'text': 'Комментарий'})
+        assert response.status_code == HTTPStatus.CREATED
+        assert count_queries(context, 'reviews_review') == 1, (
+            f'Проверьте, что при POST-запросе к `{url}` отзыв загружается '
+            'из БД один раз вместе с произведением.'
+        )
+        assert count_queries(context, 'reviews_title') == 0
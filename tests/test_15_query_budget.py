@@ -0,0 +1,247 @@
+import time
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.ratings import recalculate_ratings
+from reviews.search import SEARCH_INDEXES
+
+# Больше двух самых крупных страниц (max_page_size = 100) каждой
+# сущности: N+1 за пределами первой страницы проявится в числе запросов.
+SEED_SIZE = 250
+SMALL_PAGE, LARGE_PAGE = 2, 100
+
+TITLE = '/api/v1/titles/{title}/'
+REVIEWS = TITLE + 'reviews/'
+REVIEW = REVIEWS + '{review}/'
+COMMENTS = REVIEW + 'comments/'
+COMMENT = COMMENTS + '{comment}/'
+
+# Бюджет запросов к БД на один запрос к API. Учитывается и запрос
+# пользователя при аутентификации: кеш очищается перед каждым тестом.
+# (имя, клиент, метод, URL, данные, ожидаемый статус, бюджет)
+ENDPOINTS = (
+    ('users-list', 'admin_client', 'get', '/api/v1/users/', None,
+     HTTPStatus.OK, 3),
+    ('users-detail', 'admin_client', 'get', '/api/v1/users/{username}/',
+     None, HTTPStatus.OK, 2),
+    ('users-create', 'admin_client', 'post', '/api/v1/users/',
+     {'username': 'budget', 'email': 'budget@yamdb.fake'},
+     HTTPStatus.CREATED, 4),
+    ('users-patch', 'admin_client', 'patch', '/api/v1/users/{username}/',
+     {'bio': 'Новая биография'}, HTTPStatus.OK, 3),
+    ('users-delete', 'admin_client', 'delete',
+     '/api/v1/users/{spare_username}/', None, HTTPStatus.NO_CONTENT, 10),
+    ('users-me', 'admin_client', 'get', '/api/v1/users/me/', None,
+     HTTPStatus.OK, 1),
+    ('users-me-patch', 'admin_client', 'patch', '/api/v1/users/me/',
+     {'bio': 'Обо мне'}, HTTPStatus.OK, 3),
+    ('signup', 'client', 'post', '/api/v1/auth/signup/',
+     {'username': 'newcomer', 'email': 'newcomer@yamdb.fake'},
+     HTTPStatus.OK, 5),
+    ('categories-list', 'client', 'get', '/api/v1/categories/', None,
+     HTTPStatus.OK, 2),
+    ('categories-create', 'admin_client', 'post', '/api/v1/categories/',
+     {'name': 'Новая', 'slug': 'new-category'}, HTTPStatus.CREATED, 3),
+    ('categories-delete', 'admin_client', 'delete',
+     '/api/v1/categories/{spare_category}/', None,
+     HTTPStatus.NO_CONTENT, 7),
+    ('genres-list', 'client', 'get', '/api/v1/genres/', None,
+     HTTPStatus.OK, 2),
+    ('genres-create', 'admin_client', 'post', '/api/v1/genres/',
+     {'name': 'Новый', 'slug': 'new-genre'}, HTTPStatus.CREATED, 3),
+    ('genres-delete', 'admin_client', 'delete',
+     '/api/v1/genres/{spare_genre}/', None, HTTPStatus.NO_CONTENT, 7),
+    ('titles-list', 'client', 'get', '/api/v1/titles/', None,
+     HTTPStatus.OK, 3),
+    ('titles-cursor', 'client', 'get', '/api/v1/titles/?pagination=cursor',
+     None, HTTPStatus.OK, 2),
+    ('titles-detail', 'client', 'get', TITLE, None, HTTPStatus.OK, 2),
+    ('titles-similar', 'client', 'get', TITLE + 'similar/', None,
+     HTTPStatus.OK, 2),
+    ('titles-histogram', 'client', 'get', TITLE + '?include=histogram',
+     None, HTTPStatus.OK, 2),
+    ('titles-genres-list', 'client', 'get',
+     '/api/v1/titles/?genre=genre-0,genre-1&genre_mode=all', None,
+     HTTPStatus.OK, 3),
+    ('titles-facets', 'client', 'get',
+     '/api/v1/titles/facets/?genre=genre-0,genre-1', None, HTTPStatus.OK, 0),
+    ('titles-autocomplete', 'client', 'get',
+     '/api/v1/titles/autocomplete/?q=произв', None, HTTPStatus.OK, 0),
+    ('leaderboard', 'client', 'get', '/api/v1/leaderboards/', None,
+     HTTPStatus.OK, 1),
+    ('leaderboard-genre', 'client', 'get',
+     '/api/v1/leaderboards/genre/genre-0/', None, HTTPStatus.OK, 2),
+    ('titles-create', 'admin_client', 'post', '/api/v1/titles/',
+     {'name': 'Новое', 'year': 2000, 'description': 'Новинка',
+      'category': 'category-0', 'genre': ['genre-0', 'genre-1']},
+     HTTPStatus.CREATED, 18),
+    ('titles-patch', 'admin_client', 'patch', TITLE, {'name': 'Другое'},
+     HTTPStatus.OK, 9),
+    ('titles-delete', 'admin_client', 'delete',
+     '/api/v1/titles/{spare_title}/', None, HTTPStatus.NO_CONTENT, 11),
+    ('reviews-list', 'client', 'get', REVIEWS, None, HTTPStatus.OK, 3),
+    ('reviews-cursor', 'client', 'get', REVIEWS + '?pagination=cursor',
+     None, HTTPStatus.OK, 2),
+    ('reviews-detail', 'client', 'get', REVIEW, None, HTTPStatus.OK, 2),
+    ('reviews-create', 'admin_client', 'post', TITLE + 'reviews/',
+     {'text': 'Отзыв', 'score': 8}, HTTPStatus.CREATED, 8),
+    ('reviews-patch', 'admin_client', 'patch', REVIEW, {'score': 1},
+     HTTPStatus.OK, 8),
+    # Каскад удаляет SEED_SIZE комментариев отзыва пачками по 100
+    # (у Comment есть сигналы, быстрого удаления нет): три DELETE.
+    ('reviews-delete', 'admin_client', 'delete', REVIEW, None,
+     HTTPStatus.NO_CONTENT, 13),
+    ('comments-list', 'client', 'get', COMMENTS, None, HTTPStatus.OK, 3),
+    ('comments-cursor', 'client', 'get', COMMENTS + '?pagination=cursor',
+     None, HTTPStatus.OK, 2),
+    ('comments-detail', 'client', 'get', COMMENT, None, HTTPStatus.OK, 2),
+    ('comments-create', 'admin_client', 'post', COMMENTS,
+     {'text': 'Комментарий'}, HTTPStatus.CREATED, 4),
+    ('comments-patch', 'admin_client', 'patch', COMMENT,
+     {'text': 'Исправлено'}, HTTPStatus.OK, 5),
+    ('comments-delete', 'admin_client', 'delete', COMMENT, None,
+     HTTPStatus.NO_CONTENT, 6),
+    ('export', 'admin_client', 'get', '/api/v1/export/titles.csv', None,
+     HTTPStatus.OK, 2),
+    ('search-reviews-list', 'moderator_client', 'get',
+     '/api/v1/search/reviews/?search=отзыв', None, HTTPStatus.OK, 2),
+    ('search-comments-list', 'moderator_client', 'get',
+     '/api/v1/search/comments/?search=комментарий', None, HTTPStatus.OK, 2),
+)
+LIST_ENDPOINTS = tuple(
+    endpoint for endpoint in ENDPOINTS
+    if endpoint[0].endswith(('-list', '-cursor'))
+)
+
+
+@pytest.fixture
+def seed(admin):
+    '''Синтетические данные: каждой сущности больше двух LARGE_PAGE.'''
+    # На SQLite bulk_create не возвращает id: перечитываем объекты.
+    Category.objects.bulk_create(
+        Category(name=f'Категория {idx}', slug=f'category-{idx}')
+        for idx in range(SEED_SIZE)
+    )
+    categories = list(Category.objects.order_by('id'))
+    Genre.objects.bulk_create(
+        Genre(name=f'Жанр {idx}', slug=f'genre-{idx}')
+        for idx in range(SEED_SIZE)
+    )
+    genres = list(Genre.objects.order_by('id'))
+    Title.objects.bulk_create(
+        Title(
+            name=f'Произведение {idx}', year=2000,
+            category=categories[idx % SEED_SIZE],
+        )
+        for idx in range(SEED_SIZE)
+    )
+    titles = list(Title.objects.order_by('id'))
+    Title.genre.through.objects.bulk_create(
+        Title.genre.through(title=title, genre=genres[offset])
+        for title in titles for offset in range(3)
+    )
+    User.objects.bulk_create(
+        User(username=f'reader{idx}', email=f'reader{idx}@yamdb.fake')
+        for idx in range(SEED_SIZE)
+    )
+    readers = list(User.objects.filter(username__startswith='reader'))
+    title = titles[0]
+    Review.objects.bulk_create(
+        Review(title=title, author=reader, text='Отзыв', score=5)
+        for reader in readers
+    )
+    review = Review.objects.filter(title=title).order_by('id').first()
+    Comment.objects.bulk_create(
+        Comment(review=review, author=reader, text='Комментарий')
+        for reader in readers
+    )
+    recalculate_ratings()
+    # bulk_create обходит сигналы, поэтому поисковые индексы строим сами.
+    for index in SEARCH_INDEXES.values():
+        index.rebuild()
+    spare_user = User.objects.create(
+        username='spare', email='spare@yamdb.fake'
+    )
+    return {
+        'title': title.id,
+        'review': review.id,
+        'comment': review.comments.order_by('id').first().id,
+        'username': readers[0].username,
+        'spare_username': spare_user.username,
+        'spare_title': titles[-1].id,
+        'spare_category': Category.objects.create(
+            name='Лишняя', slug='spare'
+        ).slug,
+        'spare_genre': Genre.objects.create(
+            name='Лишний', slug='spare'
+        ).slug,
+    }
+
+
+def measure(client, method, url, data=None):
+    '''Ответ, число запросов к БД и время ответа в миллисекундах.'''
+    with CaptureQueriesContext(connection) as context:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data=data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+    return response, len(context.captured_queries), elapsed
+
+
+def get_client(request, name):
+    return request.getfixturevalue(name)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test15QueryBudget:
+
+    @pytest.mark.parametrize(
+        'name,client_name,method,url,data,expected_status,budget',
+        ENDPOINTS, ids=[endpoint[0] for endpoint in ENDPOINTS]
+    )
+    def test_01_endpoint_budget(self, request, record_property, seed, name,
+                                client_name, method, url, data,
+                                expected_status, budget):
+        client = get_client(request, client_name)
+        url = url.format(**seed)
+        response, queries, elapsed = measure(client, method, url, data)
+        record_property('queries', queries)
+        # Время только для отчёта: на общих машинах CI оно нестабильно.
+        record_property('time_ms', round(elapsed, 1))
+        assert response.status_code == expected_status, (
+            f'{method.upper()} {url}: {response.status_code}'
+        )
+        assert queries <= budget, (
+            f'Проверьте, что {method.upper()}-запрос к `{url}` выполняет '
+            f'не больше {budget} запросов к БД, сейчас — {queries}.'
+        )
+
+    @pytest.mark.parametrize(
+        'name,client_name,method,url,data,expected_status,budget',
+        LIST_ENDPOINTS, ids=[endpoint[0] for endpoint in LIST_ENDPOINTS]
+    )
+    def test_02_queries_do_not_grow_with_page_size(
+        self, request, seed, name, client_name, method, url, data,
+        expected_status, budget
+    ):
+        client = get_client(request, client_name)
+        url = url.format(**seed)
+        separator = '&' if '?' in url else '?'
+        # Прогреваем кеш пользователя, чтобы сравнивать только выборку.
+        measure(client, method, url)
+        counts = {}
+        for page_size in (SMALL_PAGE, LARGE_PAGE):
+            response, queries, _ = measure(
+                client, method, f'{url}{separator}page_size={page_size}'
+            )
+            assert len(response.json()['results']) == page_size
+            counts[page_size] = queries
+        assert counts[SMALL_PAGE] == counts[LARGE_PAGE], (
+            f'Проверьте, что число запросов к БД для `{url}` не растёт с '
+            f'размером страницы: {counts}.'
+        )
@@ -0,0 +1,82 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from reviews.models import Title
+
+
+def search(client, query):
+    response = client.get('/api/v1/titles/', {'search': query})
+    assert response.status_code == HTTPStatus.OK
+    return [title['name'] for title in response.json()['results']]
+
+
+@pytest.fixture
+def titles():
+    return [
+        Title.objects.create(
+            name=name, year=year, description=description
+        )
+        for name, year, description in (
+            ('Крёстный отец', 1972, 'Фильм о семье Корлеоне и её детях.'),
+            ('Побег из Шоушенка', 1994, 'Банкир попадает в тюрьму.'),
+            ('Отцы и дети', 1862, 'Роман о споре поколений.'),
+        )
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test16TitleSearch:
+
+    def test_01_search_with_stemming(self, client, titles):
+        assert search(client, 'детей') == ['Отцы и дети', 'Крёстный отец'], (
+            'Проверьте, что поиск `/api/v1/titles/?search=` находит разные '
+            'формы слова и выше ставит совпадения в названии.'
+        )
+        assert search(client, 'крестного') == ['Крёстный отец'], (
+            'Проверьте, что поиск не различает `ё` и `е`.'
+        )
+        assert search(client, 'тюрьмы банкира') == ['Побег из Шоушенка'], (
+            'Проверьте, что поиск ищет и по описанию произведения.'
+        )
+        assert search(client, 'отцов') == ['Отцы и дети']
+        assert search(client, 'отец тюрьма') == []
+        assert search(client, '!!!') == []
+
+    def test_02_index_follows_changes(self, client, titles):
+        title = titles[1]
+        title.name = 'Зелёная миля'
+        title.save()
+        assert search(client, 'шоушенк') == []
+        assert search(client, 'зеленой') == ['Зелёная миля']
+
+        title.delete()
+        assert search(client, 'зеленая') == []
+
+    def test_03_rebuild_command(self, client, titles):
+        # Массовые операции обходят сигналы и не обновляют индекс.
+        Title.objects.filter(id=titles[2].id).update(name='Мастер и Маргарита')
+        assert search(client, 'маргарита') == []
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        assert 'titles: проиндексировано 3' in out.getvalue()
+        assert search(client, 'маргариты') == ['Мастер и Маргарита'], (
+            'Проверьте, что команда `rebuild_search_index` перестраивает '
+            'индекс по данным в БД.'
+        )
+
+    def test_04_fts_table_contains_stems(self, titles):
+        if connection.vendor != 'sqlite':
+            pytest.skip('Таблица FTS5 есть только в SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT name FROM reviews_title_fts WHERE rowid = %s',
+                [titles[0].id],
+            )
+            assert cursor.fetchone() == ('крестн отец',), (
+                'Проверьте, что в индекс FTS5 записываются основы слов.'
+            )
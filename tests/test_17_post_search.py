@@ -0,0 +1,204 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reviews.models import Comment, Review, Title
+
+REVIEWS_URL = '/api/v1/search/reviews/'
+COMMENTS_URL = '/api/v1/search/comments/'
+
+
+def fts_ids(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {table} ORDER BY rowid')
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.fixture
+def posts(admin, moderator, user):
+    first, second = (
+        Title.objects.create(name=name, year=2000, description='')
+        for name in ('Первое', 'Второе')
+    )
+    reviews = [
+        Review.objects.create(
+            title=first, author=user, score=3,
+            text='Скучный сюжет и слабые актёры.'
+        ),
+        Review.objects.create(
+            title=first, author=admin, score=9,
+            text='Сюжет держит в напряжении до конца.'
+        ),
+        Review.objects.create(
+            title=second, author=user, score=8,
+            text='Отличные актёры, но сюжет предсказуем.'
+        ),
+    ]
+    Review.objects.filter(id=reviews[0].id).update(
+        pub_date=timezone.now() - timedelta(days=30)
+    )
+    comments = [
+        Comment.objects.create(
+            review=reviews[0], author=admin, text='Актёры играли хорошо.'
+        ),
+        Comment.objects.create(
+            review=reviews[2], author=moderator, text='Согласен про актёров.'
+        ),
+    ]
+    return reviews, comments
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17PostSearch:
+
+    def test_01_permissions(self, client, user_client, moderator_client,
+                            admin_client, posts):
+        assert client.get(REVIEWS_URL).status_code == HTTPStatus.UNAUTHORIZED
+        assert user_client.get(REVIEWS_URL).status_code == (
+            HTTPStatus.FORBIDDEN
+        ), (
+            f'Проверьте, что `{REVIEWS_URL}` недоступен обычному '
+            'пользователю.'
+        )
+        assert moderator_client.get(REVIEWS_URL).status_code == HTTPStatus.OK
+        assert admin_client.get(COMMENTS_URL).status_code == HTTPStatus.OK
+
+    def test_02_search_reviews(self, moderator_client, posts, user):
+        reviews, _ = posts
+
+        def search(**params):
+            response = moderator_client.get(REVIEWS_URL, params)
+            assert response.status_code == HTTPStatus.OK
+            return [review['id'] for review in response.json()['results']]
+
+        assert set(search(search='сюжеты')) == {
+            review.id for review in reviews
+        }, (
+            f'Проверьте, что `{REVIEWS_URL}?search=` находит отзывы по '
+            'разным формам слова.'
+        )
+        assert set(search(search='актер')) == {reviews[0].id, reviews[2].id}
+        assert search(search='актёр', title=reviews[0].title_id) == [
+            reviews[0].id
+        ]
+        assert set(search(search='сюжет', author=user.username)) == {
+            reviews[0].id, reviews[2].id
+        }
+        week_ago = (timezone.now() - timedelta(days=7)).isoformat()
+        assert set(search(search='сюжет', pub_date_after=week_ago)) == {
+            reviews[1].id, reviews[2].id
+        }, (
+            'Проверьте, что результаты поиска можно ограничить датой '
+            'публикации.'
+        )
+        response = moderator_client.get(
+            REVIEWS_URL, {'search': 'напряжении'}
+        )
+        assert response.json()['results'][0] == {
+            'id': reviews[1].id,
+            'title': reviews[1].title_id,
+            'text': reviews[1].text,
+            'author': reviews[1].author.username,
+            'score': 9,
+            'pub_date': response.json()['results'][0]['pub_date'],
+        }
+
+    def test_03_search_comments(self, moderator_client, posts):
+        reviews, comments = posts
+        response = moderator_client.get(
+            COMMENTS_URL,
+            {'search': 'актёры', 'title': reviews[2].title_id},
+        )
+        assert response.status_code == HTTPStatus.OK
+        results = response.json()['results']
+        assert [comment['id'] for comment in results] == [comments[1].id]
+        assert results[0]['review'] == reviews[2].id
+
+    def test_04_index_maintenance(self, moderator_client, posts):
+        reviews, comments = posts
+        if connection.vendor == 'sqlite':
+            assert {comment.id for comment in comments} <= set(
+                fts_ids('reviews_comment_fts')
+            )
+
+        review = reviews[1]
+        review.text = 'Передумал: затянуто.'
+        review.save()
+        response = moderator_client.get(REVIEWS_URL, {'search': 'затянуто'})
+        assert [item['id'] for item in response.json()['results']] == [
+            review.id
+        ], 'Проверьте, что изменённый отзыв переиндексируется.'
+
+        reviews[0].title.delete()
+        response = moderator_client.get(COMMENTS_URL, {'search': 'актёры'})
+        assert [item['id'] for item in response.json()['results']] == [
+            comments[1].id
+        ]
+        if connection.vendor == 'sqlite':
+            review_ids = fts_ids('reviews_review_fts')
+            assert reviews[2].id in review_ids
+            assert reviews[0].id not in review_ids, (
+                'Проверьте, что при каскадном удалении отзывы удаляются '
+                'из поискового индекса.'
+            )
+            comment_ids = fts_ids('reviews_comment_fts')
+            assert comments[0].id not in comment_ids
+            assert comments[1].id in comment_ids
+
+    def test_05_index_survives_rollback(self, posts):
+        if connection.vendor != 'sqlite':
+            pytest.skip('Индекс FTS5 есть только в SQLite.')
+        reviews, _ = posts
+        kept_id, deleted_id = reviews[2].id, reviews[1].id
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                reviews[2].delete()
+                raise RuntimeError
+        reviews[1].delete()
+        review_ids = fts_ids('reviews_review_fts')
+        assert deleted_id not in review_ids
+        assert kept_id in review_ids, (
+            'Проверьте, что откат транзакции не удаляет объект '
+            'из поискового индекса при следующей фиксации.'
+        )
+
+    def test_06_cursor_pages(self, moderator_client, posts):
+        reviews, _ = posts
+        response = moderator_client.get(REVIEWS_URL, {'search': 'сюжет'})
+        ranked = [review['id'] for review in response.json()['results']]
+        assert 'count' not in response.json(), (
+            'Проверьте, что поиск выводится по курсору, без подсчёта '
+            'всех совпадений.'
+        )
+        ids = []
+        url, params = REVIEWS_URL, {'search': 'сюжет', 'page_size': 1}
+        while url:
+            response = moderator_client.get(url, params)
+            assert response.status_code == HTTPStatus.OK
+            ids.extend(review['id'] for review in response.json()['results'])
+            url, params = response.json()['next'], None
+        assert ids == ranked, (
+            'Проверьте, что курсор поиска идёт по релевантности.'
+        )
+        response = moderator_client.get(REVIEWS_URL, {'page_size': 2})
+        assert [
+            review['id'] for review in response.json()['results']
+        ] == [reviews[0].id, reviews[1].id], (
+            'Проверьте, что без ?search= отзывы идут по дате публикации.'
+        )
+
+    def test_07_unchanged_text_not_reindexed(self, posts):
+        if connection.vendor != 'sqlite':
+            pytest.skip('Индекс FTS5 есть только в SQLite.')
+        review = Review.objects.get(id=posts[0][1].id)
+        with CaptureQueriesContext(connection) as context:
+            review.score = 10
+            review.save()
+        assert not any(
+            'reviews_review_fts' in query['sql']
+            for query in context.captured_queries
+        ), 'Проверьте, что отзыв с тем же текстом не переиндексируется.'
@@ -0,0 +1,149 @@
+import threading
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.autocomplete import TITLE_AUTOCOMPLETE, TitleAutocomplete
+from reviews.models import Review, Title, User
+
+URL = '/api/v1/titles/autocomplete/'
+
+
+@pytest.fixture
+def titles():
+    titles = {
+        name: Title.objects.create(name=name, year=2000, description='')
+        for name in (
+            'Крёстный отец', 'Крестоносцы', 'Кредо убийцы', 'Отцы и дети',
+        )
+    }
+    reader = User.objects.create(username='reader', email='r@yamdb.fake')
+    for name, score in (('Крестоносцы', 9), ('Кредо убийцы', 4)):
+        Review.objects.create(
+            title=titles[name], author=reader, text='Отзыв', score=score
+        )
+    # Индекс живёт в памяти процесса и переживает очистку БД между
+    # тестами: читаем его заново, как это сделал бы фоновый поток.
+    TITLE_AUTOCOMPLETE.load()
+    return titles
+
+
+def suggest(client, query, **params):
+    response = client.get(URL, {'q': query, **params})
+    assert response.status_code == HTTPStatus.OK
+    return [title['name'] for title in response.json()]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test18Autocomplete:
+
+    def test_01_prefix_ordered_by_rating(self, client, titles):
+        assert suggest(client, 'кре') == [
+            'Крестоносцы', 'Кредо убийцы', 'Крёстный отец'
+        ], (
+            f'Проверьте, что `{URL}?q=` возвращает произведения, название '
+            'которых начинается с запроса, по убыванию рейтинга.'
+        )
+        assert suggest(client, 'КРЁС') == ['Крестоносцы', 'Крёстный отец'], (
+            'Проверьте, что подсказки не различают регистр и `ё`/`е`.'
+        )
+        assert suggest(client, 'отец') == ['Крёстный отец'], (
+            'Проверьте, что подсказки ищут по началу любого слова названия.'
+        )
+        assert suggest(client, 'кре', limit=1) == ['Крестоносцы']
+        assert suggest(client, '') == []
+        response = client.get(URL, {'q': 'кре'})
+        assert response.json()[0] == {
+            'id': titles['Крестоносцы'].id,
+            'name': 'Крестоносцы',
+            'rating': 9,
+        }
+
+    def test_02_no_queries_after_load(self, client, titles):
+        suggest(client, 'кре')
+        with CaptureQueriesContext(connection) as context:
+            suggest(client, 'от')
+        assert context.captured_queries == [], (
+            'Проверьте, что подсказки берутся из индекса в памяти без '
+            'запросов к БД.'
+        )
+
+    def test_03_incremental_updates(self, client, titles):
+        suggest(client, 'кре')
+        title = titles['Отцы и дети']
+        title.name = 'Кремень'
+        title.save()
+        titles['Крестоносцы'].delete()
+        review = Review.objects.get(title=titles['Кредо убийцы'])
+        Review.objects.create(
+            title=titles['Крёстный отец'], author=review.author,
+            text='Отзыв', score=10,
+        )
+        with CaptureQueriesContext(connection) as context:
+            result = suggest(client, 'кре')
+        assert context.captured_queries == []
+        assert result == ['Крёстный отец', 'Кредо убийцы', 'Кремень'], (
+            'Проверьте, что индекс подсказок обновляется при изменении и '
+            'удалении произведений и при изменении рейтинга.'
+        )
+
+    def test_04_background_load(self, client, titles, monkeypatch):
+        index = TitleAutocomplete()
+        assert [name for _, name, _ in index.search('кре')] == [
+            'Крестоносцы', 'Кредо убийцы', 'Крёстный отец'
+        ], 'Проверьте, что первый запрос дожидается загрузки индекса.'
+
+        read = TITLE_AUTOCOMPLETE.read
+        release = threading.Event()
+
+        def slow_read():
+            release.wait(5)
+            return read()
+
+        monkeypatch.setattr(TITLE_AUTOCOMPLETE, 'read', slow_read)
+        Title.objects.filter(id=titles['Отцы и дети'].id).update(
+            name='Кремень'
+        )
+        TITLE_AUTOCOMPLETE.invalidate()
+        with CaptureQueriesContext(connection) as context:
+            assert suggest(client, 'кремень') == []
+        assert context.captured_queries == [], (
+            'Проверьте, что индекс перечитывается из БД в фоне, '
+            'а не в запросе.'
+        )
+        release.set()
+        TITLE_AUTOCOMPLETE.wait()
+        assert suggest(client, 'кремень') == ['Кремень']
+
+    def test_05_changes_during_reload(self, client, titles, monkeypatch):
+        read = TITLE_AUTOCOMPLETE.read
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_read():
+            snapshot = read()
+            started.set()
+            release.wait(5)
+            return snapshot
+
+        monkeypatch.setattr(TITLE_AUTOCOMPLETE, 'read', slow_read)
+        TITLE_AUTOCOMPLETE.invalidate()
+        suggest(client, 'кре')
+        assert started.wait(5)
+        Title.objects.create(name='Кремль', year=2000, description='')
+        titles['Крестоносцы'].delete()
+        Review.objects.create(
+            title=titles['Крёстный отец'],
+            author=User.objects.get(username='reader'),
+            text='Отзыв', score=10,
+        )
+        release.set()
+        TITLE_AUTOCOMPLETE.wait()
+        assert suggest(client, 'кре') == [
+            'Крёстный отец', 'Кредо убийцы', 'Кремль'
+        ], (
+            'Проверьте, что изменения, сделанные во время загрузки '
+            'индекса, не теряются после подмены.'
+        )
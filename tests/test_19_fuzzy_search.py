@@ -0,0 +1,92 @@
+from http import HTTPStatus
+
+import pytest
+
+from reviews.models import Title, TitleTrigram
+from reviews import search
+from reviews.search import get_trigrams, levenshtein
+
+
+def fuzzy(client, query):
+    response = client.get('/api/v1/titles/', {'fuzzy': query})
+    assert response.status_code == HTTPStatus.OK
+    return [title['name'] for title in response.json()['results']]
+
+
+@pytest.fixture
+def titles():
+    return [
+        Title.objects.create(name=name, year=2000, description='')
+        for name in (
+            'Побег из Шоушенка', 'Крёстный отец', 'Зелёная миля', 'Шоколад',
+        )
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test19FuzzySearch:
+
+    def test_01_helpers(self):
+        assert get_trigrams('Ёж') == {'  е', ' еж', 'еж '}
+        assert levenshtein('шоушенг', 'шоушенка', 3) == 2
+        assert levenshtein('отиц', 'отец', 3) == 1
+        assert levenshtein('абвгд', 'я', 2) == 3, (
+            'Проверьте, что при превышении порога возвращается '
+            'max_distance + 1.'
+        )
+
+    def test_02_typos(self, client, titles):
+        assert fuzzy(client, 'шоушенг') == ['Побег из Шоушенка'], (
+            'Проверьте, что `/api/v1/titles/?fuzzy=` находит произведения '
+            'по названию с опечаткой.'
+        )
+        assert fuzzy(client, 'крестный отиц') == ['Крёстный отец']
+        assert fuzzy(client, 'зилёная') == ['Зелёная миля']
+        assert fuzzy(client, 'шокалад') == ['Шоколад']
+        assert fuzzy(client, 'терминатор') == []
+
+    def test_03_ordered_by_distance(self, client, titles):
+        Title.objects.create(name='Шоколадница', year=2000, description='')
+        assert fuzzy(client, 'шоколадниц') == ['Шоколадница', 'Шоколад'], (
+            'Проверьте, что результаты нечёткого поиска упорядочены по '
+            'расстоянию редактирования.'
+        )
+
+    def test_04_trigrams_follow_changes(self, client, titles):
+        title = Title.objects.get(id=titles[2].id)
+        trigram_ids = set(TitleTrigram.objects.filter(
+            title=title
+        ).values_list('id', flat=True))
+        title.description = 'Новое описание'
+        title.save()
+        assert set(TitleTrigram.objects.filter(
+            title=title
+        ).values_list('id', flat=True)) == trigram_ids, (
+            'Проверьте, что триграммы не перестраиваются, если название '
+            'не менялось.'
+        )
+
+        title.name = 'Форрест Гамп'
+        title.save()
+        assert fuzzy(client, 'зеленая миля') == []
+        assert fuzzy(client, 'форест гамп') == ['Форрест Гамп']
+
+        title.delete()
+        assert not TitleTrigram.objects.filter(title_id=title.id).exists()
+
+    def test_05_postings_limited(self, client, titles, monkeypatch):
+        Title.objects.bulk_create(
+            Title(name=f'Шоколад {number}', year=2000, description='')
+            for number in range(5)
+        )
+        search.TITLE_TRIGRAM_INDEX.rebuild()
+        monkeypatch.setattr(search, 'FUZZY_MAX_POSTINGS', 3)
+        assert len(search.TITLE_TRIGRAM_INDEX.get_candidates(['  ш'])) == 3, (
+            'Проверьте, что из индекса читается не больше '
+            '`FUZZY_MAX_POSTINGS` строк на триграмму.'
+        )
+        assert fuzzy(client, 'зилёная миля') == ['Зелёная миля']
+        # Все триграммы «шоколад» частые: кандидаты — первые три строки.
+        assert fuzzy(client, 'шокалат') == [
+            'Шоколад', 'Шоколад 0', 'Шоколад 1'
+        ]
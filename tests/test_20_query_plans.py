@@ -0,0 +1,68 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from reviews.management.commands.explain_queries import (get_full_scans,
+                                                         get_sorts)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test20QueryPlans:
+
+    def test_01_full_scan_detection(self):
+        plan = '2 0 0 SCAN reviews_title\n5 0 0 SEARCH reviews_category'
+        assert get_full_scans(plan, 'sqlite') == ['reviews_title']
+        assert get_full_scans(plan, 'sqlite', 'reviews_title') == [], (
+            'Проверьте, что полный просмотр таблицы модели допустим для '
+            'списка без фильтров.'
+        )
+        sorted_plan = plan + '\n9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        assert get_full_scans(sorted_plan, 'sqlite', 'reviews_title') == [
+            'reviews_title'
+        ]
+        assert get_full_scans(
+            '2 0 0 SCAN reviews_review USING INDEX review_pub_date_idx',
+            'sqlite',
+        ) == []
+        assert get_full_scans(
+            'Seq Scan on reviews_title  (cost=0.00..1.01 rows=1 width=4)',
+            'postgresql',
+        ) == ['reviews_title']
+        assert get_sorts(
+            '2 0 0 SCAN reviews_title USING INDEX title_rating_idx\n'
+            '9 0 0 USE TEMP B-TREE FOR RIGHT PART OF ORDER BY',
+            'sqlite',
+        ) == ['9 0 0 USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'], (
+            'Проверьте, что сортировка без индекса находится в плане.'
+        )
+
+    @pytest.mark.skipif(
+        connection.vendor != 'sqlite',
+        reason='Планы PostgreSQL зависят от статистики таблиц.'
+    )
+    def test_02_no_full_scans(self):
+        out = StringIO()
+        try:
+            call_command('explain_queries', '--fail', stdout=out)
+        except CommandError:
+            pytest.fail(
+                'Проверьте, что запросы маршрутов API не читают таблицы '
+                'целиком, а списки без фильтров не сортируются без '
+                f'индекса:\n{out.getvalue()}'
+            )
+        output = out.getvalue()
+        for index in (
+            'title_year_name_idx',
+            'title_name_idx',
+            'title_rating_idx',
+            'title_category_year_idx',
+            'title_genre_genre_title_idx',
+            'review_title_pub_date_idx',
+            'comment_review_pub_date_idx',
+            'review_pub_date_idx',
+        ):
+            assert index in output, (
+                f'Проверьте, что запросы API используют индекс `{index}`.'
+            )
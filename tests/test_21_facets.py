@@ -0,0 +1,232 @@
+import threading
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.facets import TITLE_FACETS, TitleFacets, make_bitset, popcount
+from reviews.models import Category, Genre, Title
+
+URL = '/api/v1/titles/facets/'
+
+
+@pytest.fixture
+def catalogue():
+    genres = {
+        slug: Genre.objects.create(name=slug, slug=slug)
+        for slug in ('drama', 'comedy', 'horror')
+    }
+    categories = {
+        slug: Category.objects.create(name=slug, slug=slug)
+        for slug in ('film', 'book')
+    }
+    titles = {}
+    for name, year, category, genre_slugs in (
+        ('Первый', 1985, 'film', ('drama',)),
+        ('Второй', 1992, 'film', ('drama', 'comedy')),
+        ('Третий', 1999, 'book', ('comedy',)),
+        ('Четвёртый', 2005, 'book', ('horror', 'drama')),
+        ('Пятый', 2010, None, ()),
+    ):
+        title = Title.objects.create(
+            name=name, year=year, description='',
+            category=categories.get(category),
+        )
+        title.genre.set(genres[slug] for slug in genre_slugs)
+        titles[name] = title
+    # Индекс живёт в памяти процесса и переживает очистку БД между
+    # тестами: читаем его заново, как это сделал бы фоновый поток.
+    TITLE_FACETS.load()
+    return titles
+
+
+def facets(client, **params):
+    response = client.get(URL, params)
+    assert response.status_code == HTTPStatus.OK
+    return response.json()
+
+
+def list_names(client, **params):
+    response = client.get('/api/v1/titles/', params)
+    assert response.status_code == HTTPStatus.OK
+    return sorted(title['name'] for title in response.json()['results'])
+
+
+@pytest.mark.django_db(transaction=True)
+class Test21Facets:
+
+    def test_01_bitsets(self):
+        bits = make_bitset([1, 5, 64, 1000])
+        assert bits == (1 << 1) | (1 << 5) | (1 << 64) | (1 << 1000)
+        assert popcount(bits) == 4
+        assert make_bitset([]) == 0
+
+    def test_02_counts(self, client, catalogue):
+        assert facets(client) == {
+            'count': 5,
+            'facets': {
+                'genre': {'drama': 3, 'comedy': 2, 'horror': 1},
+                'category': {'film': 2, 'book': 2},
+                'year': {'1980': 1, '1990': 2, '2000': 1, '2010': 1},
+            },
+        }, (
+            f'Проверьте, что `{URL}` возвращает число произведений '
+            'и счётчики по жанрам, категориям и десятилетиям.'
+        )
+
+    def test_03_filters(self, client, catalogue):
+        result = facets(client, genre='comedy,horror')
+        assert result['count'] == 3
+        assert result['facets']['genre'] == {
+            'drama': 3, 'comedy': 2, 'horror': 1
+        }, (
+            'Проверьте, что счётчики фасета считаются без его '
+            'собственного фильтра.'
+        )
+        assert result['facets']['category'] == {'film': 1, 'book': 2}
+
+        result = facets(client, genre='drama,comedy', genre_mode='all')
+        assert result['count'] == 1
+        assert result['facets']['genre'] == {'drama': 1, 'comedy': 1}
+
+        result = facets(client, category='book', year_min=2000)
+        assert result['count'] == 1
+        assert result['facets']['category'] == {'book': 1}
+        assert result['facets']['year'] == {'1990': 1, '2000': 1}
+
+        result = facets(client, genre='unknown')
+        assert result['count'] == 0
+        assert result['facets']['genre'] == {
+            'drama': 3, 'comedy': 2, 'horror': 1
+        }
+
+        response = client.get(URL, {'year_min': 'abc'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_04_list_matches_facets(self, client, catalogue):
+        assert list_names(client, genre='drama,comedy') == sorted(
+            ['Первый', 'Второй', 'Третий', 'Четвёртый']
+        ), (
+            'Проверьте, что `/api/v1/titles/?genre=a,b` возвращает '
+            'произведения любого из жанров без повторов.'
+        )
+        assert list_names(
+            client, genre='drama,comedy', genre_mode='all'
+        ) == ['Второй']
+        assert list_names(
+            client, category='film,book', year_min=1990, year_max=2004
+        ) == sorted(['Второй', 'Третий'])
+        for params in (
+            {'genre': 'drama,horror'},
+            {'genre': 'drama,horror', 'genre_mode': 'all'},
+            {'category': 'book', 'year_max': 2000},
+        ):
+            response = client.get('/api/v1/titles/', params)
+            assert response.json()['count'] == facets(
+                client, **params
+            )['count']
+
+    def test_05_incremental_updates(self, client, admin_client, catalogue):
+        facets(client)
+        with CaptureQueriesContext(connection) as queries:
+            facets(client, genre='drama')
+        assert len(queries) == 0, (
+            'Проверьте, что фасеты считаются по индексу в памяти.'
+        )
+
+        response = admin_client.post('/api/v1/titles/', {
+            'name': 'Шестой', 'year': 2011, 'description': 'Новинка',
+            'category': 'film', 'genre': ['horror', 'comedy'],
+        })
+        assert response.status_code == HTTPStatus.CREATED
+        title_id = response.json()['id']
+        result = facets(client)
+        assert result['count'] == 6
+        assert result['facets']['genre']['horror'] == 2
+        assert result['facets']['year']['2010'] == 2
+
+        response = admin_client.patch(
+            f'/api/v1/titles/{title_id}/',
+            {'genre': ['drama'], 'year': 1980},
+            format='json',
+        )
+        assert response.status_code == HTTPStatus.OK
+        result = facets(client)
+        assert result['facets']['genre'] == {
+            'drama': 4, 'comedy': 2, 'horror': 1
+        }, 'Проверьте, что индекс обновляется при смене жанров.'
+        assert result['facets']['year']['1980'] == 2
+
+        catalogue['Четвёртый'].delete()
+        result = facets(client, genre='horror')
+        assert result['count'] == 0
+        assert result['facets']['category'] == {}
+
+        Category.objects.get(slug='book').delete()
+        facets(client)
+        # Удаление категории перечитывает индекс в фоне.
+        TITLE_FACETS.wait()
+        result = facets(client)
+        assert result['facets']['category'] == {'film': 3}, (
+            'Проверьте, что индекс перечитывается при удалении категории.'
+        )
+
+    def test_06_background_load(self, client, catalogue, monkeypatch):
+        index = TitleFacets()
+        assert index.search()['count'] == 5, (
+            'Проверьте, что первый запрос дожидается загрузки индекса.'
+        )
+
+        read = TITLE_FACETS.read
+        release = threading.Event()
+
+        def slow_read():
+            release.wait(5)
+            return read()
+
+        monkeypatch.setattr(TITLE_FACETS, 'read', slow_read)
+        Title.objects.filter(id=catalogue['Пятый'].id).update(year=1950)
+        TITLE_FACETS.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            assert '1950' not in facets(client)['facets']['year']
+        assert len(queries) == 0, (
+            'Проверьте, что индекс перечитывается из БД в фоне, '
+            'а не в запросе.'
+        )
+        release.set()
+        TITLE_FACETS.wait()
+        assert facets(client)['facets']['year']['1950'] == 1
+
+    def test_07_changes_during_reload(self, client, catalogue, monkeypatch):
+        read = TITLE_FACETS.read
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_read():
+            snapshot = read()
+            started.set()
+            release.wait(5)
+            return snapshot
+
+        monkeypatch.setattr(TITLE_FACETS, 'read', slow_read)
+        TITLE_FACETS.invalidate()
+        facets(client)
+        assert started.wait(5)
+        title = Title.objects.create(name='Шестой', year=1950, description='')
+        title.genre.set([Genre.objects.get(slug='horror')])
+        catalogue['Первый'].genre.clear()
+        catalogue['Пятый'].delete()
+        release.set()
+        TITLE_FACETS.wait()
+        result = facets(client)
+        assert result['count'] == 5
+        assert result['facets']['genre'] == {
+            'drama': 2, 'comedy': 2, 'horror': 2
+        }, (
+            'Проверьте, что изменения, сделанные во время загрузки '
+            'индекса, не теряются после подмены.'
+        )
+        assert result['facets']['year'] == {
+            '1950': 1, '1980': 1, '1990': 2, '2000': 1
+        }
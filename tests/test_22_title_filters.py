@@ -0,0 +1,151 @@
+import random
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.filters import TitleFilter
+from reviews.models import Genre, Title
+from reviews.ratings import get_average
+
+CATALOGUE_SIZE = 3000
+GENRES = ('drama', 'comedy', 'horror', 'action', 'fantasy', 'documentary')
+
+
+@pytest.fixture
+def catalogue():
+    '''
+    Синтетический каталог: у каждого произведения 0–3 жанра, год
+    и агрегаты оценок. Возвращает ожидаемые свойства по id.
+    '''
+    rng = random.Random(17)
+    Genre.objects.bulk_create(
+        Genre(name=slug, slug=slug) for slug in GENRES
+    )
+    genre_ids = dict(Genre.objects.values_list('slug', 'id'))
+    titles = []
+    for idx in range(CATALOGUE_SIZE):
+        count = rng.choice((0, 1, 3, 10))
+        score_sum = rng.randint(count, count * 10)
+        titles.append(Title(
+            name=f'Произведение {idx}',
+            year=rng.randint(1950, 2020),
+            description='',
+            rating_count=count,
+            rating_sum=score_sum,
+            rating=get_average(score_sum, count),
+        ))
+    Title.objects.bulk_create(titles)
+    titles = {}
+    links = []
+    for title_id, year, rating_sum, rating_count in (
+        Title.objects.values_list('id', 'year', 'rating_sum', 'rating_count')
+    ):
+        genres = set(rng.sample(GENRES, rng.randint(0, 3)))
+        titles[title_id] = {
+            'year': year,
+            'genres': genres,
+            'rating': rating_sum // rating_count if rating_count else None,
+        }
+        links.extend(
+            Title.genre.through(title_id=title_id, genre_id=genre_ids[slug])
+            for slug in genres
+        )
+    Title.genre.through.objects.bulk_create(links)
+    return titles
+
+
+def filtered_ids(**params):
+    queryset = TitleFilter(params, queryset=Title.objects.all()).qs
+    with CaptureQueriesContext(connection) as context:
+        ids = list(queryset.values_list('id', flat=True))
+    assert len(context.captured_queries) == 1
+    assert 'DISTINCT' not in context.captured_queries[0]['sql'], (
+        'Проверьте, что фильтры по жанрам не используют DISTINCT.'
+    )
+    assert len(ids) == len(set(ids)), (
+        'Проверьте, что фильтры по жанрам не размножают произведения.'
+    )
+    return set(ids)
+
+
+def expected_ids(titles, check):
+    return {title_id for title_id, title in titles.items() if check(title)}
+
+
+@pytest.mark.django_db(transaction=True)
+class Test22TitleFilters:
+
+    def test_01_genre_any_and_all(self, catalogue):
+        wanted = {'drama', 'comedy'}
+        assert filtered_ids(genre__any='drama,comedy') == expected_ids(
+            catalogue, lambda title: title['genres'] & wanted
+        ), (
+            'Проверьте, что `genre__any` возвращает произведения хотя бы '
+            'одного из жанров.'
+        )
+        assert filtered_ids(genre__all='drama,comedy') == expected_ids(
+            catalogue, lambda title: wanted <= title['genres']
+        ), 'Проверьте, что `genre__all` возвращает произведения всех жанров.'
+        wanted = {'drama', 'comedy', 'horror'}
+        assert filtered_ids(genre__all='drama,comedy,horror,drama') == (
+            expected_ids(catalogue, lambda title: wanted <= title['genres'])
+        )
+        assert filtered_ids(genre__all='drama,unknown') == set()
+        assert filtered_ids(genre='drama,comedy', genre_mode='all') == (
+            filtered_ids(genre__all='drama,comedy')
+        )
+
+    def test_02_ranges(self, catalogue):
+        assert filtered_ids(year_min=1990, year_max=1999) == expected_ids(
+            catalogue, lambda title: 1990 <= title['year'] <= 1999
+        )
+        assert filtered_ids(rating_min=7) == expected_ids(
+            catalogue,
+            lambda title: title['rating'] is not None and title['rating'] >= 7
+        ), 'Проверьте фильтр `rating_min`.'
+        assert filtered_ids(rating_min=4, rating_max=6) == expected_ids(
+            catalogue,
+            lambda title: (
+                title['rating'] is not None and 4 <= title['rating'] <= 6
+            )
+        ), 'Проверьте фильтр `rating_max`.'
+        assert filtered_ids(
+            genre__all='action,fantasy', year_min=2000, rating_max=5
+        ) == expected_ids(
+            catalogue,
+            lambda title: (
+                {'action', 'fantasy'} <= title['genres']
+                and title['year'] >= 2000
+                and title['rating'] is not None
+                and title['rating'] <= 5
+            )
+        )
+
+    def test_03_api(self, client, catalogue):
+        params = {
+            'genre__any': 'horror,documentary',
+            'year_min': 1970,
+            'page_size': 100,
+        }
+        expected = expected_ids(
+            catalogue,
+            lambda title: (
+                title['genres'] & {'horror', 'documentary'}
+                and title['year'] >= 1970
+            )
+        )
+        ids = []
+        url = '/api/v1/titles/'
+        while url:
+            response = client.get(url, params)
+            assert response.status_code == HTTPStatus.OK
+            data = response.json()
+            assert data['count'] == len(expected)
+            ids.extend(title['id'] for title in data['results'])
+            url, params = data['next'], None
+        assert len(ids) == len(expected) and set(ids) == expected, (
+            'Проверьте, что постраничный вывод с фильтром по жанрам '
+            'возвращает каждое произведение ровно один раз.'
+        )
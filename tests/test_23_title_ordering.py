@@ -0,0 +1,117 @@
+from http import HTTPStatus
+
+import pytest
+
+from reviews.models import Review, Title, User
+from reviews.ratings import recalculate_ratings
+
+URL = '/api/v1/titles/'
+
+
+@pytest.fixture
+def rated_titles():
+    readers = [
+        User.objects.create(username=f'reader{idx}', email=f'r{idx}@ya.fake')
+        for idx in range(3)
+    ]
+    titles = {}
+    for name, year, scores in (
+        ('Альфа', 2001, (9, 8)),
+        ('Бета', 1999, (9, 8, 8)),
+        ('Гамма', 2001, ()),
+        ('Дельта', 1980, (3,)),
+        ('Эпсилон', 2010, (8,)),
+        ('Дзета', 2005, (8, 8)),
+    ):
+        title = Title.objects.create(name=name, year=year, description='')
+        for reader, score in zip(readers, scores):
+            Review.objects.create(
+                title=title, author=reader, text='Отзыв', score=score
+            )
+        titles[name] = title
+    return titles
+
+
+def ordered_names(client, ordering):
+    response = client.get(URL, {'ordering': ordering})
+    assert response.status_code == HTTPStatus.OK
+    return [title['name'] for title in response.json()['results']]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test23TitleOrdering:
+
+    def test_01_stored_rating(self, client, rated_titles):
+        ratings = dict(Title.objects.values_list('name', 'rating'))
+        assert ratings == {
+            'Альфа': 8.5, 'Бета': 25 / 3, 'Гамма': None, 'Дельта': 3,
+            'Эпсилон': 8, 'Дзета': 8,
+        }, 'Проверьте, что в произведении хранится средняя оценка.'
+        response = client.get(f'{URL}{rated_titles["Альфа"].id}/')
+        assert response.json()['rating'] == 8, (
+            'Проверьте, что API выводит целую часть средней оценки.'
+        )
+
+        review = Review.objects.get(title=rated_titles['Дельта'])
+        review.score = 10
+        review.save()
+        assert Title.objects.get(name='Дельта').rating == 10
+        review.delete()
+        title = Title.objects.get(name='Дельта')
+        assert (title.rating, title.rating_count) == (None, 0), (
+            'Проверьте, что рейтинг сбрасывается после удаления '
+            'последнего отзыва.'
+        )
+
+        Title.objects.filter(name='Альфа').update(rating=1)
+        drift = recalculate_ratings()
+        assert [title_id for title_id, *_ in drift] == [
+            rated_titles['Альфа'].id
+        ]
+        assert Title.objects.get(name='Альфа').rating == 8.5
+
+    def test_02_ordering(self, client, rated_titles):
+        assert ordered_names(client, '-rating,-review_count') == [
+            'Альфа', 'Бета', 'Дзета', 'Эпсилон', 'Дельта', 'Гамма'
+        ], (
+            'Проверьте, что `?ordering=-rating,-review_count` сортирует '
+            'по средней оценке и числу отзывов, произведения без отзывов '
+            '— в конце.'
+        )
+        assert ordered_names(client, 'rating') == [
+            'Дельта', 'Эпсилон', 'Дзета', 'Бета', 'Альфа', 'Гамма'
+        ]
+        assert ordered_names(client, '-rating') == [
+            'Альфа', 'Бета', 'Дзета', 'Эпсилон', 'Дельта', 'Гамма'
+        ], (
+            'Проверьте, что при равном рейтинге порядок задаёт число '
+            'отзывов в том же направлении, как в индексе.'
+        )
+        assert ordered_names(client, 'year') == [
+            'Дельта', 'Бета', 'Альфа', 'Гамма', 'Дзета', 'Эпсилон'
+        ], 'Проверьте, что при равном годе порядок задаёт название.'
+        assert ordered_names(client, 'year,name') == [
+            'Дельта', 'Бета', 'Альфа', 'Гамма', 'Дзета', 'Эпсилон'
+        ]
+        assert ordered_names(client, '-year,-name') == [
+            'Эпсилон', 'Дзета', 'Гамма', 'Альфа', 'Бета', 'Дельта'
+        ]
+        assert client.get(URL, {'ordering': 'description'}).status_code == (
+            HTTPStatus.BAD_REQUEST
+        )
+
+    def test_03_stable_pages(self, client, rated_titles):
+        names = []
+        url, params = URL, {'ordering': '-rating', 'page_size': 2}
+        while url:
+            data = client.get(url, params).json()
+            names.extend(title['name'] for title in data['results'])
+            url, params = data['next'], None
+        assert names == ordered_names(client, '-rating'), (
+            'Проверьте, что постраничный вывод с сортировкой стабилен.'
+        )
+        assert [
+            title['id'] for title in client.get(URL).json()['results']
+        ] == sorted(title.id for title in rated_titles.values()), (
+            'Проверьте, что по умолчанию произведения упорядочены по id.'
+        )
@@ -0,0 +1,185 @@
+from http import HTTPStatus
+
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+
+from reviews import leaderboards
+from reviews.models import Category, Genre, Review, Title, TitleRanking, User
+
+URL = '/api/v1/leaderboards/'
+
+
+@pytest.fixture
+def readers():
+    return [
+        User.objects.create(username=f'reader{idx}', email=f'r{idx}@ya.fake')
+        for idx in range(6)
+    ]
+
+
+@pytest.fixture
+def catalogue(readers):
+    '''
+    «Шедевр» с одним отзывом на 10, «Классика» с шестью отзывами на 9,
+    «Середняк» с оценками 6 и «Новинка» без отзывов.
+    '''
+    film = Category.objects.create(name='Фильм', slug='film')
+    book = Category.objects.create(name='Книга', slug='book')
+    drama = Genre.objects.create(name='Драма', slug='drama')
+    comedy = Genre.objects.create(name='Комедия', slug='comedy')
+    titles = {}
+    for name, year, category, genres, scores in (
+        ('Шедевр', 1994, film, [drama], (10,)),
+        ('Классика', 1994, film, [drama, comedy], (9,) * 6),
+        ('Середняк', 2001, book, [comedy], (6, 6)),
+        ('Новинка', 2001, book, [drama], ()),
+    ):
+        title = Title.objects.create(
+            name=name, year=year, category=category, description=''
+        )
+        title.genre.set(genres)
+        for reader, score in zip(readers, scores):
+            Review.objects.create(
+                title=title, author=reader, text='Отзыв', score=score
+            )
+        titles[name] = title
+    return titles
+
+
+def board_names(client, url, **params):
+    response = client.get(url, params)
+    assert response.status_code == HTTPStatus.OK, (
+        f'Проверьте, что GET-запрос к `{url}` возвращает статус 200.'
+    )
+    return [entry['name'] for entry in response.json()]
+
+
+def assert_consistent():
+    '''Строки топов совпадают с тем, что построит полная пересборка.'''
+    mean = leaderboards.get_mean()
+    prior = settings.LEADERBOARD_PRIOR_REVIEWS
+    rows = {}
+    for row in TitleRanking.objects.all():
+        assert row.score == pytest.approx(leaderboards.weighted_rating(
+            row.rating_sum, row.rating_count, mean, prior
+        ))
+        rows[(row.board, row.key, row.title_id)] = (
+            row.rating_sum, row.rating_count
+        )
+    leaderboards.rebuild()
+    assert rows == {
+        (row.board, row.key, row.title_id): (row.rating_sum, row.rating_count)
+        for row in TitleRanking.objects.all()
+    }, 'Проверьте, что топы обновляются вместе с произведениями и отзывами.'
+
+
+@pytest.mark.django_db(transaction=True)
+class Test24Leaderboards:
+
+    def test_01_bayesian_order(self, client, catalogue):
+        response = client.get(URL)
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert [entry['name'] for entry in data] == [
+            'Классика', 'Шедевр', 'Середняк'
+        ], (
+            'Проверьте, что топ упорядочен по байесовскому рейтингу, '
+            'а произведения без отзывов в него не попадают.'
+        )
+        first = data[0]
+        assert first['rank'] == 1
+        assert first['id'] == catalogue['Классика'].id
+        assert (first['rating'], first['review_count']) == (9, 6)
+        prior = settings.LEADERBOARD_PRIOR_REVIEWS
+        assert first['weighted_rating'] == round(
+            (54 + prior * leaderboards.get_mean()) / (6 + prior), 2
+        )
+        assert board_names(client, URL, limit=1) == ['Классика'], (
+            'Проверьте параметр `limit`.'
+        )
+
+    def test_02_boards(self, client, catalogue):
+        assert board_names(client, URL + 'genre/drama/') == [
+            'Классика', 'Шедевр'
+        ]
+        assert board_names(client, URL + 'genre/comedy/') == [
+            'Классика', 'Середняк'
+        ]
+        assert board_names(client, URL + 'category/book/') == ['Середняк']
+        assert board_names(client, URL + 'year/1994/') == [
+            'Классика', 'Шедевр'
+        ]
+        assert board_names(client, URL + 'year/1800/') == []
+        for url in ('genre/unknown/', 'category/unknown/', 'studio/x/'):
+            assert client.get(URL + url).status_code == (
+                HTTPStatus.NOT_FOUND
+            ), f'Проверьте, что `{URL}{url}` возвращает статус 404.'
+
+    def test_03_incremental_updates(self, admin_client, client, catalogue,
+                                    readers):
+        title = catalogue['Шедевр']
+        for reader in readers[1:]:
+            Review.objects.create(
+                title=title, author=reader, text='Отзыв', score=10
+            )
+        assert board_names(client, URL)[0] == 'Шедевр', (
+            'Проверьте, что новые отзывы сразу меняют место в топе.'
+        )
+        review = Review.objects.filter(title=title).first()
+        review.score = 9
+        review.save()
+        Review.objects.filter(title=catalogue['Середняк']).delete()
+        assert board_names(client, URL) == ['Шедевр', 'Классика']
+        assert_consistent()
+
+        response = admin_client.patch(
+            f'/api/v1/titles/{title.id}/',
+            {'category': 'book', 'year': 2001, 'genre': ['comedy']},
+            format='json',
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert board_names(client, URL + 'category/book/') == ['Шедевр']
+        assert board_names(client, URL + 'year/2001/') == ['Шедевр']
+        assert board_names(client, URL + 'genre/drama/') == ['Классика']
+        assert board_names(client, URL + 'genre/comedy/') == [
+            'Шедевр', 'Классика'
+        ]
+        Genre.objects.get(slug='drama').titles.clear()
+        Category.objects.get(slug='film').delete()
+        assert not TitleRanking.objects.filter(
+            board=TitleRanking.GENRE,
+            key=Genre.objects.get(slug='drama').pk,
+        ).exists()
+        assert_consistent()
+
+    def test_04_rebuild_command(self, client, catalogue, capsys):
+        TitleRanking.objects.all().delete()
+        assert board_names(client, URL) == []
+        call_command('rebuild_leaderboards', batch_size=2)
+        # 4 произведения: общий топ, год, категория и жанры (5 связей).
+        assert 'Строк в топах: 17' in capsys.readouterr().out
+        assert board_names(client, URL) == [
+            'Классика', 'Шедевр', 'Середняк'
+        ], 'Проверьте, что `rebuild_leaderboards` пересобирает топы.'
+
+    def test_05_stored_mean(self, catalogue, readers):
+        assert leaderboards.get_mean() == leaderboards.DEFAULT_MEAN
+        call_command('rebuild_leaderboards')
+        # (10 + 9 * 6 + 6 * 2) / 9 отзывов.
+        mean = 76 / 9
+        assert leaderboards.get_mean() == pytest.approx(mean), (
+            'Проверьте, что пересборка сохраняет среднюю по каталогу.'
+        )
+        for cache in caches.all():
+            cache.clear()
+        Review.objects.create(
+            title=catalogue['Новинка'], author=readers[0],
+            text='Отзыв', score=1,
+        )
+        assert leaderboards.get_mean() == pytest.approx(mean), (
+            'Проверьте, что средняя не меняется между пересборками '
+            'и не зависит от кеша.'
+        )
+        assert_consistent()
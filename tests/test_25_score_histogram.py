@@ -0,0 +1,96 @@
+import random
+from collections import Counter
+from http import HTTPStatus
+
+import pytest
+
+from reviews.models import Review, Title, User
+from reviews.ratings import count_scores, recalculate_ratings
+
+
+@pytest.fixture
+def readers():
+    return [
+        User.objects.create(username=f'reader{idx}', email=f'r{idx}@ya.fake')
+        for idx in range(4)
+    ]
+
+
+def get_histogram(client, title):
+    response = client.get(
+        f'/api/v1/titles/{title.id}/', {'include': 'histogram'}
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert 'histogram' in response.json(), (
+        'Проверьте, что `?include=histogram` добавляет гистограмму оценок.'
+    )
+    return {
+        int(score): count
+        for score, count in response.json()['histogram'].items() if count
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class Test25ScoreHistogram:
+
+    def test_01_histogram_follows_reviews(self, client, readers):
+        title = Title.objects.create(name='Фильм', year=2000, description='')
+        response = client.get(f'/api/v1/titles/{title.id}/')
+        assert 'histogram' not in response.json(), (
+            'Проверьте, что без `?include=histogram` гистограмма '
+            'не выводится.'
+        )
+        assert len(client.get(
+            f'/api/v1/titles/{title.id}/', {'include': 'histogram'}
+        ).json()['histogram']) == 10
+        reviews = [
+            Review.objects.create(
+                title=title, author=reader, text='Отзыв', score=score
+            )
+            for reader, score in zip(readers, (8, 8, 3, 10))
+        ]
+        assert get_histogram(client, title) == {3: 1, 8: 2, 10: 1}, (
+            'Проверьте, что новые отзывы учитываются в гистограмме.'
+        )
+        reviews[0].score = 3
+        reviews[0].save()
+        assert get_histogram(client, title) == {3: 2, 8: 1, 10: 1}, (
+            'Проверьте, что изменение оценки переносит её в другой столбец.'
+        )
+        reviews[3].delete()
+        assert get_histogram(client, title) == {3: 2, 8: 1}, (
+            'Проверьте, что удалённые отзывы убираются из гистограммы.'
+        )
+        response = client.get('/api/v1/titles/', {'include': 'histogram'})
+        assert response.json()['results'][0]['histogram']['3'] == 2
+
+    def test_02_recalculate_histograms(self, client, readers):
+        title = Title.objects.create(name='Книга', year=2000, description='')
+        for reader, score in zip(readers, (1, 5, 5)):
+            Review.objects.create(
+                title=title, author=reader, text='Отзыв', score=score
+            )
+        Title.objects.filter(id=title.id).update(histogram_5=0, histogram_9=4)
+        drift = recalculate_ratings()
+        assert [title_id for title_id, *_ in drift] == [title.id], (
+            'Проверьте, что `recalculate_ratings` находит расхождения '
+            'в гистограмме.'
+        )
+        assert get_histogram(client, title) == {1: 1, 5: 2}
+        assert recalculate_ratings() == []
+
+    def test_03_count_scores(self):
+        rng = random.Random(20)
+        title_ids = sorted(rng.sample(range(1, 10000), 300))
+        pairs = [
+            (rng.choice(title_ids), rng.randint(1, 10)) for _ in range(5000)
+        ]
+        histograms = count_scores(title_ids, pairs)
+        expected = Counter(pairs)
+        assert histograms.shape == (300, 10)
+        assert all(
+            histograms[row][score - 1] == expected[(title_id, score)]
+            for row, title_id in enumerate(title_ids)
+            for score in range(1, 11)
+        )
+        assert count_scores([], []).shape == (0, 10)
@@ -0,0 +1,149 @@
+from http import HTTPStatus
+from io import StringIO
+
+import numpy as np
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews import recommendations
+from reviews.models import Review, SimilarTitle, Title, User
+
+# Оценки читателей: у «Дюны» и «Основания» одни и те же поклонники,
+# «Ромашка» нравится тем, кому они не нравятся.
+SCORES = {
+    'Дюна': (10, 9, 9, 2),
+    'Основание': (9, 10, 8, 3),
+    'Солярис': (8, 7, None, 4),
+    'Ромашка': (2, 3, 2, 10),
+    'Новинка': (None, None, None, 8),
+}
+
+
+@pytest.fixture
+def titles():
+    readers = [
+        User.objects.create(username=f'reader{idx}', email=f'r{idx}@ya.fake')
+        for idx in range(4)
+    ]
+    titles = {}
+    for name, scores in SCORES.items():
+        title = Title.objects.create(name=name, year=2000, description='')
+        for reader, score in zip(readers, scores):
+            if score is not None:
+                Review.objects.create(
+                    title=title, author=reader, text='Отзыв', score=score
+                )
+        titles[name] = title
+    return titles
+
+
+def similar_names(client, title, **params):
+    response = client.get(f'/api/v1/titles/{title.id}/similar/', params)
+    assert response.status_code == HTTPStatus.OK, (
+        'Проверьте, что `/api/v1/titles/{id}/similar/` возвращает статус 200.'
+    )
+    return [entry['name'] for entry in response.json()]
+
+
+def brute_force(title_ids, matrix, rated, min_common):
+    '''Сходство всех пар по плотным матрицам — для сверки.'''
+    dense = matrix.toarray()
+    common = rated.toarray() @ rated.toarray().T
+    similarity = dense @ dense.T
+    similarity[common < min_common] = 0
+    np.fill_diagonal(similarity, 0)
+    return similarity
+
+
+@pytest.mark.django_db(transaction=True)
+class Test26Recommendations:
+
+    def test_01_similar_endpoint(self, client, titles):
+        assert similar_names(client, titles['Дюна']) == [], (
+            'Проверьте, что до расчёта список похожих пуст.'
+        )
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        assert 'Похожих пар' in out.getvalue()
+        names = similar_names(client, titles['Дюна'])
+        assert names[:2] == ['Основание', 'Солярис'], (
+            'Проверьте, что похожие произведения упорядочены по сходству '
+            'оценок пользователей.'
+        )
+        assert 'Ромашка' not in names, (
+            'Проверьте, что произведения с противоположными оценками '
+            'не попадают в похожие.'
+        )
+        assert 'Новинка' not in names, (
+            'Проверьте, что учитываются только произведения, оценённые '
+            'хотя бы MIN_COMMON общими пользователями.'
+        )
+        assert similar_names(client, titles['Дюна'], limit=1) == [
+            'Основание'
+        ]
+        entry = client.get(
+            f'/api/v1/titles/{titles["Дюна"].id}/similar/'
+        ).json()[0]
+        assert set(entry) == {'id', 'name', 'year', 'rating', 'similarity'}
+        assert 0 < entry['similarity'] <= 1
+        with CaptureQueriesContext(connection) as context:
+            similar_names(client, titles['Основание'])
+        assert len(context.captured_queries) == 1, (
+            'Проверьте, что похожие произведения читаются одним запросом.'
+        )
+        assert client.get('/api/v1/titles/0/similar/').status_code == (
+            HTTPStatus.NOT_FOUND
+        )
+
+    def test_02_chunks_match_brute_force(self, titles):
+        title_ids, matrix, rated = recommendations.load_scores()
+        expected = brute_force(title_ids, matrix, rated, 2)
+        for chunk_size in (1, 2, 100):
+            neighbours = dict(recommendations.iter_neighbours(
+                title_ids, matrix, rated, neighbours=3,
+                chunk_size=chunk_size, min_common=2,
+            ))
+            for row, title_id in enumerate(title_ids):
+                wanted = sorted(
+                    (
+                        (-value, int(title_ids[column]))
+                        for column, value in enumerate(expected[row])
+                        if value > 0
+                    )
+                )[:3]
+                assert [
+                    (similar_id, pytest.approx(value, abs=1e-5))
+                    for similar_id, value in neighbours[title_id]
+                ] == [(similar_id, -value) for value, similar_id in wanted], (
+                    'Проверьте, что расчёт пачками совпадает с полным.'
+                )
+
+    def test_03_rebuild(self, titles):
+        assert recommendations.rebuild(neighbours=1) == (
+            SimilarTitle.objects.count()
+        )
+        assert not SimilarTitle.objects.exclude(rank=1).exists()
+        deleted_id = titles['Основание'].id
+        assert SimilarTitle.objects.filter(similar_id=deleted_id).exists()
+        titles['Основание'].delete()
+        assert not SimilarTitle.objects.filter(
+            similar_id=deleted_id
+        ).exists()
+        Review.objects.all().delete()
+        assert recommendations.rebuild() == 0
+
+    def test_04_read_in_chunks(self, titles):
+        authors, title_ids, scores = recommendations.read_reviews(
+            chunk_size=3
+        )
+        assert sorted(zip(
+            authors.tolist(), title_ids.tolist(), scores.tolist()
+        )) == sorted(Review.objects.values_list(
+            'author_id', 'title_id', 'score'
+        )), 'Проверьте, что отзывы читаются пачками без потерь.'
+
+    def test_05_neighbours_validated(self, titles):
+        with pytest.raises(CommandError):
+            call_command('build_recommendations', '--neighbours', '0')
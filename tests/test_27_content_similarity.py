@@ -0,0 +1,212 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews import content
+from reviews.content import TITLE_CONTENT, ContentIndex, iter_documents
+from reviews.models import Category, Genre, Title
+
+TITLES = (
+    ('Солярис', 'Учёные на космической станции у планеты-океана.',
+     'film', ['fantastic']),
+    ('Космическая одиссея', 'Экипаж космического корабля летит '
+     'к Юпитеру, бортовой компьютер выходит из-под контроля.',
+     'film', ['fantastic']),
+    ('Интерстеллар', 'Экипаж корабля ищет планету для людей '
+     'за пределами Солнечной системы.', 'film', ['fantastic', 'drama']),
+    ('Война и мир', 'Судьбы дворянских семей во время войны '
+     'с Наполеоном.', 'book', ['drama']),
+    ('Анна Каренина', 'Трагедия замужней дамы и офицера в '
+     'дворянском обществе.', 'book', ['drama']),
+    ('Пикник на обочине', 'Сталкеры ищут артефакты в Зоне после '
+     'посещения пришельцев.', 'book', ['fantastic']),
+)
+
+
+@pytest.fixture(autouse=True)
+def content_index(settings, tmp_path):
+    # Индекс живёт в памяти процесса и переживает очистку БД между тестами.
+    settings.CONTENT_INDEX_PATH = tmp_path / 'content_index.npz'
+    TITLE_CONTENT.invalidate()
+    yield
+    TITLE_CONTENT.invalidate()
+
+
+@pytest.fixture
+def titles():
+    categories = {
+        slug: Category.objects.create(name=slug, slug=slug)
+        for slug in ('film', 'book')
+    }
+    genres = {
+        slug: Genre.objects.create(name=slug, slug=slug)
+        for slug in ('fantastic', 'drama')
+    }
+    titles = {}
+    for name, description, category, genre_slugs in TITLES:
+        title = Title.objects.create(
+            name=name, year=2000, description=description,
+            category=categories[category],
+        )
+        title.genre.set([genres[slug] for slug in genre_slugs])
+        titles[name] = title
+    call_command('build_content_index', stdout=StringIO())
+    return titles
+
+
+def similar_names(client, title, **params):
+    response = client.get(
+        f'/api/v1/titles/{title.id}/similar/', {'by': 'content', **params}
+    )
+    assert response.status_code == HTTPStatus.OK, (
+        'Проверьте, что `/api/v1/titles/{id}/similar/?by=content` '
+        'возвращает статус 200.'
+    )
+    return [entry['name'] for entry in response.json()]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test27ContentSimilarity:
+
+    def test_01_similar_by_content(self, client, titles):
+        names = similar_names(client, titles['Космическая одиссея'])
+        assert names == ['Солярис', 'Интерстеллар'], (
+            'Проверьте, что похожие по содержанию произведения '
+            'упорядочены по сходству описаний, жанров и категорий.'
+        )
+        assert similar_names(client, titles['Пикник на обочине']) == [], (
+            'Проверьте, что произведения без общих терминов не попадают '
+            'в похожие.'
+        )
+        assert similar_names(client, titles['Война и мир'])[0] == (
+            'Анна Каренина'
+        )
+        assert similar_names(
+            client, titles['Космическая одиссея'], limit=1
+        ) == ['Солярис']
+        assert client.get(
+            f'/api/v1/titles/{titles["Солярис"].id}/similar/',
+            {'by': 'genre'},
+        ).status_code == HTTPStatus.BAD_REQUEST
+        assert client.get(
+            '/api/v1/titles/0/similar/', {'by': 'content'}
+        ).status_code == HTTPStatus.NOT_FOUND
+
+    def test_02_incremental_updates(self, admin_client, client, titles):
+        similar_names(client, titles['Солярис'])
+        response = admin_client.post('/api/v1/titles/', {
+            'name': 'Марсианин',
+            'year': 2015,
+            'description': 'Экипаж улетает, астронавт остаётся '
+                           'на планете один.',
+            'category': 'film',
+            'genre': ['fantastic'],
+        }, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        new_id = response.json()['id']
+        assert TITLE_CONTENT.contains(new_id), (
+            'Проверьте, что новое произведение сразу добавляется в индекс.'
+        )
+        new_title = Title.objects.get(id=new_id)
+        assert 'Интерстеллар' in similar_names(client, new_title)[:2]
+        assert 'Марсианин' in similar_names(client, titles['Интерстеллар'])
+
+        response = admin_client.patch(
+            f'/api/v1/titles/{new_id}/',
+            {'description': 'Дворянская семья накануне войны.',
+             'genre': ['drama'], 'category': 'book'},
+            format='json',
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert set(similar_names(client, new_title)) == {
+            'Война и мир', 'Анна Каренина'
+        }, (
+            'Проверьте, что изменённое произведение пересчитывается.'
+        )
+        titles['Интерстеллар'].delete()
+        assert 'Интерстеллар' not in similar_names(
+            client, titles['Космическая одиссея']
+        ), 'Проверьте, что удалённые произведения убираются из индекса.'
+
+    def test_03_build_command(self, settings, client, titles):
+        expected = ContentIndex()
+        expected.set_index(*ContentIndex.build(iter_documents()))
+        expected = [
+            Title.objects.get(id=title_id).name
+            for title_id, _ in expected.similar(titles['Солярис'].id)
+        ]
+        out = StringIO()
+        call_command('build_content_index', batch_size=2, stdout=out)
+        assert 'Произведений: 6' in out.getvalue()
+        assert settings.CONTENT_INDEX_PATH.exists()
+        index = ContentIndex()
+        assert [
+            Title.objects.get(id=title_id).name
+            for title_id, _ in index.similar(titles['Солярис'].id)
+        ] == expected, (
+            'Проверьте, что индекс из файла совпадает с индексом из БД.'
+        )
+        assert similar_names(client, titles['Солярис']) == expected
+
+    def test_04_merge_pending(self, monkeypatch, titles):
+        index = ContentIndex()
+        index.ensure_loaded()
+        expected = {
+            title.id: index.similar(title.id) for title in titles.values()
+        }
+        monkeypatch.setattr(content, 'MERGE_SIZE', 2)
+        for name in ('Пикник на обочине', 'Солярис', 'Анна Каренина'):
+            title = titles[name]
+            index.add(
+                title,
+                [genre.slug for genre in title.genre.all()],
+                title.category.slug,
+            )
+        assert len(index.pending) == 1, (
+            'Проверьте, что добавленные векторы вливаются в матрицу.'
+        )
+        for title_id, neighbours in expected.items():
+            assert [
+                (other_id, pytest.approx(score, abs=1e-5))
+                for other_id, score in index.similar(title_id)
+            ] == neighbours
+
+    def test_05_no_build_in_request(self, settings, client, titles):
+        settings.CONTENT_INDEX_PATH.unlink()
+        with CaptureQueriesContext(connection) as context:
+            assert similar_names(client, titles['Солярис']) == [], (
+                'Проверьте, что без файла индекса похожих нет.'
+            )
+        assert len(context.captured_queries) <= 3, (
+            'Проверьте, что запрос не строит индекс из БД.'
+        )
+        call_command('build_content_index', stdout=StringIO())
+        assert similar_names(client, titles['Солярис']), (
+            'Проверьте, что процесс перечитывает файл после перестройки.'
+        )
+
+    def test_06_sparse_scores_match_dense(self, titles):
+        index = ContentIndex()
+        index.ensure_loaded()
+        dense = index.matrix.toarray()
+        for row, title_id in enumerate(index.title_ids.tolist()):
+            scores = dense @ dense[row]
+            scores[row] = 0
+            expected = sorted(
+                (
+                    (-score, other_id) for other_id, score in zip(
+                        index.title_ids.tolist(), scores.tolist()
+                    ) if score > 0
+                ),
+            )[:content.DEFAULT_LIMIT]
+            assert [
+                (other_id, pytest.approx(score, abs=1e-5))
+                for other_id, score in index.similar(title_id)
+            ] == [(other_id, -score) for score, other_id in expected], (
+                'Проверьте, что разреженный расчёт сходства совпадает '
+                'с полным.'
+            )
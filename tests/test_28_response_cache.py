@@ -0,0 +1,142 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Category, Genre, Review, Title, User
+
+URL = '/api/v1/titles/'
+
+
+@pytest.fixture
+def title():
+    film = Category.objects.create(name='Фильм', slug='film')
+    drama = Genre.objects.create(name='Драма', slug='drama')
+    title = Title.objects.create(
+        name='Сталкер', year=1979, description='', category=film
+    )
+    title.genre.set([drama])
+    return title
+
+
+def get(client, url, **params):
+    response = client.get(url, params)
+    assert response.status_code == HTTPStatus.OK, (
+        f'Проверьте, что GET-запрос к `{url}` возвращает статус 200.'
+    )
+    return response
+
+
+def assert_cached(client, url, django_assert_num_queries, **params):
+    '''Второй такой же запрос отдаётся из кеша без обращения к БД.'''
+    first = get(client, url, **params)
+    assert first['X-Cache'] == 'MISS'
+    with django_assert_num_queries(0):
+        second = get(client, url, **params)
+    assert second['X-Cache'] == 'HIT', (
+        f'Проверьте, что ответ `{url}` для анонимных запросов кешируется.'
+    )
+    assert second.json() == first.json()
+    return second.json()
+
+
+@pytest.mark.django_db(transaction=True)
+class Test28ResponseCache:
+
+    def test_01_hits(self, client, title, django_assert_num_queries):
+        detail = f'{URL}{title.id}/'
+        assert_cached(client, URL, django_assert_num_queries)
+        assert_cached(client, detail, django_assert_num_queries)
+        assert_cached(
+            client, URL, django_assert_num_queries, year=1979, name='Ста'
+        )
+        with django_assert_num_queries(0):
+            response = get(client, URL, name='Ста', year=1979)
+        assert response['X-Cache'] == 'HIT', (
+            'Проверьте, что порядок параметров не влияет на ключ кеша.'
+        )
+        assert get(client, detail, include='histogram')['X-Cache'] == 'MISS'
+        assert client.get(f'{URL}0/').status_code == HTTPStatus.NOT_FOUND
+        assert client.get(f'{URL}0/').status_code == HTTPStatus.NOT_FOUND
+
+    def test_02_invalidation(self, client, admin_client, title,
+                             django_assert_num_queries):
+        detail = f'{URL}{title.id}/'
+        assert_cached(client, detail, django_assert_num_queries)
+        assert_cached(client, URL, django_assert_num_queries)
+        reader = User.objects.create(username='reader', email='r@ya.fake')
+        review = Review.objects.create(
+            title=title, author=reader, text='Отзыв', score=8
+        )
+        assert get(client, detail).json()['rating'] == 8, (
+            'Проверьте, что новый отзыв сбрасывает кеш произведения.'
+        )
+        assert get(client, URL).json()['results'][0]['rating'] == 8, (
+            'Проверьте, что новый отзыв сбрасывает кеш списка.'
+        )
+        review.delete()
+        assert get(client, detail).json()['rating'] is None
+
+        admin_client.patch(detail, {'name': 'Солярис'}, format='json')
+        assert get(client, detail).json()['name'] == 'Солярис'
+        genre = Genre.objects.get(slug='drama')
+        genre.name = 'Фантастика'
+        genre.save()
+        assert get(client, detail).json()['genre'][0]['name'] == (
+            'Фантастика'
+        ), 'Проверьте, что изменение жанра сбрасывает кеш произведений.'
+        Category.objects.get(slug='film').delete()
+        assert get(client, detail).json()['category'] is None
+        genre.titles.clear()
+        assert get(client, detail).json()['genre'] == []
+        assert get(client, URL).json()['results'][0]['genre'] == []
+        title.delete()
+        assert client.get(detail).status_code == HTTPStatus.NOT_FOUND
+        assert get(client, URL).json()['results'] == []
+
+    def test_03_authenticated_bypass(self, admin_client, title):
+        detail = f'{URL}{title.id}/'
+        for _ in range(2):
+            response = admin_client.get(detail)
+            assert response.status_code == HTTPStatus.OK
+            assert 'X-Cache' not in response, (
+                'Проверьте, что запросы с токеном не кешируются.'
+            )
+
+    def test_04_stats_command(self, client, title):
+        for _ in range(3):
+            get(client, URL)
+        get(client, f'{URL}{title.id}/')
+        out = StringIO()
+        call_command('response_cache_stats', reset=True, stdout=out)
+        output = out.getvalue()
+        assert (
+            'Список произведений: попаданий 2, промахов 1, '
+            'доля попаданий 66.7%'
+        ) in output
+        assert 'Произведение: попаданий 0, промахов 1' in output
+        out = StringIO()
+        call_command('response_cache_stats', stdout=out)
+        assert 'попаданий 0, промахов 0, доля попаданий —' in out.getvalue(), (
+            'Проверьте, что `--reset` обнуляет счётчики.'
+        )
+
+    def test_05_padded_id(self, client, admin_client, title,
+                          django_assert_num_queries):
+        padded = f'{URL}0{title.id}/'
+        reviews = f'{URL}0{title.id}/reviews/'
+        assert_cached(client, padded, django_assert_num_queries)
+        assert_cached(client, reviews, django_assert_num_queries)
+        admin_client.patch(
+            f'{URL}{title.id}/', {'name': 'Солярис'}, format='json'
+        )
+        assert get(client, padded).json()['name'] == 'Солярис', (
+            'Проверьте, что `/titles/01/` сбрасывается вместе '
+            'с `/titles/1/`: версия кеша берётся по id произведения.'
+        )
+        reader = User.objects.create(username='reader', email='r@ya.fake')
+        Review.objects.create(
+            title=title, author=reader, text='Отзыв', score=8
+        )
+        assert get(client, reviews).json()['count'] == 1
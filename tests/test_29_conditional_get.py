@@ -0,0 +1,179 @@
+from http import HTTPStatus
+
+import pytest
+
+from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.search import TITLE_TRIGRAM_INDEX
+
+URL = '/api/v1/titles/'
+
+
+@pytest.fixture
+def title():
+    film = Category.objects.create(name='Фильм', slug='film')
+    drama = Genre.objects.create(name='Драма', slug='drama')
+    title = Title.objects.create(
+        name='Сталкер', year=1979, description='', category=film
+    )
+    title.genre.set([drama])
+    return title
+
+
+@pytest.fixture
+def review(title):
+    author = User.objects.create(username='reader', email='r@ya.fake')
+    review = Review.objects.create(
+        title=title, author=author, text='Отзыв', score=8
+    )
+    Comment.objects.create(review=review, author=author, text='Согласен')
+    return review
+
+
+def get_validators(client, url, **params):
+    response = client.get(url, params)
+    assert response.status_code == HTTPStatus.OK, (
+        f'Проверьте, что GET-запрос к `{url}` возвращает статус 200.'
+    )
+    assert response.has_header('ETag'), (
+        f'Проверьте, что ответ `{url}` содержит заголовок ETag.'
+    )
+    return response['ETag'], response.get('Last-Modified')
+
+
+def assert_not_modified(client, url, etag, **params):
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+        f'Проверьте, что `{url}` с актуальным If-None-Match '
+        'возвращает статус 304.'
+    )
+    assert not response.content
+
+
+def assert_modified(client, url, etag, **params):
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK, (
+        f'Проверьте, что изменение данных меняет ETag `{url}`.'
+    )
+    return response['ETag']
+
+
+@pytest.mark.django_db(transaction=True)
+class Test29ConditionalGet:
+
+    def test_01_title_detail(self, user_client, admin_client, title):
+        detail = f'{URL}{title.id}/'
+        etag, last_modified = get_validators(user_client, detail)
+        assert last_modified is not None
+        assert_not_modified(user_client, detail, etag)
+        response = user_client.get(
+            detail, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert user_client.get(
+            detail, {'include': 'histogram'}, HTTP_IF_NONE_MATCH=etag
+        ).status_code == HTTPStatus.OK, (
+            'Проверьте, что ETag зависит от параметров запроса.'
+        )
+
+        author = User.objects.create(username='reader', email='r@ya.fake')
+        Review.objects.create(title=title, author=author, text='', score=5)
+        etag = assert_modified(user_client, detail, etag)
+        genre = Genre.objects.get(slug='drama')
+        genre.name = 'Фантастика'
+        genre.save()
+        etag = assert_modified(user_client, detail, etag)
+        title.genre.clear()
+        etag = assert_modified(user_client, detail, etag)
+        Category.objects.get(slug='film').delete()
+        assert_modified(user_client, detail, etag)
+
+    def test_02_lists(self, user_client, title):
+        etag, last_modified = get_validators(user_client, URL)
+        assert last_modified is None, (
+            'Проверьте, что у списков нет Last-Modified: удаление строки '
+            'не меняет время последнего изменения.'
+        )
+        assert_not_modified(user_client, URL, etag)
+        other = Title.objects.create(name='Солярис', year=1972,
+                                     description='')
+        etag = assert_modified(user_client, URL, etag)
+        other.delete()
+        etag = assert_modified(user_client, URL, etag)
+        assert_not_modified(user_client, URL, etag)
+
+        url = '/api/v1/categories/'
+        etag, _ = get_validators(user_client, url)
+        assert_not_modified(user_client, url, etag)
+        category = Category.objects.get(slug='film')
+        category.name = 'Кино'
+        category.save()
+        assert_modified(user_client, url, etag)
+
+    def test_03_reviews_and_comments(self, user_client, review):
+        reviews = f'{URL}{review.title_id}/reviews/'
+        comments = f'{reviews}{review.id}/comments/'
+        for url, params in (
+            (reviews, {}),
+            (reviews, {'pagination': 'cursor'}),
+            (f'{reviews}{review.id}/', {}),
+            (comments, {'pagination': 'cursor'}),
+        ):
+            etag, _ = get_validators(user_client, url, **params)
+            assert_not_modified(user_client, url, etag, **params)
+        etag, _ = get_validators(user_client, reviews, pagination='cursor')
+        review.text = 'Изменённый отзыв'
+        review.save()
+        assert_modified(user_client, reviews, etag, pagination='cursor')
+        etag, _ = get_validators(user_client, comments, pagination='cursor')
+        Comment.objects.filter(review=review).delete()
+        assert_modified(user_client, comments, etag, pagination='cursor')
+
+    def test_04_not_modified_queries(self, client, user_client, title,
+                                     django_assert_num_queries):
+        etag, _ = get_validators(user_client, URL)
+        with django_assert_num_queries(1):
+            # Только агрегат для валидаторов, без страницы и жанров.
+            assert_not_modified(user_client, URL, etag)
+        etag, _ = get_validators(client, URL)
+        with django_assert_num_queries(0):
+            # Анонимный запрос: валидаторы из кеша ответов.
+            assert_not_modified(client, URL, etag)
+
+    def test_05_author_renamed(self, client, user_client, review):
+        reviews = f'{URL}{review.title_id}/reviews/'
+        comments = f'{reviews}{review.id}/comments/'
+        anonymous_etag, _ = get_validators(client, reviews)
+        assert client.get(reviews)['X-Cache'] == 'HIT'
+        etags = {
+            url: get_validators(user_client, url)[0]
+            for url in (reviews, f'{reviews}{review.id}/', comments)
+        }
+        author = User.objects.get(pk=review.author_id)
+        author.username = 'critic'
+        author.save()
+        for url, etag in etags.items():
+            assert_modified(user_client, url, etag)
+        response = client.get(reviews, HTTP_IF_NONE_MATCH=anonymous_etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что переименование автора сбрасывает кеш '
+            'и ETag отзывов и комментариев.'
+        )
+        assert response.json()['results'][0]['author'] == 'critic'
+
+    def test_06_filters_applied_once(self, user_client, title, monkeypatch):
+        calls = []
+        find = TITLE_TRIGRAM_INDEX.find
+
+        def counted_find(*args, **kwargs):
+            calls.append(args)
+            return find(*args, **kwargs)
+
+        monkeypatch.setattr(TITLE_TRIGRAM_INDEX, 'find', counted_find)
+        response = user_client.get(URL, {'fuzzy': 'сталкир'})
+        assert [item['name'] for item in response.json()['results']] == [
+            'Сталкер'
+        ]
+        assert len(calls) == 1, (
+            'Проверьте, что список строит отфильтрованный queryset один '
+            'раз для валидаторов и для страницы.'
+        )
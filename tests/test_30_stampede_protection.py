@@ -0,0 +1,131 @@
+import threading
+import time
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from api import cache as response_cache
+from api.serializers import TitleReadSerializer
+from reviews.models import Review, Title, User
+
+URL = '/api/v1/titles/'
+
+
+@pytest.fixture
+def title():
+    return Title.objects.create(name='Сталкер', year=1979, description='')
+
+
+@pytest.fixture
+def reader():
+    return User.objects.create(username='reader', email='r@ya.fake')
+
+
+def get(client, url):
+    response = client.get(url)
+    assert response.status_code == HTTPStatus.OK, (
+        f'Проверьте, что GET-запрос к `{url}` возвращает статус 200.'
+    )
+    return response
+
+
+@pytest.mark.django_db(transaction=True)
+class Test30StampedeProtection:
+
+    def test_01_stale_while_revalidate(self, client, monkeypatch, title,
+                                       reader):
+        detail = f'{URL}{title.id}/'
+        assert get(client, detail).json()['rating'] is None
+        Review.objects.create(title=title, author=reader, text='', score=7)
+        # Ключ пересчитывает другой запрос: отдаём прежний ответ.
+        monkeypatch.setattr(response_cache, 'acquire_lock', lambda key: None)
+        response = get(client, detail)
+        assert response['X-Cache'] == 'STALE', (
+            'Проверьте, что во время чужого пересчёта отдаётся прежний ответ.'
+        )
+        assert response.json()['rating'] is None
+        monkeypatch.undo()
+        response = get(client, detail)
+        assert response['X-Cache'] == 'MISS'
+        assert response.json()['rating'] == 7
+        assert get(client, detail)['X-Cache'] == 'HIT'
+        assert response_cache.get_stats()['titles-retrieve'] == {
+            'hit': 1, 'miss': 2, 'early': 0, 'stale': 1, 'coalesced': 0,
+        }
+
+    def test_02_single_flight(self, monkeypatch, title):
+        detail = f'{URL}{title.id}/'
+        workers = 6
+        to_representation = TitleReadSerializer.to_representation
+        computed = []
+
+        def slow_representation(serializer, instance):
+            computed.append(instance.pk)
+            time.sleep(0.3)
+            return to_representation(serializer, instance)
+
+        monkeypatch.setattr(
+            TitleReadSerializer, 'to_representation', slow_representation
+        )
+        barrier = threading.Barrier(workers)
+        responses = []
+
+        def request():
+            try:
+                barrier.wait()
+                responses.append(Client().get(detail))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [response.status_code for response in responses] == (
+            [HTTPStatus.OK] * workers
+        )
+        assert len({response.content for response in responses}) == 1
+        assert computed == [title.id], (
+            'Проверьте, что одновременные промахи пересчитывает один запрос.'
+        )
+        stats = response_cache.get_stats()['titles-retrieve']
+        assert stats['miss'] == 1
+        assert stats['coalesced'] + stats['hit'] == workers - 1
+
+    def test_03_early_refresh(self, client, monkeypatch, title):
+        detail = f'{URL}{title.id}/'
+        get(client, detail)
+        monkeypatch.setattr(response_cache, 'XFETCH_BETA', 10 ** 9)
+        assert get(client, detail)['X-Cache'] == 'MISS', (
+            'Проверьте, что запись обновляется досрочно (XFetch).'
+        )
+        monkeypatch.setattr(response_cache, 'XFETCH_BETA', 0)
+        assert get(client, detail)['X-Cache'] == 'HIT'
+        stats = response_cache.get_stats()['titles-retrieve']
+        assert (stats['miss'], stats['early'], stats['hit']) == (1, 1, 1)
+
+    def test_04_review_list(self, client, title, reader):
+        url = f'{URL}{title.id}/reviews/'
+        assert get(client, url)['X-Cache'] == 'MISS'
+        assert get(client, url)['X-Cache'] == 'HIT'
+        Review.objects.create(title=title, author=reader, text='', score=7)
+        response = get(client, url)
+        assert response['X-Cache'] == 'MISS', (
+            'Проверьте, что новый отзыв сбрасывает кеш списка отзывов.'
+        )
+        assert len(response.json()['results']) == 1
+        review_id = response.json()['results'][0]['id']
+        assert 'X-Cache' not in client.get(f'{url}{review_id}/')
+
+        out = StringIO()
+        call_command('response_cache_stats', stdout=out)
+        assert (
+            'Отзывы к произведению: попаданий 1, промахов 2, '
+            'доля попаданий 33.3%, устаревших 0, '
+            'дождавшихся пересчёта 0, досрочных пересчётов 0'
+        ) in out.getvalue()